@@ -1,34 +1,115 @@
+import logging
+import threading
+from datetime import date, datetime, time, timedelta
+
 import streamlit as st
 
-from rag.rag_agent import run_rag
+from rag.config import METRICS_PORT, RAG_PIPELINE, RAW_DATA_DIR
+from rag.direct_pipeline import stream_direct_rag
+from rag.ingestion import list_document_files
+from rag.models import MetadataFilter
+from rag.retrieval_service import RetrievalService, get_retrieval_service
+from rag.tracing import start_metrics_server
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
 
 st.set_page_config(page_title="RAG Chatbot", page_icon="🤖")
 st.title("RAG Chatbot")
 
+
+# Script reruns reuse these: one metrics endpoint and one opened index per process
+@st.cache_resource
+def start_metrics() -> None:
+    if METRICS_PORT:
+        try:
+            start_metrics_server(METRICS_PORT)
+        except OSError as e:
+            logging.getLogger(__name__).warning("Metrics endpoint not started: %s", e)
+
+
+@st.cache_resource(show_spinner="Opening the index...")
+def load_retrieval_service() -> RetrievalService:
+    """Open the index (not cached when it fails) and warm it up in the background."""
+    service = get_retrieval_service()
+    threading.Thread(target=service.warm_up, name="index-warm-up", daemon=True).start()
+    return service
+
+
+start_metrics()
+try:
+    load_retrieval_service()
+except Exception as e:
+    st.warning(f"Index not available yet: {e}")
+
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
 with st.sidebar:
     st.header("Configuration")
-    mode = st.selectbox("Retrieval mode", ["bm25", "vector"])
+    mode = st.selectbox("Retrieval mode", ["bm25", "vector", "hybrid"])
     st.info(
         "**BM25**: Lexical search using keyword matching\n\n"
-        "**Vector**: Semantic search using embeddings"
+        "**Vector**: Semantic search using embeddings\n\n"
+        "**Hybrid**: BM25 and vector search in parallel, rank-fused"
+    )
+    pipeline = st.selectbox(
+        "Pipeline", ["agent", "direct"], index=0 if RAG_PIPELINE == "agent" else 1
+    )
+    st.info(
+        "**Agent**: the LLM decides to call the retrieval tool (2+ LLM calls)\n\n"
+        "**Direct**: retrieve first, then a single grounded LLM call"
     )
 
+    st.header("Filters")
+    filter_sources = st.multiselect(
+        "Documents", sorted(file_path.name for file_path in list_document_files(RAW_DATA_DIR))
+    )
+    filter_patterns = st.text_input("File name patterns", placeholder="*.md, report-*")
+    filter_dates = ()
+    if st.checkbox("Filter by modification date"):
+        filter_dates = st.date_input(
+            "Modified between", value=(date.today() - timedelta(days=30), date.today())
+        )
+
+
+def build_filters(sources, patterns, dates) -> MetadataFilter | None:
+    """Sidebar selections as a MetadataFilter, None when nothing is selected."""
+    filters = MetadataFilter(
+        sources=list(sources),
+        source_patterns=[pattern.strip() for pattern in patterns.split(",") if pattern.strip()],
+        # A range is a 1-tuple while its end date is being picked
+        modified_since=datetime.combine(dates[0], time.min) if len(dates) > 0 else None,
+        modified_until=datetime.combine(dates[1], time.max) if len(dates) > 1 else None,
+    )
+    return None if filters.is_empty() else filters
+
+
+filters = build_filters(filter_sources, filter_patterns, filter_dates)
+
+
+def render_sources(sources, timings=None):
+    if sources or timings:
+        with st.expander("View sources"):
+            for src in sources:
+                span = f", characters {src['start']}-{src['end']}" if src.get("start") is not None else ""
+                st.markdown(
+                    f"- **{src['source']}** "
+                    f"(chunk {src['chunk_index']}{span}, score={src['score']:.3f})"
+                )
+            if timings:
+                st.caption(
+                    "Timings: " + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items())
+                )
+
+
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
+        if message.get("timing"):
+            st.caption(message["timing"])
         if message["role"] == "assistant" and "sources" in message:
-            sources = message["sources"] or []
-            if sources:
-                with st.expander("View sources"):
-                    for src in sources:
-                        st.markdown(
-                            f"- **{src['source']}** "
-                            f"(chunk {src['chunk_index']}, score={src['score']:.3f})"
-                        )
+            render_sources(message["sources"] or [], message.get("timings"))
 
 if prompt := st.chat_input("Ask a question about the indexed documents:"):
     st.session_state.messages.append({"role": "user", "content": prompt})
@@ -36,13 +117,43 @@ if prompt := st.chat_input("Ask a question about the indexed documents:"):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner(f"Searching using {mode.upper()} and generating answer..."):
-            try:
-                result = run_rag(
-                    question=prompt,
-                    mode=mode, 
-                    top_k=5,
-                )
+        try:
+            timing = None
+            if pipeline == "direct":
+                with st.spinner(f"Searching using {mode.upper()}..."):
+                    stream = stream_direct_rag(question=prompt, mode=mode, top_k=5, filters=filters)
+
+                # Sources are known before generation starts, show them right
+                # away and stream the answer into the slot above them
+                answer_slot = st.container()
+                sources = [dict(chunk) for chunk in stream.chunks]
+                sources_slot = st.empty()
+                with sources_slot.container():
+                    render_sources(sources)
+
+                answer_slot.write_stream(stream)
+                answer = stream.answer
+                timings = stream.timings
+                with sources_slot.container():
+                    render_sources(sources, timings)
+                if stream.time_to_first_token is not None:
+                    timing = (
+                        f"First token after {stream.time_to_first_token:.2f}s, "
+                        f"answered in {stream.total_time:.2f}s"
+                    )
+                    answer_slot.caption(timing)
+            else:
+                # Imported on the agent pipeline's first question, not at startup
+                from rag.rag_agent import run_rag
+
+                with st.spinner(f"Searching using {mode.upper()} and generating answer..."):
+                    result = run_rag(
+                        question=prompt,
+                        mode=mode, 
+                        top_k=5,
+                        pipeline=pipeline,
+                        filters=filters,
+                    )
 
                 answer = result.answer
 
@@ -55,29 +166,25 @@ if prompt := st.chat_input("Ask a question about the indexed documents:"):
                 except AttributeError:
                     sources = list(raw_sources)
 
+                timings = result.timings
                 st.markdown(answer)
+                render_sources(sources, timings)
 
-                if sources:
-                    with st.expander("View sources"):
-                        for src in sources:
-                            st.markdown(
-                                f"- **{src['source']}** "
-                                f"(chunk {src['chunk_index']}, score={src['score']:.3f})"
-                            )
-
-                st.session_state.messages.append(
-                    {
-                        "role": "assistant",
-                        "content": answer,
-                        "sources": sources,
-                    }
-                )
-            except Exception as e:
-                error_msg = f"Error: {str(e)}"
-                st.error(error_msg)
-                st.session_state.messages.append(
-                    {
-                        "role": "assistant",
-                        "content": error_msg,
-                    }
-                )
+            st.session_state.messages.append(
+                {
+                    "role": "assistant",
+                    "content": answer,
+                    "sources": sources,
+                    "timing": timing,
+                    "timings": timings,
+                }
+            )
+        except Exception as e:
+            error_msg = f"Error: {str(e)}"
+            st.error(error_msg)
+            st.session_state.messages.append(
+                {
+                    "role": "assistant",
+                    "content": error_msg,
+                }
+            )
@@ -0,0 +1 @@
+"""Benchmarks for ingestion, retrieval and end-to-end RAG against a fake Ollama server."""
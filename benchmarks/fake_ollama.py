@@ -0,0 +1,269 @@
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+_TOKEN_RE = re.compile(r"\w+")
+_PROMPT_RE = re.compile(r"Retrieval mode: (\w+)\. Top_k: (\d+)\. User question: (.*)", re.S)
+
+
+def fake_embedding(text: str, dim: int) -> list[float]:
+    """
+    Deterministic bag-of-words embedding (signed feature hashing), so texts
+    sharing words get similar vectors and vector search results are
+    meaningful.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in _TOKEN_RE.findall(text.lower()):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        vector[value % dim] += 1.0 if (value >> 63) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    else:
+        vector[0] = 1.0
+    return vector.tolist()
+
+
+class FakeOllamaServer:
+    """
+    Local stand-in for Ollama with fixed, configurable latencies.
+
+    Serves /api/embed, /api/embeddings, /api/generate (streaming and not)
+    and the OpenAI-compatible /v1/chat/completions, including the tool
+    calls the pydantic-ai agent expects. Responses depend only on the
+    request, so benchmark runs are repeatable.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        dim: int = 768,
+        embed_latency: float = 0.0,
+        chat_latency: float = 0.0,
+        token_latency: float = 0.0,
+        answer_tokens: int = 32,
+    ):
+        self.dim = dim
+        self.embed_latency = embed_latency
+        self.chat_latency = chat_latency
+        self.token_latency = token_latency
+        self.answer_tokens = answer_tokens
+        self.requests: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def count(self, endpoint: str) -> None:
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def answer_words(self, prompt: str) -> list[str]:
+        seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        return [f"answer-{seed}-{i}" for i in range(self.answer_tokens)]
+
+    def chat_message(self, request: dict) -> tuple[dict, str]:
+        """Return (assistant message, finish_reason) for a chat request."""
+        messages = request.get("messages", [])
+        tool_names = [tool["function"]["name"] for tool in request.get("tools", [])]
+        user_text = next(
+            (_message_text(m) for m in reversed(messages) if m.get("role") == "user"), ""
+        )
+        match = _PROMPT_RE.search(user_text)
+        mode, top_k, question = (match.group(1), int(match.group(2)), match.group(3)) if match else (
+            "bm25", 5, user_text
+        )
+        tool_results = [m for m in messages if m.get("role") == "tool"]
+        answer = " ".join(self.answer_words(question))
+
+        call = None
+        if not tool_results:
+            # First turn: call the retrieval tool, like the agent is told to
+            retrieval_tools = [name for name in tool_names if name != "final_result"]
+            if retrieval_tools:
+                call = (retrieval_tools[0], {"query": question, "mode": mode, "top_k": top_k})
+        if call is None and "final_result" in tool_names:
+            chunks = []
+            if tool_results:
+                try:
+                    chunks = json.loads(_message_text(tool_results[-1]))
+                except ValueError:
+                    pass
+            call = ("final_result", {
+                "answer": answer,
+                "retrieval_mode": mode,
+                "chunks": chunks if isinstance(chunks, list) else [],
+            })
+
+        if call is None:
+            return {"role": "assistant", "content": answer}, "stop"
+        name, arguments = call
+        tool_call = {
+            "id": f"call_{len(messages)}",
+            "type": "function",
+            "function": {"name": name, "arguments": json.dumps(arguments)},
+        }
+        return {"role": "assistant", "content": None, "tool_calls": [tool_call]}, "tool_calls"
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def _make_handler(server: FakeOllamaServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes; Nagle would delay the body
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _send_json(self, payload: dict, status: int = 200) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._send_json({"models": []})
+            else:
+                self._send_json({"error": "not found"}, status=404)
+
+        def do_POST(self):
+            request = self._read_json()
+            server.count(self.path)
+            if self.path == "/api/embed":
+                inputs = request.get("input", [])
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                time.sleep(server.embed_latency)
+                self._send_json({
+                    "model": request.get("model"),
+                    "embeddings": [fake_embedding(text, server.dim) for text in inputs],
+                })
+            elif self.path == "/api/embeddings":
+                time.sleep(server.embed_latency)
+                self._send_json({"embedding": fake_embedding(request.get("prompt", ""), server.dim)})
+            elif self.path == "/api/generate":
+                self._generate(request)
+            elif self.path in ("/v1/chat/completions", "/chat/completions"):
+                self._chat(request)
+            else:
+                self._send_json({"error": "not found"}, status=404)
+
+        def _generate(self, request: dict) -> None:
+            words = server.answer_words(request.get("prompt", ""))
+            time.sleep(server.chat_latency)
+            if not request.get("stream", True):
+                time.sleep(server.token_latency * len(words))
+                self._send_json({"model": request.get("model"), "response": " ".join(words), "done": True})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, word in enumerate(words):
+                time.sleep(server.token_latency)
+                token = word if i == 0 else " " + word
+                self._write_chunk({"model": request.get("model"), "response": token, "done": False})
+            self._write_chunk({"model": request.get("model"), "response": "", "done": True})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _write_chunk(self, event: dict) -> None:
+            line = json.dumps(event).encode("utf-8") + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+            self.wfile.flush()
+
+        def _chat(self, request: dict) -> None:
+            message, finish_reason = server.chat_message(request)
+            completion_tokens = server.answer_tokens if finish_reason == "stop" else 16
+            time.sleep(server.chat_latency + server.token_latency * completion_tokens)
+            prompt_tokens = sum(len(_message_text(m).split()) for m in request.get("messages", []))
+            self._send_json({
+                "id": f"chatcmpl-{server.requests['/v1/chat/completions']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model"),
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a deterministic fake Ollama server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=0.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--answer-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(
+        args.host, args.port, args.dim,
+        embed_latency=args.embed_latency_ms / 1000,
+        chat_latency=args.chat_latency_ms / 1000,
+        token_latency=args.token_latency_ms / 1000,
+        answer_tokens=args.answer_tokens,
+    )
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from benchmarks.scenarios import (
+    SyntheticCorpus,
+    bench_chunk_text,
+    bench_end_to_end,
+    bench_ingestion,
+    bench_search,
+    make_work_dir,
+    remove_work_dir,
+)
+
+
+SCENARIOS = ("chunking", "ingestion", "search", "e2e")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the RAG benchmarks against a local fake Ollama.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of %(default)s.")
+    parser.add_argument("--output", type=Path, default=Path("benchmark-results.json"))
+    parser.add_argument("--docs", type=int, default=200, help="Synthetic documents to ingest.")
+    parser.add_argument("--words-per-doc", type=int, default=1200)
+    parser.add_argument("--chunk-words", type=int, default=200_000, help="Words in the chunk_text input.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--vector-backend", choices=["lucene", "numpy"])
+    parser.add_argument("--bm25-backend", choices=["lucene", "numpy"])
+    parser.add_argument("--mode", default="vector", help="Retrieval mode for the end-to-end scenario.")
+    parser.add_argument("--pipelines", default="direct,agent")
+    parser.add_argument("--clients", default="1,4,16", help="Concurrent clients for the end-to-end scenario.")
+    parser.add_argument("--requests-per-client", type=int, default=10)
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=50.0)
+    parser.add_argument("--token-latency-ms", type=float, default=2.0)
+    parser.add_argument("--answer-tokens", type=int, default=32)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    args = parse_args()
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    server = FakeOllamaServer(
+        dim=args.dim,
+        embed_latency=args.embed_latency_ms / 1000,
+        chat_latency=args.chat_latency_ms / 1000,
+        token_latency=args.token_latency_ms / 1000,
+        answer_tokens=args.answer_tokens,
+    ).start()
+    work_dir = make_work_dir()
+    # Must be set before rag.config is imported: run_rag and the shared
+    # retrieval service read the Ollama host and cache directory from it
+    os.environ["OLLAMA_HOST"] = server.url
+    os.environ["EMBEDDING_CACHE_DIR"] = str(work_dir / "embedding_cache")
+
+    from rag.retriever import LUCENE_AVAILABLE
+
+    # Without PyLucene only the NumPy backends can be benchmarked
+    vector_backend = args.vector_backend or ("lucene" if LUCENE_AVAILABLE else "numpy")
+    bm25_backend = args.bm25_backend or ("lucene" if LUCENE_AVAILABLE else "numpy")
+
+    corpus = SyntheticCorpus(args.docs, args.words_per_doc, seed=args.seed)
+    queries = corpus.queries(args.queries)
+    index_dir = work_dir / "index"
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "lucene_available": LUCENE_AVAILABLE,
+        "vector_backend": vector_backend,
+        "bm25_backend": bm25_backend,
+        "settings": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "scenarios": {},
+    }
+
+    print(f"Fake Ollama at {server.url}, working directory {work_dir}")
+    try:
+        for name in scenarios:
+            print(f"\n=== {name} ===")
+            started_at = time.perf_counter()
+            if name == "chunking":
+                result = bench_chunk_text(corpus, args.chunk_words, repeats=5)
+            elif name == "ingestion":
+                result = bench_ingestion(corpus, work_dir, server.url, vector_backend, bm25_backend)
+            elif name == "search":
+                if not index_dir.exists():
+                    bench_ingestion(corpus, work_dir, server.url, vector_backend, bm25_backend)
+                result = bench_search(index_dir, server.url, queries, args.top_k, vector_backend, bm25_backend)
+            else:
+                if not index_dir.exists():
+                    bench_ingestion(corpus, work_dir, server.url, vector_backend, bm25_backend)
+                result = bench_end_to_end(
+                    index_dir, queries, args.top_k, args.mode,
+                    pipelines=[p.strip() for p in args.pipelines.split(",") if p.strip()],
+                    client_counts=[int(c) for c in args.clients.split(",")],
+                    requests_per_client=args.requests_per_client,
+                    vector_backend=vector_backend,
+                )
+            report["scenarios"][name] = result
+            print(json.dumps(result, indent=2))
+            print(f"({time.perf_counter() - started_at:.1f}s)")
+    finally:
+        report["fake_ollama_requests"] = dict(server.requests)
+        server.stop()
+        remove_work_dir(work_dir)
+
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+
+def latency_summary(latencies: list[float]) -> dict[str, float]:
+    """Latency percentiles in milliseconds."""
+    if not latencies:
+        return {"count": 0}
+    ms = np.asarray(latencies) * 1000
+    return {
+        "count": len(latencies),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+class SyntheticCorpus:
+    """Deterministic documents over a Zipf-distributed vocabulary."""
+
+    def __init__(self, num_docs: int, words_per_doc: int, vocab_size: int = 5000, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.vocab = [f"term{i}" for i in range(vocab_size)]
+        self.weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+        self.num_docs = num_docs
+        self.words_per_doc = words_per_doc
+
+    def text(self, num_words: int) -> str:
+        return " ".join(self.rng.choices(self.vocab, weights=self.weights, k=num_words))
+
+    def write(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        for i in range(self.num_docs):
+            (directory / f"doc{i:05d}.txt").write_text(self.text(self.words_per_doc))
+
+    def queries(self, count: int, min_words: int = 2, max_words: int = 5) -> list[str]:
+        # Skip the most frequent terms, like real queries skip stop words
+        vocab = self.vocab[20:]
+        return [
+            " ".join(self.rng.sample(vocab[: len(vocab) // 4], self.rng.randint(min_words, max_words)))
+            for _ in range(count)
+        ]
+
+
+def bench_chunk_text(corpus: SyntheticCorpus, num_words: int, repeats: int) -> dict:
+    from rag.config import CHUNK_SIZE, CHUNK_OVERLAP
+    from rag.ingestion import chunk_text
+
+    text = corpus.text(num_words)
+    timings = []
+    for _ in range(repeats):
+        started_at = time.perf_counter()
+        chunks = chunk_text(text, CHUNK_SIZE, CHUNK_OVERLAP)
+        timings.append(time.perf_counter() - started_at)
+
+    best = min(timings)
+    return {
+        "words": num_words,
+        "chunks": len(chunks),
+        "repeats": repeats,
+        "best_s": round(best, 4),
+        "mean_s": round(sum(timings) / len(timings), 4),
+        "words_per_s": round(num_words / best, 1) if best > 0 else None,
+    }
+
+
+def bench_ingestion(
+    corpus: SyntheticCorpus,
+    work_dir: Path,
+    ollama_url: str,
+    vector_backend: str,
+    bm25_backend: str,
+) -> dict:
+    from rag.config import CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL_NAME
+    from rag.embedding_model import EmbeddingModel
+    from rag.ingestion import build_lucene_index
+
+    raw_dir = work_dir / "raw"
+    index_dir = work_dir / "index"
+    corpus.write(raw_dir)
+
+    # No embedding cache: every chunk goes through the (fake) server
+    embedding_model = EmbeddingModel(EMBEDDING_MODEL_NAME, base_url=ollama_url)
+    try:
+        started_at = time.perf_counter()
+        stats = build_lucene_index(
+            raw_dir, index_dir, embedding_model, CHUNK_SIZE, CHUNK_OVERLAP,
+            vector_backend=vector_backend, bm25_backend=bm25_backend,
+        )
+        elapsed = time.perf_counter() - started_at
+    finally:
+        embedding_model.close()
+
+    chunks = stats["write"].items
+    return {
+        "documents": corpus.num_docs,
+        "chunks": chunks,
+        "elapsed_s": round(elapsed, 3),
+        "chunks_per_s": round(chunks / elapsed, 1) if elapsed > 0 else None,
+        "stages": {name: stage.as_dict() for name, stage in stats.items()},
+    }
+
+
+def bench_search(
+    index_dir: Path,
+    ollama_url: str,
+    queries: list[str],
+    top_k: int,
+    vector_backend: str,
+    bm25_backend: str,
+) -> dict:
+    from rag.config import EMBEDDING_MODEL_NAME
+    from rag.embedding_model import EmbeddingModel
+    from rag.retrieval_service import RetrievalService
+
+    embedding_model = EmbeddingModel(EMBEDDING_MODEL_NAME, base_url=ollama_url)
+    service = RetrievalService(
+        index_dir, embedding_model=embedding_model,
+        vector_backend=vector_backend, bm25_backend=bm25_backend,
+    )
+    try:
+        # Pre-embedded queries isolate the index from the embedding round trip
+        query_vectors = embedding_model.encode(queries)
+        searches = {
+            "vector": lambda i: service.vector.search(queries[i], top_k),
+            "vector_index_only": lambda i: service.vector.search_by_vector(query_vectors[i], top_k),
+        }
+        if service.bm25 is not None:
+            searches["bm25"] = lambda i: service.bm25.search(queries[i], top_k)
+            searches["hybrid"] = lambda i: service.hybrid.search(queries[i], top_k)
+
+        results = {}
+        for name, search in searches.items():
+            search(0)  # warm-up
+            latencies = []
+            for i in range(len(queries)):
+                started_at = time.perf_counter()
+                search(i)
+                latencies.append(time.perf_counter() - started_at)
+            results[name] = latency_summary(latencies)
+        return results
+    finally:
+        service.close()
+
+
+def bench_end_to_end(
+    index_dir: Path,
+    queries: list[str],
+    top_k: int,
+    mode: str,
+    pipelines: list[str],
+    client_counts: list[int],
+    requests_per_client: int,
+    vector_backend: str,
+) -> dict:
+    results = {}
+    for pipeline in pipelines:
+        try:
+            if pipeline == "direct":
+                # Same code path as run_rag(pipeline="direct"), without needing pydantic-ai
+                from rag.direct_pipeline import run_direct_rag as run
+            else:
+                from rag.rag_agent import run_rag
+
+                def run(*args, **kwargs):
+                    return run_rag(*args, pipeline=pipeline, **kwargs)
+        except ImportError as e:
+            results[pipeline] = {"skipped": f"{pipeline} pipeline unavailable: {e}"}
+            continue
+
+        # Open the shared retrieval service before timing
+        run(queries[0], mode, top_k=top_k, index_dir=index_dir, vector_backend=vector_backend)
+        # Queries repeat across client counts; measure the pipeline, not answer cache hits
+        from rag.retrieval_service import get_retrieval_service
+
+        get_retrieval_service(index_dir, vector_backend).answer_cache = None
+        for clients in client_counts:
+            total = clients * requests_per_client
+            latencies: list[float] = []
+            errors: list[str] = []
+
+            def one_request(i: int) -> None:
+                started_at = time.perf_counter()
+                try:
+                    run(
+                        queries[i % len(queries)], mode, top_k=top_k, index_dir=index_dir,
+                        vector_backend=vector_backend,
+                    )
+                    latencies.append(time.perf_counter() - started_at)
+                except Exception as e:
+                    errors.append(repr(e))
+
+            started_at = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=clients) as executor:
+                list(executor.map(one_request, range(total)))
+            elapsed = time.perf_counter() - started_at
+
+            results[f"{pipeline}/clients={clients}"] = {
+                "pipeline": pipeline,
+                "clients": clients,
+                "requests": total,
+                "errors": len(errors),
+                "first_error": errors[0] if errors else None,
+                "elapsed_s": round(elapsed, 3),
+                "requests_per_s": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+                "latency": latency_summary(latencies),
+            }
+    return results
+
+
+def make_work_dir() -> Path:
+    return Path(tempfile.mkdtemp(prefix="rag-bench-"))
+
+
+def remove_work_dir(path: Path) -> None:
+    shutil.rmtree(path, ignore_errors=True)
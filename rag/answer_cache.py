@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from rag.config import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ANSWER_CACHE_TTL_SECONDS,
+)
+from rag.models import MetadataFilter, RAGResult, RetrievalMode
+from rag.retriever import get_lucene_executor
+from rag.tracing import span
+from rag.vector_encoding import l2_normalize
+
+logger = logging.getLogger(__name__)
+
+_TRAILING_PUNCTUATION_RE = re.compile(r"[\s?!.]+$")
+
+
+def normalize_question(question: str) -> str:
+    """Case-, width- and whitespace-insensitive form used for exact matches."""
+    text = unicodedata.normalize("NFKC", question).lower()
+    return _TRAILING_PUNCTUATION_RE.sub("", " ".join(text.split()))
+
+
+class _Entry(NamedTuple):
+    key: tuple[str, str, int, str]
+    result: RAGResult
+
+
+class AnswerCache:
+    """
+    In-memory cache of RAGResults for one index.
+
+    Entries are keyed by (normalized question, retrieval mode, top_k,
+    metadata filter) and belong to one index generation; storing or looking
+    up under a newer generation drops everything cached for older ones. A
+    lookup first tries the exact normalized question, then the most similar
+    cached question embedding with the same mode, top_k and filter, if its
+    cosine similarity reaches ``similarity_threshold``. Embeddings live in
+    one preallocated matrix, so the approximate match is a single
+    matrix-vector product.
+
+    Entries expire ``ttl_seconds`` after they were stored; when full, the
+    least recently used entry is evicted.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.clock = clock
+        self.generation: int | None = None
+        self.hits = 0
+        self.misses = 0
+
+        # slot -> entry, least recently used first
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._slots_by_key: dict[tuple[str, str, int, str], int] = {}
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+        self._expires_at = np.full(self.max_entries, -np.inf)
+        # Slot group ids ((mode, top_k, filter) triples), -1 for slots without an embedding
+        self._groups = np.full(self.max_entries, -1, dtype=np.int64)
+        self._group_ids: dict[tuple[str, int, str], int] = {}
+        self._vectors: np.ndarray | None = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self,
+        question: str,
+        mode: RetrievalMode,
+        top_k: int,
+        generation: int,
+        query_vector: np.ndarray | None = None,
+        filter_key: str = "",
+    ) -> RAGResult | None:
+        return self._get(question, mode, top_k, generation, query_vector, filter_key, count_miss=True)
+
+    def get_exact(
+        self, question: str, mode: RetrievalMode, top_k: int, generation: int, filter_key: str = ""
+    ) -> RAGResult | None:
+        """Exact normalized question only; a miss is left for the ``get`` that follows to count."""
+        return self._get(question, mode, top_k, generation, None, filter_key, count_miss=False)
+
+    def _get(
+        self,
+        question: str,
+        mode: RetrievalMode,
+        top_k: int,
+        generation: int,
+        query_vector: np.ndarray | None,
+        filter_key: str,
+        count_miss: bool,
+    ) -> RAGResult | None:
+        with self._lock:
+            if self.generation is not None and generation < self.generation:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._set_generation(generation)
+            now = self.clock()
+            slot = self._slots_by_key.get((normalize_question(question), mode, top_k, filter_key))
+            if slot is not None and self._expires_at[slot] <= now:
+                self._remove(slot)
+                slot = None
+            if slot is None and query_vector is not None:
+                slot = self._most_similar(query_vector, (mode, top_k, filter_key), now)
+
+            if slot is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(slot)
+            return self._entries[slot].result.model_copy(deep=True)
+
+    def put(
+        self,
+        question: str,
+        mode: RetrievalMode,
+        top_k: int,
+        generation: int,
+        result: RAGResult,
+        query_vector: np.ndarray | None = None,
+        filter_key: str = "",
+    ) -> None:
+        with self._lock:
+            if self.generation is not None and generation < self.generation:
+                # Answered from an index that has been replaced meanwhile
+                return
+            self._set_generation(generation)
+            key = (normalize_question(question), mode, top_k, filter_key)
+            if key in self._slots_by_key:
+                self._remove(self._slots_by_key[key])
+            if not self._free_slots:
+                self._remove(next(iter(self._entries)))
+
+            slot = self._free_slots.pop()
+            self._entries[slot] = _Entry(key, result.model_copy(deep=True))
+            self._slots_by_key[key] = slot
+            self._expires_at[slot] = self.clock() + self.ttl_seconds
+            if query_vector is not None:
+                vector = l2_normalize(np.asarray(query_vector, dtype=np.float32))
+                if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                    # First embedding, or the embedding model changed
+                    self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                    self._groups.fill(-1)
+                self._vectors[slot] = vector
+                self._groups[slot] = self._group_ids.setdefault(
+                    (mode, top_k, filter_key), len(self._group_ids)
+                )
+
+    def clear(self) -> None:
+        with self._lock:
+            for slot in list(self._entries):
+                self._remove(slot)
+
+    def _set_generation(self, generation: int) -> None:
+        if generation == self.generation:
+            return
+        if self.generation is not None and self._entries:
+            logger.info("Index generation changed, dropping %d cached answers", len(self._entries))
+        for slot in list(self._entries):
+            self._remove(slot)
+        self.generation = generation
+
+    def _most_similar(self, query_vector: np.ndarray, group: tuple[str, int, str], now: float) -> int | None:
+        group_id = self._group_ids.get(group)
+        if group_id is None or self._vectors is None:
+            return None
+        vector = l2_normalize(np.asarray(query_vector, dtype=np.float32))
+        if vector.shape[0] != self._vectors.shape[1]:
+            return None
+
+        scores = self._vectors @ vector
+        scores[(self._groups != group_id) | (self._expires_at <= now)] = -np.inf
+        slot = int(np.argmax(scores))
+        return slot if scores[slot] >= self.similarity_threshold else None
+
+    def _remove(self, slot: int) -> None:
+        entry = self._entries.pop(slot)
+        del self._slots_by_key[entry.key]
+        self._expires_at[slot] = -np.inf
+        self._groups[slot] = -1
+        self._free_slots.append(slot)
+
+
+class CacheLookup(NamedTuple):
+    """A cached answer, or what is needed to cache a fresh one."""
+
+    result: RAGResult | None
+    generation: int
+    query_vector: np.ndarray | None
+    filter_key: str = ""
+
+
+def lookup_answer(
+    service, question: str, mode: RetrievalMode, top_k: int, filters: MetadataFilter | None = None
+) -> CacheLookup:
+    """
+    Look ``question`` up in ``service.answer_cache``, after picking up any
+    index rebuild. Only when the exact question misses is it embedded for
+    the approximate match; with the embedding cache the retriever reuses
+    that vector for vector search. BM25 queries need no vector, so they
+    are only matched exactly. Answers are only shared between queries with
+    the same ``filters``.
+    """
+    filter_key = filters.cache_key() if filters is not None else ""
+    if service.answer_cache is None:
+        return CacheLookup(None, 0, None, filter_key)
+    service.maybe_refresh()
+    generation = service.generation
+    cache = service.answer_cache
+    with span("answer_cache"):
+        result = cache.get_exact(question, mode, top_k, generation, filter_key)
+        if result is not None:
+            return CacheLookup(result, generation, None, filter_key)
+        query_vector = None
+        if mode != "bm25":
+            try:
+                query_vector = service.query_embedding_model.encode([question])[0]
+            except Exception as e:
+                logger.warning("Could not embed question for the answer cache: %s", e)
+        result = cache.get(question, mode, top_k, generation, query_vector, filter_key)
+    return CacheLookup(result, generation, query_vector, filter_key)
+
+
+async def alookup_answer(
+    service, question: str, mode: RetrievalMode, top_k: int, filters: MetadataFilter | None = None
+) -> CacheLookup:
+    """Async lookup_answer: awaits the question embedding."""
+    filter_key = filters.cache_key() if filters is not None else ""
+    if service.answer_cache is None:
+        return CacheLookup(None, 0, None, filter_key)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(get_lucene_executor(), service.maybe_refresh)
+    generation = service.generation
+    cache = service.answer_cache
+    with span("answer_cache"):
+        result = cache.get_exact(question, mode, top_k, generation, filter_key)
+        if result is not None:
+            return CacheLookup(result, generation, None, filter_key)
+        query_vector = None
+        if mode != "bm25":
+            try:
+                query_vector = (await service.async_embedding_model.encode([question]))[0]
+            except Exception as e:
+                logger.warning("Could not embed question for the answer cache: %s", e)
+        result = cache.get(question, mode, top_k, generation, query_vector, filter_key)
+    return CacheLookup(result, generation, query_vector, filter_key)
+
+
+def store_answer(
+    service, lookup: CacheLookup, question: str, mode: RetrievalMode, top_k: int, result: RAGResult
+) -> None:
+    if service.answer_cache is not None:
+        service.answer_cache.put(
+            question, mode, top_k, lookup.generation, result, lookup.query_vector, lookup.filter_key
+        )
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+import weakref
+
+import httpx
+
+
+class AsyncClientPool:
+    """
+    One shared httpx.AsyncClient (and so one keep-alive connection pool)
+    per running event loop.
+
+    httpx clients are bound to the loop they were first used on, and callers
+    like Streamlit start a fresh loop per ``asyncio.run``; clients of loops
+    that are gone are dropped with them.
+    """
+
+    def __init__(self, base_url: str, max_connections: int, timeout: float):
+        self.base_url = base_url
+        self.limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        )
+        self.timeout = timeout
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    def get(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    base_url=self.base_url, limits=self.limits, timeout=self.timeout
+                )
+                self._clients[loop] = client
+            return client
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
@@ -0,0 +1,272 @@
+import json
+import re
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+import numpy as np
+
+from rag.config import BM25_B, BM25_K1
+
+
+# Files of a BM25 index directory
+TERMS_FILE = "terms.json"  # term id -> term
+INDPTR_FILE = "indptr.npy"  # postings of term t are [indptr[t], indptr[t + 1])
+POSTING_ROWS_FILE = "posting_rows.npy"  # int32 chunk-store row per posting
+POSTING_TFS_FILE = "posting_tfs.npy"  # int32 term frequency per posting
+DOC_LENS_FILE = "doc_lens.npy"  # int32 token count per row (0 for deleted rows)
+META_FILE = "meta.json"  # row count, live doc count, avgdl, generation
+
+# Close to StandardAnalyzer: Unicode word runs, joined across inner
+# apostrophes and dots ("don't", "3.14"), lowercased, no stop words
+_TOKEN_RE = re.compile(r"\w+(?:['’.]\w+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class CollectionStats(NamedTuple):
+    """Corpus statistics BM25 scores depend on, possibly summed over shards."""
+
+    num_docs: int
+    total_len: float
+    doc_freqs: dict[str, int]
+
+
+def merge_collection_stats(stats: Iterable[CollectionStats]) -> CollectionStats:
+    num_docs = 0
+    total_len = 0.0
+    doc_freqs: Counter[str] = Counter()
+    for shard_stats in stats:
+        num_docs += shard_stats.num_docs
+        total_len += shard_stats.total_len
+        doc_freqs.update(shard_stats.doc_freqs)
+    return CollectionStats(num_docs, total_len, dict(doc_freqs))
+
+
+def build_bm25_index(path: Path, documents: Iterable[tuple[int, str]], num_rows: int, generation: int) -> None:
+    """
+    Write a CSR inverted index over ``documents`` ((row, text) pairs) to
+    ``path``. Rows never yielded (deleted chunks) get no postings.
+    """
+    vocab: dict[str, int] = {}
+    doc_lens = np.zeros(num_rows, dtype=np.int32)
+    term_ids, rows, tfs, num_docs = _tokenize_documents(documents, vocab, doc_lens)
+    _write_bm25_index(path, vocab, term_ids, rows, tfs, doc_lens, num_docs, generation)
+
+
+def update_bm25_index(
+    path: Path,
+    base: "BM25Index",
+    documents: Iterable[tuple[int, str]],
+    num_rows: int,
+    deleted: np.ndarray,
+    generation: int,
+) -> None:
+    """
+    Write to ``path`` the index ``base`` with the postings of ``deleted``
+    rows dropped and ``documents`` (rows from ``base.count`` on) added.
+    Only the added rows are tokenized; terms left without postings are
+    dropped from the vocabulary.
+    """
+    vocab = dict(base.vocab)
+    doc_lens = np.zeros(num_rows, dtype=np.int32)
+    doc_lens[:base.count] = np.load(base.path / DOC_LENS_FILE)
+    doc_lens[deleted] = 0
+    term_ids, rows, tfs, _ = _tokenize_documents(documents, vocab, doc_lens)
+
+    old_term_ids = np.repeat(np.arange(len(base.vocab), dtype=np.int32), np.diff(base.indptr))
+    old_rows = np.asarray(base.posting_rows)
+    keep = ~deleted[old_rows]
+    num_docs = int(num_rows - deleted.sum())
+    _write_bm25_index(
+        path,
+        vocab,
+        np.concatenate([old_term_ids[keep], term_ids]),
+        np.concatenate([old_rows[keep], rows]),
+        np.concatenate([np.asarray(base.posting_tfs)[keep], tfs]),
+        doc_lens,
+        num_docs,
+        generation,
+    )
+
+
+def _tokenize_documents(
+    documents: Iterable[tuple[int, str]], vocab: dict[str, int], doc_lens: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """(term ids, rows, tfs) of the postings of ``documents`` and their count; extends ``vocab``."""
+    term_ids = array("i")
+    rows = array("i")
+    tfs = array("i")
+    num_docs = 0
+    for row, text in documents:
+        counts = Counter(tokenize(text))
+        doc_lens[row] = sum(counts.values())
+        num_docs += 1
+        for term, tf in counts.items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            rows.append(row)
+            tfs.append(tf)
+    return (
+        np.asarray(term_ids, dtype=np.int32),
+        np.asarray(rows, dtype=np.int32),
+        np.asarray(tfs, dtype=np.int32),
+        num_docs,
+    )
+
+
+def _write_bm25_index(
+    path: Path,
+    vocab: dict[str, int],
+    term_ids: np.ndarray,
+    rows: np.ndarray,
+    tfs: np.ndarray,
+    doc_lens: np.ndarray,
+    num_docs: int,
+    generation: int,
+) -> None:
+    """Write postings given in ascending row order per term as CSR arrays."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    # Renumber the terms that still have postings
+    counts = np.bincount(term_ids, minlength=len(vocab))
+    live = counts > 0
+    new_ids = np.cumsum(live) - 1
+    num_terms = int(live.sum())
+    # Stable, so the rows of every posting list stay in ascending order
+    order = np.argsort(term_ids, kind="stable")
+    indptr = np.zeros(num_terms + 1, dtype=np.int64)
+    np.cumsum(counts[live], out=indptr[1:])
+
+    np.save(path / INDPTR_FILE, indptr)
+    np.save(path / POSTING_ROWS_FILE, rows[order])
+    np.save(path / POSTING_TFS_FILE, tfs[order])
+    np.save(path / DOC_LENS_FILE, doc_lens)
+    terms = [""] * num_terms
+    for term, term_id in vocab.items():
+        if live[term_id]:
+            terms[new_ids[term_id]] = term
+    (path / TERMS_FILE).write_text(json.dumps(terms, ensure_ascii=False))
+
+    meta = {
+        "count": len(doc_lens),
+        "num_docs": num_docs,
+        "avgdl": float(doc_lens.sum() / num_docs) if num_docs else 0.0,
+        "generation": generation,
+    }
+    (path / META_FILE).write_text(json.dumps(meta))
+
+
+class BM25Index:
+    """
+    Memory-mapped BM25 inverted index scored with NumPy.
+
+    Scores follow Lucene's BM25Similarity (idf * tf / (tf + k1 * (1 - b +
+    b * dl / avgdl))), without its lossy length encoding, so rankings match
+    Lucene closely but scores are not identical.
+    """
+
+    def __init__(self, path: Path, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / META_FILE).read_text())
+        self.count = self.meta["count"]
+        terms = json.loads((self.path / TERMS_FILE).read_text())
+        self.vocab = {term: term_id for term_id, term in enumerate(terms)}
+
+        self.indptr = np.load(self.path / INDPTR_FILE)
+        self.posting_rows = np.load(self.path / POSTING_ROWS_FILE, mmap_mode="r")
+        self.posting_tfs = np.load(self.path / POSTING_TFS_FILE, mmap_mode="r")
+
+        self.k1 = k1
+        self.b = b
+        num_docs = self.meta["num_docs"]
+        df = np.diff(self.indptr).astype(np.float32)
+        self.idf = np.log1p((num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self.doc_lens = np.load(self.path / DOC_LENS_FILE).astype(np.float32)
+        avgdl = self.meta["avgdl"] or 1.0
+        # Per-row length normalization, computed once instead of per query
+        self.norms = (k1 * (1 - b + b * self.doc_lens / avgdl)).astype(np.float32)
+
+    @staticmethod
+    def exists(path: Path) -> bool:
+        return (Path(path) / META_FILE).exists()
+
+    def generation(self) -> int:
+        return self.meta["generation"]
+
+    @staticmethod
+    def read_generation(path: Path) -> int:
+        return json.loads((Path(path) / META_FILE).read_text())["generation"]
+
+    def collection_stats(self, query: str) -> CollectionStats:
+        """Document count, total length and the document frequencies of the query terms."""
+        doc_freqs = {}
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is not None:
+                doc_freqs[term] = int(self.indptr[term_id + 1] - self.indptr[term_id])
+        num_docs = self.meta["num_docs"]
+        return CollectionStats(num_docs, self.meta["avgdl"] * num_docs, doc_freqs)
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        stats: CollectionStats | None = None,
+        allowed: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return (rows, scores) of the best ``top_k`` matching rows, best first.
+
+        ``stats`` replaces this index's own corpus statistics, e.g. with
+        those of all shards, so scores are comparable across indexes.
+        With an ``allowed`` row mask only postings of those rows are scored.
+        """
+        terms = []
+        term_ids = []
+        query_tfs = []
+        for term, qtf in Counter(tokenize(query)).items():
+            term_id = self.vocab.get(term)
+            if term_id is not None:
+                terms.append(term)
+                term_ids.append(term_id)
+                query_tfs.append(qtf)
+        if not term_ids or top_k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        if stats is None:
+            idf = self.idf[term_ids]
+        else:
+            df = np.asarray([stats.doc_freqs.get(term, 0) for term in terms], dtype=np.float32)
+            idf = np.log1p((stats.num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        # Gather every posting of the query terms and score them in one pass
+        starts = self.indptr[term_ids]
+        lengths = self.indptr[np.asarray(term_ids) + 1] - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        rows = np.asarray(self.posting_rows[positions])
+        tfs = np.asarray(self.posting_tfs[positions], dtype=np.float32)
+        weights = np.repeat(idf * np.asarray(query_tfs, dtype=np.float32), lengths)
+        if allowed is not None:
+            keep = allowed[rows]
+            rows, tfs, weights = rows[keep], tfs[keep], weights[keep]
+
+        if stats is None:
+            norms = self.norms[rows]
+        else:
+            avgdl = stats.total_len / stats.num_docs if stats.num_docs else 1.0
+            norms = self.k1 * (1 - self.b + self.b * self.doc_lens[rows] / (avgdl or 1.0))
+        contributions = weights * tfs / (tfs + norms)
+        scores = np.bincount(rows, weights=contributions, minlength=self.count).astype(np.float32)
+
+        candidates = np.flatnonzero(scores > 0)
+        k = min(top_k, candidates.size)
+        if k < candidates.size:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        # Best score first, ties broken by row like Lucene breaks them by doc id
+        order = np.lexsort((candidates, -scores[candidates]))
+        top_rows = candidates[order]
+        return top_rows, scores[top_rows]
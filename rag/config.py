@@ -1,18 +1,145 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).parent.parent
 
 RAW_DATA_DIR = BASE_DIR / "data" / "raw"
 INDEX_DIR = BASE_DIR / "index" / "lucene_index"
+# Kept outside INDEX_DIR so it survives index rebuilds
+EMBEDDING_CACHE_DIR = Path(os.environ.get("EMBEDDING_CACHE_DIR", BASE_DIR / "index" / "embedding_cache"))
 
 CHUNK_SIZE = 400
 CHUNK_OVERLAP = 50 
+# A chunk ends after the last sentence in its final CHUNK_SENTENCE_LOOKBACK
+# words, if there is one, rather than mid-sentence
+CHUNK_SENTENCE_LOOKBACK = 40
 
 TOP_K = 5 
 
+# Hybrid retrieval: "rrf" (reciprocal rank fusion) or "weighted" (normalized scores)
+HYBRID_FUSION = "rrf"
+HYBRID_RRF_K = 60
+HYBRID_BM25_WEIGHT = 0.5
+HYBRID_VECTOR_WEIGHT = 0.5
+HYBRID_CANDIDATE_MULTIPLIER = 2  # each retriever fetches top_k * this before fusing
+
+# Every retrieval mode fetches top_k * RERANK_POOL_MULTIPLIER candidates and
+# keeps top_k by Maximal Marginal Relevance: each pick maximizes
+# lambda * relevance - (1 - lambda) * its highest cosine similarity to the
+# chunks already picked, relevance being the retriever scores min-max scaled
+# over the candidates. Candidate vectors are read from the vector index.
+RERANK_MMR = True
+RERANK_POOL_MULTIPLIER = 4
+RERANK_MMR_LAMBDA = 0.7  # 1.0 ranks by relevance only, lower favors diversity
+
+# Threads (attached to the JVM) running Lucene searches for the async API
+LUCENE_EXECUTOR_WORKERS = 8
+
+# Number of index shards built by scripts/build_index.py (1 = a single index),
+# partitioned by hash of the source file name
+INDEX_SHARDS = 1
+SHARD_SEARCH_WORKERS = 16  # threads searching shards in parallel
+
+# How often a long-lived searcher checks the index for new commits
+INDEX_REFRESH_INTERVAL_SECONDS = 5.0
+# Full rebuilds are written to a new sibling of INDEX_DIR (lucene_index@<time>)
+# and INDEX_DIR, a symlink, is switched to it once committed; running apps
+# open the new version on their next refresh and close the replaced one
+# INDEX_RETIRE_SECONDS later, after in-flight searches finished
+INDEX_VERSIONS_KEEP = 2  # versions left on disk, the current one included
+INDEX_RETIRE_SECONDS = 60.0
+# Searched on every newly opened index before it serves queries, to start
+# the JVM, page the index in and load the Ollama embedding model ("" = off)
+INDEX_WARMUP_QUERY = "warm up"
+
 EMBEDDING_MODEL_NAME = "nomic-embed-text"
 EMBEDDING_DIM = 768
+EMBEDDING_BATCH_SIZE = 32  # texts per /api/embed request
+EMBEDDING_MAX_CONCURRENCY = 4  # embedding requests in flight at once
+EMBEDDING_CACHE_MAX_ENTRIES = 100_000  # ~300 MB of float32 vectors at 768 dims
+# Concurrent search queries are embedded together: a batch is sent once
+# QUERY_EMBEDDING_MAX_BATCH_SIZE queries wait or QUERY_EMBEDDING_MAX_WAIT_MS
+# after the first one arrived
+QUERY_EMBEDDING_BATCHING = True
+QUERY_EMBEDDING_MAX_BATCH_SIZE = 32
+QUERY_EMBEDDING_MAX_WAIT_MS = 5
+
+# Where chunk vectors are stored and searched:
+# "lucene": kNN vector field + HNSW inside the Lucene index (see LUCENE_VECTOR_*)
+# "numpy": exact search over a memory-mapped matrix, no JVM needed
+VECTOR_BACKEND = "lucene"
+NUMPY_INDEX_DIRNAME = "numpy_index"  # subdirectory of INDEX_DIR
+NUMPY_VECTOR_DTYPE = "float16"  # or "float32"
+NUMPY_SEARCH_BLOCK_ROWS = 16384  # rows scored per matrix product
+NUMPY_DOCUMENT_CACHE_ENTRIES = 256  # decompressed documents kept per chunk store
+LUCENE_DOCUMENT_CACHE_ENTRIES = 256  # stored file texts kept per Lucene searcher manager
+
+# Lucene kNN field settings (changing them forces a full rebuild).
+# Similarity: "euclidean", "cosine", "dot_product" or "maximum_inner_product".
+# Encoding "int8" stores normalized, quantized byte vectors: 4x smaller than
+# "float32" at a small recall cost; measure with scripts.eval_vector_index
+LUCENE_VECTOR_SIMILARITY = "euclidean"
+LUCENE_VECTOR_ENCODING = "float32"
+# HNSW candidates collected per query before keeping top_k (None = top_k);
+# larger values trade latency for recall
+LUCENE_KNN_NUM_CANDIDATES = None
 
-OLLAMA_BASE_URL = "http://ollama:11434/v1"
+# Where BM25 runs:
+# "lucene": LuceneBM25Retriever over the Lucene index
+# "numpy": array-backed inverted index next to the NumPy chunk store, no JVM needed
+BM25_BACKEND = "lucene"
+BM25_K1 = 1.2  # Lucene's BM25Similarity defaults
+BM25_B = 0.75
+
+# Bounded queues between the ingestion pipeline stages
+INGEST_DOCUMENT_QUEUE_SIZE = 8  # whole documents between reader and chunker
+INGEST_CHUNK_QUEUE_SIZE = 512  # chunks between chunker, embedder and writer
+# Processes reading and chunking documents, and threads adding documents to
+# the Lucene IndexWriter; 1 keeps both in a single thread, 0 uses every core
+INGEST_WORKERS = 1
+
+# Exact and near-duplicate chunks (MinHash over word shingles, LSH buckets)
+# are skipped before embedding; a chunk is a near duplicate when at least
+# DEDUP_THRESHOLD of the signatures agree with an already indexed chunk
+INGEST_DEDUP = True
+DEDUP_THRESHOLD = 0.9
+DEDUP_NUM_PERM = 64
+DEDUP_BANDS = 16  # 4 rows per band
+DEDUP_SHINGLE_WORDS = 5
+
+# Lucene IndexWriter tuning for builds
+LUCENE_RAM_BUFFER_MB = 256.0  # buffered before a segment is flushed (Lucene default: 16)
+LUCENE_MERGE_POLICY = "tiered"  # "tiered" or "log_byte_size"
+LUCENE_SEGMENTS_PER_TIER = 10.0
+LUCENE_MAX_MERGED_SEGMENT_MB = 5 * 1024.0
+# Merge down to this many segments after a full build (None: leave to the merge policy)
+LUCENE_FORCE_MERGE_SEGMENTS = None
+
+# Native Ollama API; the environment override lets benchmarks point at a fake server
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://ollama:11434")
+OLLAMA_BASE_URL = f"{OLLAMA_HOST}/v1"  # OpenAI-compatible API used by the agent
 OLLAMA_MODEL_NAME = "mistral"
 
+# Answers reused for repeated questions until the index is rebuilt
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_MAX_ENTRIES = 1024
+ANSWER_CACHE_TTL_SECONDS = 3600
+# Cosine similarity of question embeddings above which a cached answer is reused
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95
+
+# Retrieved chunks are packed before generation: adjacent chunks of a file
+# merged, near-duplicates (passages with >= threshold of their word 3-grams
+# already included) dropped and the rest cut to a token budget, best first.
+# Tokens are estimated from characters.
+CONTEXT_PACKING = True
+CONTEXT_TOKEN_BUDGET = 2000
+CONTEXT_DUPLICATE_THRESHOLD = 0.8
+CONTEXT_MIN_PASSAGE_TOKENS = 50  # smaller leftovers of the budget are not filled
+CONTEXT_CHARS_PER_TOKEN = 4.0
+
+# "agent": pydantic-ai agent calls retrieve_chunks as a tool (2+ LLM calls)
+# "direct": retrieve in Python, then a single grounded generation call
+RAG_PIPELINE = "agent"
+
+# Prometheus /metrics endpoint started by the Streamlit app; 0 disables it
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9464))
@@ -0,0 +1,174 @@
+import logging
+import math
+from typing import NamedTuple
+
+from rag.config import (
+    CONTEXT_CHARS_PER_TOKEN,
+    CONTEXT_DUPLICATE_THRESHOLD,
+    CONTEXT_MIN_PASSAGE_TOKENS,
+    CONTEXT_TOKEN_BUDGET,
+)
+from rag.models import RetrievedChunk
+from rag.tracing import METRICS, TOKEN_BUCKETS, span
+
+logger = logging.getLogger(__name__)
+
+_SHINGLE_SIZE = 3
+_TRUNCATION_MARKER = " ..."
+
+
+class Passage(NamedTuple):
+    """Consecutive chunks of one source, merged into a single context passage."""
+
+    id: int  # of the first chunk
+    source: str
+    first_chunk: int
+    last_chunk: int
+    start: int  # character span of the content in the source file
+    end: int
+    content: str
+    score: float
+
+    @property
+    def label(self) -> str:
+        if self.first_chunk == self.last_chunk:
+            return f"{self.source}, chunk {self.first_chunk}"
+        return f"{self.source}, chunks {self.first_chunk}-{self.last_chunk}"
+
+
+class PackedContext(NamedTuple):
+    passages: list[Passage]
+    tokens_before: int  # of the retrieved chunks, as they would have been sent
+    tokens_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def estimate_tokens(text: str, chars_per_token: float = CONTEXT_CHARS_PER_TOKEN) -> int:
+    """Rough token count; the Ollama API exposes no tokenizer."""
+    return math.ceil(len(text) / chars_per_token)
+
+
+def merge_adjacent(chunks: list[RetrievedChunk]) -> list[Passage]:
+    """
+    Merge hits with consecutive chunk indexes of the same source into the
+    text their spans cover together, so the overlap each chunk repeats from
+    the previous one is kept once. A passage scores as its best chunk.
+    Repeated hits of one chunk are kept once.
+    """
+    by_source: dict[str, dict[int, RetrievedChunk]] = {}
+    for chunk in chunks:
+        source_chunks = by_source.setdefault(chunk["source"], {})
+        known = source_chunks.get(chunk["chunk_index"])
+        if known is None or chunk["score"] > known["score"]:
+            source_chunks[chunk["chunk_index"]] = chunk
+
+    passages: list[Passage] = []
+    for source, source_chunks in by_source.items():
+        run: list[RetrievedChunk] = []
+        for index in sorted(source_chunks):
+            if run and index != run[-1]["chunk_index"] + 1:
+                passages.append(_merge_run(source, run))
+                run = []
+            run.append(source_chunks[index])
+        passages.append(_merge_run(source, run))
+    return passages
+
+
+def _merge_run(source: str, run: list[RetrievedChunk]) -> Passage:
+    content, end = run[0]["content"], run[0]["end"]
+    for chunk in run[1:]:
+        if chunk["start"] <= end:
+            content += chunk["content"][end - chunk["start"]:]
+        else:
+            # Without overlap the whitespace between chunks is not retrieved
+            content += " " + chunk["content"]
+        end = max(end, chunk["end"])
+    return Passage(
+        run[0]["id"], source, run[0]["chunk_index"], run[-1]["chunk_index"], run[0]["start"], end, content,
+        max(chunk["score"] for chunk in run),
+    )
+
+
+def _shingles(text: str) -> set[tuple[str, ...]]:
+    words = text.lower().split()
+    if len(words) < _SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)}
+
+
+def drop_near_duplicates(
+    passages: list[Passage], threshold: float = CONTEXT_DUPLICATE_THRESHOLD
+) -> list[Passage]:
+    """
+    Keep passages best first, skipping any with at least ``threshold`` of
+    its word 3-grams already in kept passages, e.g. the same text in two
+    files or a chunk that a merged passage already covers.
+    """
+    kept: list[Passage] = []
+    seen: set[tuple[str, ...]] = set()
+    for passage in sorted(passages, key=lambda passage: -passage.score):
+        shingles = _shingles(passage.content)
+        if len(shingles & seen) >= threshold * len(shingles):
+            continue
+        kept.append(passage)
+        seen |= shingles
+    return kept
+
+
+def _truncate(text: str, max_tokens: int, chars_per_token: float) -> str:
+    max_chars = int(max_tokens * chars_per_token) - len(_TRUNCATION_MARKER)
+    if len(text) <= max_chars:
+        return text
+    # Cut at a word boundary
+    cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > 0 else max_chars] + _TRUNCATION_MARKER
+
+
+def pack_context(
+    chunks: list[RetrievedChunk],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD,
+    min_passage_tokens: int = CONTEXT_MIN_PASSAGE_TOKENS,
+    chars_per_token: float = CONTEXT_CHARS_PER_TOKEN,
+) -> PackedContext:
+    """
+    Turn retrieved chunks into the passages sent to the LLM, best first:
+    adjacent and overlapping chunks are merged, near-duplicates dropped,
+    and passages added by score until ``token_budget`` is reached. A
+    passage that does not fit is truncated if at least
+    ``min_passage_tokens`` remain, otherwise left out.
+
+    Prompt processing on CPU takes time proportional to the context
+    length, so every token saved here shortens time to first token.
+    """
+    with span("pack_context"):
+        tokens_before = sum(estimate_tokens(chunk["content"], chars_per_token) for chunk in chunks)
+        passages = drop_near_duplicates(merge_adjacent(chunks), duplicate_threshold)
+
+        packed: list[Passage] = []
+        remaining = token_budget
+        for passage in passages:
+            tokens = estimate_tokens(passage.content, chars_per_token)
+            if tokens > remaining:
+                if remaining < min_passage_tokens:
+                    continue
+                content = _truncate(passage.content, remaining, chars_per_token)
+                # The cited span ends with the text kept, not at the marker
+                kept = len(content) - len(_TRUNCATION_MARKER) if content != passage.content else len(content)
+                passage = passage._replace(content=content, end=min(passage.end, passage.start + kept))
+                tokens = estimate_tokens(passage.content, chars_per_token)
+            packed.append(passage)
+            remaining -= tokens
+
+        result = PackedContext(packed, tokens_before, token_budget - remaining)
+
+    METRICS.observe_size("context_tokens", result.tokens_after, TOKEN_BUCKETS)
+    METRICS.observe_size("context_tokens_saved", result.tokens_saved, TOKEN_BUCKETS)
+    logger.info(
+        "Packed %d chunks into %d passages, ~%d tokens (~%d saved)",
+        len(chunks), len(packed), result.tokens_after, result.tokens_saved,
+    )
+    return result
@@ -0,0 +1,203 @@
+import hashlib
+import os
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from rag.config import DEDUP_BANDS, DEDUP_NUM_PERM, DEDUP_SHINGLE_WORDS, DEDUP_THRESHOLD
+
+# Written next to the manifest; the state of the last committed build
+DEDUP_FILE = "dedup.npz"
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles. Shingles are hashed to 32 bits
+    and permuted with ``(a * x + b) mod (2**61 - 1)``; with ``a`` and ``b``
+    below 2**32 that never overflows uint64, so one vectorized product
+    computes all permutations of a chunk.
+    """
+
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, shingle_words: int = DEDUP_SHINGLE_WORDS, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+
+    def shingle_hashes(self, words: list[str]) -> np.ndarray:
+        n = self.shingle_words
+        shingles = (" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1)))
+        return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64)
+
+    def signature(self, words: list[str]) -> np.ndarray:
+        hashes = self.shingle_hashes(words)
+        permuted = (np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME
+        return (permuted.min(axis=0) & _MAX_HASH).astype(np.uint32)
+
+
+class ChunkDeduplicator:
+    """
+    Finds exact and near-duplicate chunks among those seen so far.
+
+    Exact duplicates (same words, ignoring case and whitespace) are found
+    by digest. Near duplicates are found by MinHash: signatures are split
+    into ``bands`` bands and chunks sharing any band become candidates;
+    a candidate is a duplicate when at least ``threshold`` of the
+    signatures agree (an estimate of the shingle Jaccard similarity).
+
+    Every kept chunk is remembered with its (source, chunk_index); a skipped
+    chunk is linked to the kept chunk it duplicates, so a file can be
+    re-processed when the file holding its canonical chunks goes away.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEDUP_THRESHOLD,
+        num_perm: int = DEDUP_NUM_PERM,
+        bands: int = DEDUP_BANDS,
+        shingle_words: int = DEDUP_SHINGLE_WORDS,
+    ):
+        if num_perm % bands:
+            raise ValueError(f"DEDUP_NUM_PERM ({num_perm}) must be a multiple of DEDUP_BANDS ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm, shingle_words)
+
+        self.keys: list[tuple[str, int]] = []
+        self.signatures: list[np.ndarray] = []
+        self.digests: list[bytes] = []
+        self._by_digest: dict[bytes, int] = {}
+        self._buckets: list[dict[bytes, list[int]]] = [{} for _ in range(bands)]
+        # duplicate source -> sources holding the canonical chunks
+        self.links: dict[str, set[str]] = {}
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    @property
+    def params(self) -> dict:
+        return {
+            "threshold": self.threshold,
+            "num_perm": self.hasher.num_perm,
+            "bands": self.bands,
+            "shingle_words": self.hasher.shingle_words,
+        }
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, source: str, chunk_index: int, text: str) -> tuple[str, int] | None:
+        """
+        Remember the chunk and return None, or return the (source,
+        chunk_index) of the kept chunk it duplicates.
+        """
+        words = text.lower().split()
+        digest = hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=16).digest()
+        match = self._by_digest.get(digest)
+        if match is not None:
+            self.exact_duplicates += 1
+            return self._link(source, match)
+
+        signature = self.hasher.signature(words)
+        match = self._near_match(signature)
+        if match is not None:
+            self.near_duplicates += 1
+            return self._link(source, match)
+
+        self._insert(source, chunk_index, signature, digest)
+        return None
+
+    def _near_match(self, signature: np.ndarray) -> int | None:
+        checked: set[int] = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                    return candidate
+        return None
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _insert(self, source: str, chunk_index: int, signature: np.ndarray, digest: bytes) -> None:
+        entry = len(self.keys)
+        self.keys.append((source, chunk_index))
+        self.signatures.append(signature)
+        self.digests.append(digest)
+        self._by_digest.setdefault(digest, entry)
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, []).append(entry)
+
+    def _link(self, source: str, entry: int) -> tuple[str, int]:
+        canonical = self.keys[entry]
+        if canonical[0] != source:
+            self.links.setdefault(source, set()).add(canonical[0])
+        return canonical
+
+    def dependents(self, sources: set[str]) -> set[str]:
+        """Sources whose skipped chunks link, directly or not, to any of ``sources``."""
+        affected = set(sources)
+        while True:
+            more = {
+                source for source, canonical in self.links.items()
+                if source not in affected and canonical & affected
+            }
+            if not more:
+                return affected - set(sources)
+            affected |= more
+
+    def without_sources(self, sources: set[str]) -> "ChunkDeduplicator":
+        """A copy forgetting the chunks and links of ``sources``."""
+        copy = ChunkDeduplicator(self.threshold, self.hasher.num_perm, self.bands, self.hasher.shingle_words)
+        for key, signature, digest in zip(self.keys, self.signatures, self.digests):
+            if key[0] not in sources:
+                copy._insert(key[0], key[1], signature, digest)
+        copy.links = {
+            source: set(canonical) for source, canonical in self.links.items() if source not in sources
+        }
+        return copy
+
+    def save(self, path: Path) -> None:
+        names = sorted({source for source, _ in self.keys} | set(self.links))
+        name_ids = {name: i for i, name in enumerate(names)}
+        link_pairs = [(name_ids[source], name_ids[canonical])
+                      for source, canonicals in self.links.items() for canonical in canonicals]
+        tmp_path = Path(path).with_name(Path(path).name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                names=np.array(names, dtype=str),
+                sources=np.array([name_ids[source] for source, _ in self.keys], dtype=np.int32),
+                chunk_indexes=np.array([index for _, index in self.keys], dtype=np.int32),
+                signatures=np.array(self.signatures, dtype=np.uint32).reshape(len(self.keys), self.hasher.num_perm),
+                # Raw bytes: a bytes dtype ("S16") would strip trailing NULs
+                digests=np.frombuffer(b"".join(self.digests), dtype=np.uint8).reshape(len(self.keys), 16),
+                links=np.array(link_pairs, dtype=np.int32).reshape(-1, 2),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path, **params) -> "ChunkDeduplicator":
+        dedup = cls(**params)
+        with np.load(path) as data:
+            names = [str(name) for name in data["names"]]
+            digests = data["digests"]
+            if digests.dtype.kind == "S":
+                # Saved as "S16", which dropped trailing NUL bytes
+                digests = [bytes(digest).ljust(16, b"\0") for digest in digests]
+            else:
+                digests = [digest.tobytes() for digest in digests]
+            for source_id, chunk_index, signature, digest in zip(
+                data["sources"], data["chunk_indexes"], data["signatures"], digests
+            ):
+                dedup._insert(names[source_id], int(chunk_index), signature, digest)
+            for source_id, canonical_id in data["links"]:
+                dedup.links.setdefault(names[source_id], set()).add(names[canonical_id])
+        return dedup
@@ -0,0 +1,219 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Callable, Iterator
+
+from rag.answer_cache import lookup_answer, store_answer
+from rag.config import CONTEXT_PACKING, OLLAMA_HOST, OLLAMA_MODEL_NAME
+from rag.context_packing import pack_context
+from rag.llm_client import AsyncOllamaLLMClient, OllamaLLMClient
+from rag.models import MetadataFilter, RAGResult, RetrievalMode, RetrievedChunk, RetrievedChunkModel
+from rag.retrieval_service import aget_retrieval_service, aretrieve, get_retrieval_service, retrieve
+from rag.retriever import get_lucene_executor
+from rag.tracing import Trace, log_trace, record, span, start_trace
+
+
+DIRECT_PROMPT_TEMPLATE = """You are a retrieval-augmented assistant.
+
+Answer the question using only the numbered context passages below.
+If the passages do not contain the answer, say that you don't know.
+Give a concise, clear answer.
+
+Context:
+{context}
+
+Question: {question}
+
+Answer:"""
+
+
+_llm_client: OllamaLLMClient | None = None
+_async_llm_client: AsyncOllamaLLMClient | None = None
+
+
+def get_llm_client() -> OllamaLLMClient:
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = OllamaLLMClient(OLLAMA_MODEL_NAME, OLLAMA_HOST)
+    return _llm_client
+
+
+def get_async_llm_client() -> AsyncOllamaLLMClient:
+    global _async_llm_client
+    if _async_llm_client is None:
+        _async_llm_client = AsyncOllamaLLMClient(OLLAMA_MODEL_NAME, OLLAMA_HOST)
+    return _async_llm_client
+
+
+def build_grounded_prompt(question: str, chunks: list[RetrievedChunk]) -> str:
+    """Prompt with the chunks as numbered passages, packed (see pack_context) if CONTEXT_PACKING."""
+    if CONTEXT_PACKING:
+        passages = [
+            f"[{i}] ({passage.label})\n{passage.content}"
+            for i, passage in enumerate(pack_context(chunks).passages, start=1)
+        ]
+    else:
+        passages = [
+            f"[{i}] ({chunk['source']}, chunk {chunk['chunk_index']})\n{chunk['content']}"
+            for i, chunk in enumerate(chunks, start=1)
+        ]
+    context = "\n\n".join(passages) if passages else "(no passages found)"
+    return DIRECT_PROMPT_TEMPLATE.format(context=context, question=question)
+
+
+def run_direct_rag(
+    question: str,
+    mode: RetrievalMode,
+    top_k: int = 5,
+    index_dir: Path | None = None,
+    vector_backend: str | None = None,
+    filters: MetadataFilter | None = None,
+) -> RAGResult:
+    """
+    Retrieve in Python, then make a single generation call.
+
+    Unlike the agent pipeline there is no tool-call round-trip and no
+    structured-output parsing, so only one LLM request is made per question.
+    Only chunks of files matching ``filters`` are retrieved.
+    """
+    with start_trace() as trace:
+        with span("rag.direct"):
+            deps = get_retrieval_service(index_dir, vector_backend).deps(filters=filters)
+            chunks = retrieve(deps, question, mode, top_k)
+
+            with span("generate"):
+                answer = get_llm_client().generate(build_grounded_prompt(question, chunks))
+    log_trace(f"direct RAG ({mode})", trace)
+
+    return RAGResult(
+        answer=answer.strip(),
+        retrieval_mode=mode,
+        chunks=[RetrievedChunkModel(**chunk) for chunk in chunks],
+        timings=trace.timings(),
+    )
+
+
+async def arun_direct_rag(
+    question: str,
+    mode: RetrievalMode,
+    top_k: int = 5,
+    index_dir: Path | None = None,
+    vector_backend: str | None = None,
+    filters: MetadataFilter | None = None,
+) -> RAGResult:
+    """Async run_direct_rag for serving many concurrent sessions from one loop."""
+    with start_trace() as trace:
+        with span("rag.direct"):
+            service = await aget_retrieval_service(index_dir, vector_backend)
+            loop = asyncio.get_running_loop()
+            deps = await loop.run_in_executor(get_lucene_executor(), service.deps, True, filters)
+            chunks = await aretrieve(deps, question, mode, top_k)
+
+            with span("generate"):
+                answer = await get_async_llm_client().generate(build_grounded_prompt(question, chunks))
+    log_trace(f"direct RAG ({mode})", trace)
+
+    return RAGResult(
+        answer=answer.strip(),
+        retrieval_mode=mode,
+        chunks=[RetrievedChunkModel(**chunk) for chunk in chunks],
+        timings=trace.timings(),
+    )
+
+
+class RAGStream:
+    """
+    A direct-pipeline answer whose tokens are yielded as Ollama generates
+    them. ``chunks`` is available before the first token; iterate once to
+    consume the answer, then call ``result()``. ``on_complete`` is called
+    with the result once the answer has been fully generated.
+    """
+
+    def __init__(
+        self,
+        mode: RetrievalMode,
+        chunks: list[RetrievedChunk],
+        tokens: Iterator[str],
+        trace: Trace,
+        on_complete: Callable[[RAGResult], None] | None = None,
+        cached: bool = False,
+    ):
+        self.mode = mode
+        self.chunks = chunks
+        self.trace = trace
+        self.started_at = trace.started_at
+        self.time_to_first_token: float | None = None
+        self.total_time: float | None = None
+        self._tokens = tokens
+        self._on_complete = on_complete
+        self.cached = cached
+        self._parts: list[str] = []
+
+    def __iter__(self) -> Iterator[str]:
+        if self.cached:
+            for token in self._tokens:
+                self._parts.append(token)
+                yield token
+            self.total_time = time.perf_counter() - self.started_at
+            log_trace(f"cached answer ({self.mode})", self.trace)
+            return
+
+        generation_started_at = time.perf_counter()
+        for token in self._tokens:
+            if self.time_to_first_token is None:
+                self.time_to_first_token = time.perf_counter() - self.started_at
+                record("generate.first_token", time.perf_counter() - generation_started_at, self.trace)
+            self._parts.append(token)
+            yield token
+        record("generate", time.perf_counter() - generation_started_at, self.trace)
+        self.total_time = time.perf_counter() - self.started_at
+        record("rag.direct", self.total_time, self.trace)
+        log_trace(f"streamed direct RAG ({self.mode})", self.trace)
+        if self._on_complete is not None:
+            self._on_complete(self.result())
+
+    @property
+    def timings(self) -> dict[str, float]:
+        return self.trace.timings()
+
+    @property
+    def answer(self) -> str:
+        return "".join(self._parts)
+
+    def result(self) -> RAGResult:
+        return RAGResult(
+            answer=self.answer.strip(),
+            retrieval_mode=self.mode,
+            chunks=[RetrievedChunkModel(**chunk) for chunk in self.chunks],
+            timings=self.timings,
+        )
+
+
+def stream_direct_rag(
+    question: str,
+    mode: RetrievalMode,
+    top_k: int = 5,
+    index_dir: Path | None = None,
+    vector_backend: str | None = None,
+    filters: MetadataFilter | None = None,
+) -> RAGStream:
+    """
+    Retrieve, then return a RAGStream over the generated answer tokens. A
+    cached answer is replayed as a single token.
+    """
+    service = get_retrieval_service(index_dir, vector_backend)
+    with start_trace() as trace:
+        lookup = lookup_answer(service, question, mode, top_k, filters)
+        if lookup.result is not None:
+            chunks = [chunk.model_dump() for chunk in lookup.result.chunks]
+            return RAGStream(mode, chunks, iter([lookup.result.answer]), trace, cached=True)
+
+        deps = service.deps(filters=filters)
+        chunks = retrieve(deps, question, mode, top_k)
+        prompt = build_grounded_prompt(question, chunks)
+
+    tokens = get_llm_client().generate_stream(prompt)
+    return RAGStream(
+        mode, chunks, tokens, trace,
+        on_complete=lambda result: store_answer(service, lookup, question, mode, top_k, result),
+    )
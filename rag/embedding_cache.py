@@ -0,0 +1,238 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from rag.config import EMBEDDING_CACHE_MAX_ENTRIES
+
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding cache keyed by (model name, SHA-256 of the text).
+
+    Every model gets its own directory holding:
+      vectors.f32  append-only float32 matrix, read through np.memmap
+      keys.log     append log, line i is the text hash stored in row i
+      meta.json    vector dimension and compaction generation
+
+    When the number of rows exceeds ``max_entries`` the least recently used
+    rows are dropped, both files are rewritten and the generation is
+    bumped. Writers in other processes (e.g. the index build next to the
+    app) are serialized with an flock on the store directory; under it a
+    store reloads when another process appended or compacted.
+    """
+
+    def __init__(self, cache_dir: Path, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._stores: dict[str, "_ModelStore"] = {}
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model_name: str, texts: list[str]) -> list[np.ndarray | None]:
+        with self._lock:
+            store = self._store(model_name)
+            with store.locked():
+                return [store.get(self.text_key(txt)) for txt in texts]
+
+    def put_many(self, model_name: str, texts: list[str], vectors: np.ndarray) -> None:
+        if not texts:
+            return
+        with self._lock:
+            store = self._store(model_name)
+            with store.locked():
+                store.put([self.text_key(txt) for txt in texts], vectors)
+                if len(store) > self.max_entries:
+                    # Compact to 90% so we don't rewrite on every following insert
+                    store.compact(int(self.max_entries * 0.9))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(store) for store in self._stores.values())
+
+    def _store(self, model_name: str) -> "_ModelStore":
+        store = self._stores.get(model_name)
+        if store is None:
+            safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+            store = _ModelStore(self.cache_dir / safe_name)
+            self._stores[model_name] = store
+        return store
+
+
+class _ModelStore:
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.path / "vectors.f32"
+        self.keys_path = self.path / "keys.log"
+        self.meta_path = self.path / "meta.json"
+        self.lock_path = self.path / ".lock"
+
+        self.dim: int | None = None
+        # Compactions of the files as last loaded, see meta.json
+        self.generation = 0
+        self.rows: dict[str, int] = {}
+        self.last_used: dict[str, int] = {}
+        self._tick = 0
+        self._mmap: np.memmap | None = None
+        self._keys_size = -1
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @contextmanager
+    def locked(self):
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Pick up appends or compactions made by other processes; a
+                # compaction followed by appends can restore the old size
+                keys_size = self.keys_path.stat().st_size if self.keys_path.exists() else 0
+                if keys_size != self._keys_size or self._read_meta().get("generation", 0) != self.generation:
+                    self._recover_compaction()
+                    self._load()
+                yield
+                self._keys_size = self.keys_path.stat().st_size if self.keys_path.exists() else 0
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, key: str) -> np.ndarray | None:
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        mmap = self._matrix(row + 1)
+        self._touch(key)
+        return np.array(mmap[row], dtype=np.float32)
+
+    def put(self, keys: list[str], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            self._write_meta({**self._read_meta(), "dim": self.dim})
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Embedding dimension {vectors.shape[1]} does not match "
+                f"cached dimension {self.dim} in {self.path}"
+            )
+
+        new_keys, new_rows = [], []
+        for key, vec in zip(keys, vectors):
+            if key in self.rows or key in new_keys:
+                self._touch(key)
+                continue
+            new_keys.append(key)
+            new_rows.append(vec)
+
+        if not new_keys:
+            return
+
+        # Vectors first: a crash between the two writes leaves an orphan
+        # row, which _load() ignores, never a key without its vector.
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.stack(new_rows).tobytes())
+        with open(self.keys_path, "a", encoding="ascii") as f:
+            f.write("".join(f"{key}\n" for key in new_keys))
+
+        start = len(self.rows)
+        for offset, key in enumerate(new_keys):
+            self.rows[key] = start + offset
+            self._touch(key)
+
+    def compact(self, keep: int) -> None:
+        survivors = sorted(self.last_used, key=self.last_used.get, reverse=True)[:keep]
+        survivors.sort(key=self.rows.get)  # sequential reads from the old file
+
+        mmap = self._matrix(len(self.rows))
+        tmp_vectors = self.vectors_path.with_suffix(".f32.tmp")
+        tmp_keys = self.keys_path.with_suffix(".log.tmp")
+        with open(tmp_vectors, "wb") as f:
+            for key in survivors:
+                f.write(np.asarray(mmap[self.rows[key]], dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(tmp_keys, "w", encoding="ascii") as f:
+            f.write("".join(f"{key}\n" for key in survivors))
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._mmap = None
+        self._recover_compaction()
+
+        self.rows = {key: row for row, key in enumerate(survivors)}
+        self.last_used = {key: self.last_used[key] for key in survivors}
+
+    def _recover_compaction(self) -> None:
+        # Both temp files are complete before either is swapped in, so an
+        # interrupted compaction can always be finished on the next start.
+        tmp_vectors = self.vectors_path.with_suffix(".f32.tmp")
+        tmp_keys = self.keys_path.with_suffix(".log.tmp")
+        if tmp_keys.exists():
+            if tmp_vectors.exists():
+                os.replace(tmp_vectors, self.vectors_path)
+            os.replace(tmp_keys, self.keys_path)
+            meta = self._read_meta()
+            self.generation = meta.get("generation", 0) + 1
+            self._write_meta({**meta, "generation": self.generation})
+        elif tmp_vectors.exists():
+            tmp_vectors.unlink()
+
+    def _read_meta(self) -> dict:
+        return json.loads(self.meta_path.read_text()) if self.meta_path.exists() else {}
+
+    def _write_meta(self, meta: dict) -> None:
+        # Replaced, so a crash never leaves a torn meta.json
+        tmp_meta = self.meta_path.with_suffix(".json.tmp")
+        tmp_meta.write_text(json.dumps(meta))
+        os.replace(tmp_meta, self.meta_path)
+
+    def _load(self) -> None:
+        self.rows = {}
+        self._mmap = None
+        previous_use = self.last_used
+        self.last_used = {}
+
+        meta = self._read_meta()
+        self.dim = meta.get("dim", self.dim)
+        self.generation = meta.get("generation", 0)
+        if self.dim is None or not self.keys_path.exists():
+            return
+
+        # A trailing line without "\n" is a torn write and is dropped
+        keys = self.keys_path.read_text(encoding="ascii").split("\n")[:-1]
+        row_bytes = self.dim * 4
+        stored_rows = self.vectors_path.stat().st_size // row_bytes if self.vectors_path.exists() else 0
+        rows = min(len(keys), stored_rows)
+
+        # Trim orphans so that row numbers keep matching line numbers
+        if self.vectors_path.exists() and self.vectors_path.stat().st_size != rows * row_bytes:
+            os.truncate(self.vectors_path, rows * row_bytes)
+        if len(keys) != rows or self.keys_path.stat().st_size != rows * 65:
+            self.keys_path.write_text("".join(f"{key}\n" for key in keys[:rows]), encoding="ascii")
+
+        for row, key in enumerate(keys[:rows]):
+            self.rows[key] = row
+            self._touch(key)
+            if key in previous_use:
+                self.last_used[key] = previous_use[key]
+
+    def _matrix(self, min_rows: int) -> np.memmap:
+        # Re-map after appends have grown the file past the current mapping
+        if self._mmap is None or self._mmap.shape[0] < min_rows:
+            total_rows = self.vectors_path.stat().st_size // (self.dim * 4)
+            self._mmap = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(total_rows, self.dim)
+            )
+        return self._mmap
+
+    def _touch(self, key: str) -> None:
+        self._tick += 1
+        self.last_used[key] = self._tick
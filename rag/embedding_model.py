@@ -1,32 +1,239 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 import numpy as np
 
+from rag.async_http import AsyncClientPool
+from rag.config import EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_CONCURRENCY
+from rag.embedding_cache import EmbeddingCache
+from rag.tracing import span
+
 
 class EmbeddingModel:
-    def __init__(self, model_name: str = "nomic-embed-text", base_url: str = "http://ollama:11434"):
+    def __init__(
+        self,
+        model_name: str = "nomic-embed-text",
+        base_url: str = "http://ollama:11434",
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+        timeout: float = 60,
+        cache: EmbeddingCache | None = None,
+    ):
         self.model_name = model_name
         self.base_url = base_url.rstrip("/")
         self.dimension = None
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.cache = cache
+
+        # One keep-alive pool shared by all worker threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Older Ollama versions only expose the single-prompt /api/embeddings
+        self._use_batch_endpoint = True
+        self._executor: ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
 
     def encode(self, texts: list[str]) -> np.ndarray:
+        with span("embed"):
+            return self._encode(texts)
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
         if isinstance(texts, str):
             texts = [texts]
+        texts = list(texts)
+
+        if not texts:
+            return np.zeros((0, self.dimension or 0), dtype="float32")
+
+        if self.cache is None:
+            with span("embed.remote"):
+                return self._encode_remote(texts)
+
+        cached = self.cache.get_many(self.model_name, texts)
+        missing = [i for i, vec in enumerate(cached) if vec is None]
+        if missing:
+            with span("embed.remote"):
+                fresh = self._encode_remote([texts[i] for i in missing])
+            self.cache.put_many(self.model_name, [texts[i] for i in missing], fresh)
+            for i, vec in zip(missing, fresh):
+                cached[i] = vec
+
+        arr = np.stack(cached).astype("float32", copy=False)
+        if self.dimension is None:
+            self.dimension = arr.shape[1]
+        return arr
+
+    def _encode_remote(self, texts: list[str]) -> np.ndarray:
+        batches = [
+            texts[i : i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
 
-        embeddings = []
-        for txt in texts:
-            resp = requests.post(
-                f"{self.base_url}/api/embeddings",
-                json={"model": self.model_name, "prompt": txt},
-                timeout=60,
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0])]
+        else:
+            # Executor.map keeps results in submission order
+            results = list(self._get_executor().map(self._embed_batch, batches))
+
+        arr = np.array([vec for batch in results for vec in batch], dtype="float32")
+
+        if self.dimension is None:
+            self.dimension = arr.shape[1]
+
+        return arr
+
+    def close(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        self.session.close()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix="embed",
+                )
+            return self._executor
+
+    def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        if self._use_batch_endpoint:
+            resp = self.session.post(
+                f"{self.base_url}/api/embed",
+                json={"model": self.model_name, "input": batch},
+                timeout=self.timeout,
             )
-            resp.raise_for_status()
-            data = resp.json()
-            vec = data["embedding"]
-            embeddings.append(vec)
+            if resp.status_code != 404:
+                resp.raise_for_status()
+                return resp.json()["embeddings"]
+
+            # Either the endpoint or the model is missing; the legacy endpoint
+            # tells us which one by failing the same way for a missing model.
+            vectors = [self._embed_single(txt) for txt in batch]
+            self._use_batch_endpoint = False
+            return vectors
+
+        return [self._embed_single(txt) for txt in batch]
+
+    def _embed_single(self, text: str) -> list[float]:
+        resp = self.session.post(
+            f"{self.base_url}/api/embeddings",
+            json={"model": self.model_name, "prompt": text},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        return resp.json()["embedding"]
+
 
-        arr = np.array(embeddings, dtype="float32")
+class AsyncEmbeddingModel:
+    """
+    asyncio counterpart of EmbeddingModel for the async query path.
+
+    Requests share one httpx connection pool per event loop and at most
+    ``max_concurrency`` of them are in flight per loop.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "nomic-embed-text",
+        base_url: str = "http://ollama:11434",
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+        timeout: float = 60,
+        cache: EmbeddingCache | None = None,
+    ):
+        self.model_name = model_name
+        self.base_url = base_url.rstrip("/")
+        self.dimension = None
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.cache = cache
+        self.clients = AsyncClientPool(self.base_url, self.max_concurrency, timeout)
+        self._use_batch_endpoint = True
+
+    async def encode(self, texts: list[str]) -> np.ndarray:
+        with span("embed"):
+            return await self._encode(texts)
+
+    async def _encode(self, texts: list[str]) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        texts = list(texts)
+
+        if not texts:
+            return np.zeros((0, self.dimension or 0), dtype="float32")
+
+        if self.cache is None:
+            with span("embed.remote"):
+                return await self._encode_remote(texts)
+
+        cached = self.cache.get_many(self.model_name, texts)
+        missing = [i for i, vec in enumerate(cached) if vec is None]
+        if missing:
+            with span("embed.remote"):
+                fresh = await self._encode_remote([texts[i] for i in missing])
+            self.cache.put_many(self.model_name, [texts[i] for i in missing], fresh)
+            for i, vec in zip(missing, fresh):
+                cached[i] = vec
+
+        arr = np.stack(cached).astype("float32", copy=False)
+        if self.dimension is None:
+            self.dimension = arr.shape[1]
+        return arr
+
+    async def _encode_remote(self, texts: list[str]) -> np.ndarray:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(batch: list[str]) -> list[list[float]]:
+            async with semaphore:
+                return await self._embed_batch(batch)
+
+        # gather keeps results in submission order
+        results = await asyncio.gather(
+            *(
+                bounded(texts[i : i + self.batch_size])
+                for i in range(0, len(texts), self.batch_size)
+            )
+        )
+        arr = np.array([vec for batch in results for vec in batch], dtype="float32")
 
         if self.dimension is None:
             self.dimension = arr.shape[1]
 
         return arr
+
+    async def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        client = self.clients.get()
+        if self._use_batch_endpoint:
+            resp = await client.post(
+                "/api/embed", json={"model": self.model_name, "input": batch}
+            )
+            if resp.status_code != 404:
+                resp.raise_for_status()
+                return resp.json()["embeddings"]
+
+            vectors = [await self._embed_single(txt) for txt in batch]
+            self._use_batch_endpoint = False
+            return vectors
+
+        return [await self._embed_single(txt) for txt in batch]
+
+    async def _embed_single(self, text: str) -> list[float]:
+        resp = await self.clients.get().post(
+            "/api/embeddings", json={"model": self.model_name, "prompt": text}
+        )
+        resp.raise_for_status()
+        return resp.json()["embedding"]
+
+    async def aclose(self) -> None:
+        await self.clients.aclose()
@@ -0,0 +1,61 @@
+from rag.models import RetrievedChunk
+
+
+def _chunk_key(chunk: RetrievedChunk) -> tuple[str, int]:
+    # Backends number documents differently, (source, chunk_index) is the
+    # identity every backend agrees on
+    return chunk["source"], chunk["chunk_index"]
+
+
+def reciprocal_rank_fusion(
+    result_lists: list[list[RetrievedChunk]],
+    weights: list[float] | None = None,
+    k: int = 60,
+) -> list[RetrievedChunk]:
+    """
+    Merge ranked lists with (weighted) reciprocal rank fusion:
+    score(d) = sum_i w_i / (k + rank_i(d)), ranks starting at 1.
+    """
+    weights = weights or [1.0] * len(result_lists)
+    fused: dict[tuple[str, int], RetrievedChunk] = {}
+    scores: dict[tuple[str, int], float] = {}
+
+    for results, weight in zip(result_lists, weights):
+        for rank, chunk in enumerate(results, start=1):
+            key = _chunk_key(chunk)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+            fused.setdefault(key, chunk)
+
+    return _ranked(fused, scores)
+
+
+def weighted_score_fusion(
+    result_lists: list[list[RetrievedChunk]],
+    weights: list[float] | None = None,
+) -> list[RetrievedChunk]:
+    """
+    Merge lists by a weighted sum of min-max normalized scores, so BM25 and
+    similarity scores end up on the same [0, 1] scale.
+    """
+    weights = weights or [1.0] * len(result_lists)
+    fused: dict[tuple[str, int], RetrievedChunk] = {}
+    scores: dict[tuple[str, int], float] = {}
+
+    for results, weight in zip(result_lists, weights):
+        if not results:
+            continue
+        raw = [chunk["score"] for chunk in results]
+        low, high = min(raw), max(raw)
+        span = high - low
+        for chunk in results:
+            norm = (chunk["score"] - low) / span if span > 0 else 1.0
+            key = _chunk_key(chunk)
+            scores[key] = scores.get(key, 0.0) + weight * norm
+            fused.setdefault(key, chunk)
+
+    return _ranked(fused, scores)
+
+
+def _ranked(fused: dict[tuple[str, int], RetrievedChunk], scores: dict[tuple[str, int], float]) -> list[RetrievedChunk]:
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [{**fused[key], "score": scores[key]} for key in ranked]
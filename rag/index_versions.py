@@ -0,0 +1,68 @@
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+from rag.config import INDEX_VERSIONS_KEEP
+
+# Versions are siblings of the index path: lucene_index@20240101-120000-000000
+VERSION_SEPARATOR = "@"
+
+
+def new_version_dir(index_dir: Path) -> Path:
+    """Empty sibling directory for a full build of ``index_dir``."""
+    index_dir = Path(index_dir)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = index_dir.with_name(f"{index_dir.name}{VERSION_SEPARATOR}{stamp}")
+    path.mkdir(parents=True)
+    return path
+
+
+def version_dirs(index_dir: Path) -> list[Path]:
+    """Version directories of ``index_dir``, oldest first."""
+    index_dir = Path(index_dir)
+    if not index_dir.parent.exists():
+        return []
+    prefix = f"{index_dir.name}{VERSION_SEPARATOR}"
+    return sorted(
+        path for path in index_dir.parent.iterdir()
+        if path.name.startswith(prefix) and path.is_dir() and not path.is_symlink()
+    )
+
+
+def current_version(index_dir: Path) -> Path:
+    """The directory ``index_dir`` currently points to (itself without versions)."""
+    return Path(index_dir).resolve()
+
+
+def publish_version(index_dir: Path, version_dir: Path) -> None:
+    """
+    Point ``index_dir`` at ``version_dir`` by atomically replacing the
+    symlink, so readers see either the old or the new index, never a
+    partial one. An index built in place (a real directory) is first moved
+    to a version directory of its own.
+    """
+    index_dir = Path(index_dir)
+    link = index_dir.with_name(f".{index_dir.name}.link")
+    link.unlink(missing_ok=True)
+    # Relative, so the link survives mounting the parent elsewhere
+    link.symlink_to(Path(version_dir).name, target_is_directory=True)
+    if index_dir.is_dir() and not index_dir.is_symlink() and not any(index_dir.iterdir()):
+        index_dir.rmdir()
+    elif index_dir.is_dir() and not index_dir.is_symlink():
+        legacy = index_dir.with_name(f"{index_dir.name}{VERSION_SEPARATOR}00000000-legacy")
+        shutil.rmtree(legacy, ignore_errors=True)
+        index_dir.rename(legacy)
+    os.replace(link, index_dir)
+
+
+def prune_versions(index_dir: Path, keep: int = INDEX_VERSIONS_KEEP) -> list[Path]:
+    """Delete all but the newest ``keep`` versions, never the current one."""
+    current = current_version(index_dir)
+    removed = []
+    versions = version_dirs(index_dir)
+    for path in versions[:max(0, len(versions) - max(1, keep))]:
+        if path.resolve() != current:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+    return removed
@@ -1,130 +1,234 @@
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple
 
-try:
-    import lucene  # type: ignore
-    from lucene import JArray  # type: ignore
-    from java.nio.file import Paths # type: ignore
-    from org.apache.lucene.analysis.standard import StandardAnalyzer # type: ignore
-    from org.apache.lucene.document import Document, Field, FieldType, StoredField # type: ignore
-    from org.apache.lucene.index import IndexWriter, IndexWriterConfig, IndexOptions # type: ignore
-    from org.apache.lucene.store import FSDirectory # type: ignore
-    from org.apache.lucene.search.similarities import BM25Similarity # type: ignore
-    from org.apache.lucene.document import KnnVectorField # type: ignore
-    LUCENE_AVAILABLE = True
-except ImportError:
-    LUCENE_AVAILABLE = False
+# PyLucene is imported by the first build that writes a Lucene index
+LUCENE_AVAILABLE = importlib.util.find_spec("lucene") is not None
+if not LUCENE_AVAILABLE:
     print("Warning: PyLucene not available. Please install PyLucene.")
 
 import numpy as np
 
-from rag.config import RAW_DATA_DIR, INDEX_DIR, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_DIM
+from rag.config import (
+    RAW_DATA_DIR,
+    INDEX_DIR,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNK_SENTENCE_LOOKBACK,
+    EMBEDDING_DIM,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_CONCURRENCY,
+    INGEST_DOCUMENT_QUEUE_SIZE,
+    INGEST_CHUNK_QUEUE_SIZE,
+    INGEST_WORKERS,
+    INGEST_DEDUP,
+    LUCENE_RAM_BUFFER_MB,
+    LUCENE_MERGE_POLICY,
+    LUCENE_SEGMENTS_PER_TIER,
+    LUCENE_MAX_MERGED_SEGMENT_MB,
+    LUCENE_FORCE_MERGE_SEGMENTS,
+    VECTOR_BACKEND,
+    BM25_BACKEND,
+    NUMPY_INDEX_DIRNAME,
+    LUCENE_VECTOR_SIMILARITY,
+    LUCENE_VECTOR_ENCODING,
+)
 from rag.embedding_model import EmbeddingModel
+from rag.bm25 import BM25Index
+from rag.dedup import DEDUP_FILE, ChunkDeduplicator
+from rag.numpy_index import BM25_DIRNAME, NumpyIndexWriter, NumpyVectorIndex
+from rag.pipeline import Stage, StageStats, run_pipeline
+from rag.sharding import read_shard_count, remove_shards, shard_dir, shard_for_source, write_shard_count
+from rag.tracing import record, span
+from rag.vector_encoding import encode_vector
+
+
+# str.isspace() of every code point up to the last whitespace one, U+3000
+_IS_SPACE = np.array([chr(code).isspace() for code in range(0x3001)])
+_SENTENCE_END_CODES = np.array([ord(c) for c in ".!?"], dtype=np.uint32)
+_CLOSING_CODES = np.array([ord(c) for c in "\"')]*_"], dtype=np.uint32)
+
+
+def _words(text: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Start and end offsets of the whitespace-separated words of ``text``
+    (as str.split finds them), and whether each word ends a sentence,
+    e.g. ``done.`` or ``(done.)``.
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    is_space = np.zeros(codes.size, dtype=bool)
+    low = codes <= 0x3000
+    is_space[low] = _IS_SPACE[codes[low]]
+    # Padded with whitespace, so word starts and ends alternate
+    padded = np.concatenate(([True], is_space, [True]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    starts, ends = edges[0::2], edges[1::2]
+
+    last = ends - 1
+    for _ in range(2):  # look past up to two closing quotes or brackets
+        last = last - (np.isin(codes[last], _CLOSING_CODES) & (last > starts))
+    return starts, ends, np.isin(codes[last], _SENTENCE_END_CODES)
+
+
+def chunk_spans(
+    text: str,
+    chunk_size: int = 400,
+    chunk_overlap: int = 50,
+    sentence_lookback: int = CHUNK_SENTENCE_LOOKBACK,
+) -> list[tuple[int, int]]:
+    """
+    (start, end) character offsets of chunks of up to ``chunk_size`` words,
+    found with one vectorized pass over ``text`` instead of copying every
+    word. A chunk ends after the last sentence in its final
+    ``sentence_lookback`` words, if any, and the next one starts
+    ``chunk_overlap`` words before its end. Spans start and end at words,
+    so ``text[start:end]`` keeps the original whitespace.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+    starts, ends, sentence_ends = _words(text)
+    num_words = len(starts)
+    if num_words == 0:
+        return []
+    if num_words <= chunk_size:
+        return [(int(starts[0]), int(ends[-1]))]
+
+    # Every chunk must end past the next one's start
+    lookback = max(0, min(sentence_lookback, chunk_size - chunk_overlap - 1))
+    spans = []
+    first = 0
+    while True:
+        last = min(first + chunk_size, num_words)  # exclusive
+        if last < num_words and lookback:
+            in_window = np.flatnonzero(sentence_ends[last - lookback:last])
+            if in_window.size:
+                last = last - lookback + int(in_window[-1]) + 1
+        spans.append((int(starts[first]), int(ends[last - 1])))
+        if last == num_words:
+            return spans
+        first = last - chunk_overlap
 
 
 def chunk_text(text: str, chunk_size: int = 400, chunk_overlap: int = 50) -> list[str]:
-    words = text.split()
-    chunks = []
+    return [text[start:end] for start, end in chunk_spans(text, chunk_size, chunk_overlap)]
 
-    if len(words) <= chunk_size:
-        return [text]
 
-    start = 0
-    while start < len(words):
-        end = min(start + chunk_size, len(words))
-        chunk_words = words[start:end]
-        chunks.append(" ".join(chunk_words))
-        start += chunk_size - chunk_overlap
+MANIFEST_NAME = "manifest.json"
 
-    return chunks
 
+class FullRebuildRequired(Exception):
+    """An incremental build cannot update the index and full rebuilds were not allowed."""
 
-def load_documents(raw_data_dir: Path) -> list[tuple[str, str]]:
-    documents = []
-    raw_data_dir = Path(raw_data_dir)
 
-    if not raw_data_dir.exists():
-        print(f"Warning: Raw data directory {raw_data_dir} does not exist.")
-        return documents
+class ChunkRecord(NamedTuple):
+    source: str
+    chunk_index: int
+    # Character span of the chunk in ``document``, the whole file's text,
+    # which every chunk of the file shares
+    start: int
+    end: int
+    document: str
+    # Of the source file, for metadata filters
+    mtime: float = 0.0
+    size: int = 0
+
+    @property
+    def text(self) -> str:
+        return self.document[self.start:self.end]
+
 
+class ChunkAlias(NamedTuple):
+    """A skipped duplicate chunk of ``source``: filters on it match the kept chunk."""
+
+    source: str
+    canonical_source: str
+    canonical_chunk_index: int
+    mtime: float = 0.0
+    size: int = 0
+
+
+def list_document_files(raw_data_dir: Path) -> list[Path]:
+    raw_data_dir = Path(raw_data_dir)
+    files: list[Path] = []
     for ext in ["*.txt", "*.md"]:
-        for file_path in raw_data_dir.glob(ext):
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    if content.strip():
-                        documents.append((file_path.name, content))
-            except Exception as e:
-                print(f"Error loading {file_path}: {e}")
+        files.extend(raw_data_dir.glob(ext))
+    # Stable order, so the same copy of duplicated text is the one indexed
+    return sorted(files)
 
-    return documents
 
+def read_document(file_path: Path) -> str | None:
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+        return None
+    return content if content.strip() else None
 
-def build_lucene_index(
-    raw_data_dir: Path,
-    index_dir: Path,
-    embedding_model: EmbeddingModel,
-    chunk_size: int = 400,
-    chunk_overlap: int = 50,
-) -> None:
-    if not LUCENE_AVAILABLE:
-        raise ImportError(
-            "PyLucene is not available. Please install PyLucene to build the index."
-        )
 
-    # Initialize Lucene VM
-    if not lucene.getVMEnv():
-        lucene.initVM(vmargs=["-Xmx2g"])
+def load_documents(raw_data_dir: Path) -> list[tuple[str, str]]:
+    documents = []
+    raw_data_dir = Path(raw_data_dir)
 
-    print(f"Loading documents from {raw_data_dir}...")
-    documents = load_documents(raw_data_dir)
-    if not documents:
-        raise ValueError(f"No documents found in {raw_data_dir}")
+    if not raw_data_dir.exists():
+        print(f"Warning: Raw data directory {raw_data_dir} does not exist.")
+        return documents
 
-    print(f"Loaded {len(documents)} documents")
+    for file_path in list_document_files(raw_data_dir):
+        content = read_document(file_path)
+        if content is not None:
+            documents.append((file_path.name, content))
 
-    index_dir = Path(index_dir)
-    index_dir.mkdir(parents=True, exist_ok=True)
+    return documents
 
-    print("Chunking documents and computing embeddings...")
-    all_chunks = []
-    all_embeddings = []
-    chunk_metadata = []  # (source, chunk_index)
 
-    for filename, content in documents:
-        chunks = chunk_text(content, chunk_size, chunk_overlap)
-        for idx, chunk in enumerate(chunks):
-            all_chunks.append(chunk)
-            chunk_metadata.append((filename, idx))
+def file_metadata(file_path: Path) -> tuple[float, int]:
+    """(modification time, size in bytes) of a document file."""
+    stat = Path(file_path).stat()
+    return stat.st_mtime, stat.st_size
 
-    print(f"Created {len(all_chunks)} chunks")
 
-    # Compute embeddings in batches
-    batch_size = 32
-    for i in range(0, len(all_chunks), batch_size):
-        batch = all_chunks[i : i + batch_size]
-        embeddings = embedding_model.encode(batch)
-        all_embeddings.append(embeddings)
-        if (i // batch_size + 1) % 10 == 0:
-            print(f"Computed embeddings for {min(i + batch_size, len(all_chunks))} chunks...")
+def file_sha256(file_path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-    all_embeddings = np.vstack(all_embeddings)
-    print(f"Computed {len(all_embeddings)} embeddings of dimension {all_embeddings.shape[1]}")
 
-    print(f"Building Lucene index in {index_dir}...")
+def load_manifest(index_dir: Path) -> dict | None:
+    manifest_path = Path(index_dir) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+    try:
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"Warning: could not read index manifest {manifest_path}: {e}")
+        return None
 
-    directory = FSDirectory.open(Paths.get(str(index_dir)))
-    analyzer = StandardAnalyzer()
 
-    config = IndexWriterConfig(analyzer)
-    config.setSimilarity(BM25Similarity())
+def write_manifest(index_dir: Path, manifest: dict) -> None:
+    manifest_path = Path(index_dir) / MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    tmp_path.replace(manifest_path)
 
-    writer = IndexWriter(directory, config)
 
-    # Define field types
-    # Text field for BM25 search (stored and indexed)
+def _create_field_types():
+    # Text field for BM25 search (indexed only: chunks are sliced from the
+    # document text, stored once per file, see _make_parent_document)
     text_field_type = FieldType()
     text_field_type.setIndexOptions(IndexOptions.DOCS_AND_FREQS_AND_POSITIONS)
-    text_field_type.setStored(True)
+    text_field_type.setStored(False)
     text_field_type.setTokenized(True)
     text_field_type.freeze()
 
@@ -135,37 +239,684 @@ def build_lucene_index(
     string_field_type.setTokenized(False)
     string_field_type.freeze()
 
-    # Add documents to index
-    doc_id = 0
-    for (chunk, embedding), (source, chunk_idx) in zip(
-        zip(all_chunks, all_embeddings), chunk_metadata
+    return text_field_type, string_field_type
+
+
+def _make_document(
+    chunk: str,
+    embedding: np.ndarray | None,
+    source: str,
+    chunk_idx: int,
+    doc_id: int,
+    field_types,
+    similarity: str = LUCENE_VECTOR_SIMILARITY,
+    encoding: str = LUCENE_VECTOR_ENCODING,
+    mtime: float = 0.0,
+    size: int = 0,
+    start: int = 0,
+    end: int = 0,
+):
+    text_field_type, string_field_type = field_types
+    doc = Document()
+
+    # Text field for BM25
+    doc.add(Field("content", chunk, text_field_type))
+
+    # Source, chunk index and the chunk's character span in the document
+    doc.add(Field("source", source, string_field_type))
+    doc.add(IntPoint("chunk_index", chunk_idx))  # aliases point at chunks by index
+    doc.add(StoredField("chunk_index", chunk_idx))
+    doc.add(StoredField("start", start))
+    doc.add(StoredField("end", end))
+
+    # File modification time (epoch seconds) and size, range-filterable
+    doc.add(LongPoint("mtime", int(mtime)))
+    doc.add(StoredField("mtime", int(mtime)))
+    doc.add(LongPoint("size", size))
+    doc.add(StoredField("size", size))
+
+    # Vector field for k-NN search, left out when vectors live in the NumPy index
+    if embedding is not None:
+        vector = encode_vector(embedding, similarity, encoding)
+        similarity_function = getattr(VectorSimilarityFunction, similarity.upper())
+        if encoding == "int8":
+            doc.add(KnnByteVectorField("embedding", JArray('byte')(vector.tobytes()), similarity_function))
+        else:
+            doc.add(KnnFloatVectorField("embedding", JArray('float')(vector.tolist()), similarity_function))
+
+    # Store document ID
+    doc.add(StoredField("doc_id", doc_id))
+
+    return doc
+
+
+def _make_parent_document(source: str, text: str, field_types):
+    """
+    The whole text of a file, stored once (Lucene compresses stored fields)
+    instead of in every overlapping chunk. It has no content or vector
+    field, so searches never return it, and deleting the file's source term
+    deletes it together with the chunks.
+    """
+    _, string_field_type = field_types
+    doc = Document()
+    doc.add(Field("source", source, string_field_type))
+    doc.add(Field("kind", "document", string_field_type))
+    doc.add(StoredField("document", text))
+    return doc
+
+
+def _make_alias_document(alias: ChunkAlias, field_types):
+    """
+    Marks a skipped duplicate chunk of ``alias.source`` (see ChunkAlias).
+    Like the parent document it is never a search hit; source filters look
+    it up to also match the kept chunk, and deleting the duplicate's source
+    term deletes it.
+    """
+    _, string_field_type = field_types
+    doc = Document()
+    doc.add(Field("source", alias.source, string_field_type))
+    doc.add(Field("kind", "alias", string_field_type))
+    doc.add(LongPoint("mtime", int(alias.mtime)))
+    doc.add(StoredField("mtime", int(alias.mtime)))
+    doc.add(StoredField("canonical_source", alias.canonical_source))
+    doc.add(StoredField("canonical_chunk_index", alias.canonical_chunk_index))
+    return doc
+
+
+def _create_merge_policy(name: str):
+    if name == "tiered":
+        policy = TieredMergePolicy()
+        policy.setSegmentsPerTier(LUCENE_SEGMENTS_PER_TIER)
+        policy.setMaxMergedSegmentMB(LUCENE_MAX_MERGED_SEGMENT_MB)
+        return policy
+    if name == "log_byte_size":
+        policy = LogByteSizeMergePolicy()
+        policy.setMaxMergeMB(LUCENE_MAX_MERGED_SEGMENT_MB)
+        return policy
+    raise ValueError(f"Unknown merge policy {name!r}, expected 'tiered' or 'log_byte_size'")
+
+
+def _import_lucene() -> None:
+    """Import PyLucene and the Java classes used here, once per process."""
+    global lucene, JArray, Paths, StandardAnalyzer, Document, Field, FieldType, IntPoint, LongPoint, StoredField
+    global IndexWriter, IndexWriterConfig, IndexOptions, Term, DirectoryReader, VectorSimilarityFunction
+    global LogByteSizeMergePolicy, TieredMergePolicy, FSDirectory, BM25Similarity
+    global KnnByteVectorField, KnnFloatVectorField
+    import lucene  # type: ignore
+    from lucene import JArray  # type: ignore
+    from java.nio.file import Paths # type: ignore
+    from org.apache.lucene.analysis.standard import StandardAnalyzer # type: ignore
+    from org.apache.lucene.document import Document, Field, FieldType, IntPoint, LongPoint, StoredField # type: ignore
+    from org.apache.lucene.index import IndexWriter, IndexWriterConfig, IndexOptions, Term, DirectoryReader # type: ignore
+    from org.apache.lucene.index import VectorSimilarityFunction # type: ignore
+    from org.apache.lucene.index import LogByteSizeMergePolicy, TieredMergePolicy # type: ignore
+    from org.apache.lucene.store import FSDirectory # type: ignore
+    from org.apache.lucene.search.similarities import BM25Similarity # type: ignore
+    from org.apache.lucene.document import KnnByteVectorField, KnnFloatVectorField # type: ignore
+
+
+def _attach_to_jvm() -> None:
+    lucene.getVMEnv().attachCurrentThread()
+
+
+class LuceneIndexSink:
+    """
+    Pipeline sink adding embedded chunks to a Lucene IndexWriter.
+
+    IndexWriter is thread-safe and indexes each thread's documents into its
+    own in-memory segment, so with ``threads > 1`` documents are built and
+    added on that many JVM-attached threads. At most ``max_pending``
+    documents wait for a thread, which keeps the pipeline's backpressure.
+    """
+
+    def __init__(
+        self,
+        directory,
+        incremental: bool,
+        store_vectors: bool = True,
+        threads: int = 1,
+        ram_buffer_mb: float = LUCENE_RAM_BUFFER_MB,
+        merge_policy: str = LUCENE_MERGE_POLICY,
+        force_merge_segments: int | None = LUCENE_FORCE_MERGE_SEGMENTS,
+        max_pending: int = INGEST_CHUNK_QUEUE_SIZE,
     ):
-        doc = Document()
+        config = IndexWriterConfig(StandardAnalyzer())
+        config.setSimilarity(BM25Similarity())
+        config.setOpenMode(
+            IndexWriterConfig.OpenMode.APPEND if incremental else IndexWriterConfig.OpenMode.CREATE
+        )
+        # Flush by RAM usage only, so segments are few and large
+        config.setRAMBufferSizeMB(ram_buffer_mb)
+        config.setMaxBufferedDocs(IndexWriterConfig.DISABLE_AUTO_FLUSH)
+        config.setMergePolicy(_create_merge_policy(merge_policy))
+        self.writer = IndexWriter(directory, config)
+        self.field_types = _create_field_types()
+        self.store_vectors = store_vectors
+        self._stored_sources: set[str] = set()
+        self.force_merge_segments = force_merge_segments
+
+        self._executor: ThreadPoolExecutor | None = None
+        if threads > 1:
+            self._executor = ThreadPoolExecutor(
+                max_workers=threads, thread_name_prefix="lucene-writer", initializer=_attach_to_jvm
+            )
+            self._pending = threading.BoundedSemaphore(max(threads, max_pending))
+            self._errors: list[BaseException] = []
+
+    def delete_source(self, source: str) -> None:
+        self.writer.deleteDocuments(Term("source", source))
+
+    def add(self, record: ChunkRecord, embedding: np.ndarray, doc_id: int) -> None:
+        # The first kept chunk of a file also stores the file's text
+        with_parent = record.source not in self._stored_sources
+        self._stored_sources.add(record.source)
+        if self._executor is None:
+            self._add_document(record, embedding, doc_id, with_parent)
+            return
+
+        if self._errors:
+            raise self._errors[0]
+        self._pending.acquire()
+        future = self._executor.submit(self._add_document, record, embedding, doc_id, with_parent)
+        future.add_done_callback(self._on_added)
+
+    def _add_document(self, record: ChunkRecord, embedding: np.ndarray, doc_id: int, with_parent: bool) -> None:
+        if with_parent:
+            self.writer.addDocument(_make_parent_document(record.source, record.document, self.field_types))
+        doc = _make_document(
+            record.text, embedding if self.store_vectors else None,
+            record.source, record.chunk_index, doc_id, self.field_types,
+            mtime=record.mtime, size=record.size, start=record.start, end=record.end,
+        )
+        self.writer.addDocument(doc)
+
+    def add_alias(self, alias: ChunkAlias) -> None:
+        self.writer.addDocument(_make_alias_document(alias, self.field_types))
+
+    def _on_added(self, future: Future) -> None:
+        self._pending.release()
+        if not future.cancelled() and future.exception() is not None:
+            self._errors.append(future.exception())
+
+    def commit(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            if self._errors:
+                raise self._errors[0]
+        if self.force_merge_segments:
+            print(f"Merging index down to {self.force_merge_segments} segment(s)...")
+            self.writer.forceMerge(self.force_merge_segments)
+        self.writer.commit()
+        self.writer.close()
+
+    def rollback(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        # Discards everything since the last commit and releases the write lock
+        self.writer.rollback()
+
+
+class NumpyIndexSink:
+    """Pipeline sink adding embedded chunks to the JVM-free NumPy index."""
+
+    def __init__(self, index_dir: Path, incremental: bool, with_bm25: bool = False):
+        self.writer = NumpyIndexWriter(
+            Path(index_dir) / NUMPY_INDEX_DIRNAME, incremental, with_bm25=with_bm25
+        )
+        self._documents: dict[str, list[int]] = {}
+
+    def delete_source(self, source: str) -> None:
+        self.writer.delete_source(source)
+
+    def add(self, record: ChunkRecord, embedding: np.ndarray, doc_id: int) -> None:
+        # The file's text is stored once; chunks keep their span in it
+        document = self._documents.get(record.source)
+        if document is None:
+            document = self._documents[record.source] = self.writer.add_document(record.document)
+        self.writer.add(
+            {
+                "id": doc_id,
+                "source": record.source,
+                "chunk_index": record.chunk_index,
+                "document": document,
+                "start": record.start,
+                "end": record.end,
+                "mtime": record.mtime,
+                "size": record.size,
+            },
+            embedding,
+        )
 
-        # Text field for BM25
-        doc.add(Field("content", chunk, text_field_type))
+    def add_alias(self, alias: ChunkAlias) -> None:
+        self.writer.add_alias(alias.source, alias.canonical_source, alias.canonical_chunk_index, alias.mtime)
+
+    def commit(self) -> None:
+        self.writer.commit()
+
+    def rollback(self) -> None:
+        self.writer.rollback()
+
+
+class IndexSinks:
+    """Fans every pipeline operation out to the configured index sinks."""
 
-        # Source and chunk index
-        doc.add(Field("source", source, string_field_type))
-        doc.add(StoredField("chunk_index", chunk_idx))
+    def __init__(self, sinks: list, first_doc_id: int = 0):
+        self.sinks = sinks
+        self.next_doc_id = first_doc_id
+        self.added = 0
+
+    def delete_source(self, source: str) -> None:
+        for sink in self.sinks:
+            sink.delete_source(source)
+
+    def add(self, item: tuple[ChunkRecord, np.ndarray]) -> None:
+        record, embedding = item
+        for sink in self.sinks:
+            sink.add(record, embedding, self.next_doc_id)
+        self.next_doc_id += 1
+        self.added += 1
+
+        if self.added % 100 == 0:
+            print(f"Indexed {self.added} chunks...")
+
+    def add_alias(self, alias: ChunkAlias) -> None:
+        for sink in self.sinks:
+            sink.add_alias(alias)
+
+    def commit(self) -> None:
+        for sink in self.sinks:
+            sink.commit()
+
+    def rollback(self) -> None:
+        for sink in self.sinks:
+            sink.rollback()
+
+
+def _read_files(files: Iterable[Path]) -> Iterator[tuple[str, str, float, int]]:
+    for file_path in files:
+        content = read_document(file_path)
+        if content is not None:
+            yield (file_path.name, content, *file_metadata(file_path))
+
+
+def _chunk_stage(chunk_size: int, chunk_overlap: int):
+    def chunk_documents(documents: Iterable[tuple[str, str, float, int]]) -> Iterator[ChunkRecord]:
+        for source, content, mtime, size in documents:
+            for idx, (start, end) in enumerate(chunk_spans(content, chunk_size, chunk_overlap)):
+                yield ChunkRecord(source, idx, start, end, content, mtime, size)
+
+    return chunk_documents
+
+
+def _read_and_chunk(file_path: Path, chunk_size: int, chunk_overlap: int) -> list[ChunkRecord]:
+    content = read_document(file_path)
+    if content is None:
+        return []
+    mtime, size = file_metadata(file_path)
+    # The records share one document string, which is pickled once
+    return [
+        ChunkRecord(file_path.name, idx, start, end, content, mtime, size)
+        for idx, (start, end) in enumerate(chunk_spans(content, chunk_size, chunk_overlap))
+    ]
+
+
+def _read_and_chunk_parallel(
+    files: list[Path], chunk_size: int, chunk_overlap: int, workers: int
+) -> Iterator[list[ChunkRecord]]:
+    """
+    Read and chunk files in ``workers`` processes, yielding each file's
+    chunks in file order. Only ``2 * workers`` files are in flight, so
+    memory stays bounded when the consumer falls behind.
+    """
+    # Forking a process that runs a JVM is unsafe; spawn fresh interpreters
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    pending: deque[Future] = deque()
+    try:
+        for file_path in files:
+            pending.append(pool.submit(_read_and_chunk, file_path, chunk_size, chunk_overlap))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _flatten_stage(chunk_lists: Iterable[list[ChunkRecord]]) -> Iterator[ChunkRecord]:
+    for chunks in chunk_lists:
+        yield from chunks
+
+
+def _dedup_stage(deduplicator: ChunkDeduplicator, aliases: list[ChunkAlias]):
+    def drop_duplicates(records: Iterable[ChunkRecord]) -> Iterator[ChunkRecord]:
+        for record in records:
+            canonical = deduplicator.add(record.source, record.chunk_index, record.text)
+            if canonical is None:
+                yield record
+            elif canonical[0] != record.source:
+                # Filters on the duplicate's file still find the kept chunk
+                aliases.append(ChunkAlias(record.source, *canonical, record.mtime, record.size))
+
+    return drop_duplicates
+
+
+def _embed_stage(embedding_model: EmbeddingModel, batch_size: int):
+    def embed_chunks(records: Iterable[ChunkRecord]) -> Iterator[tuple[ChunkRecord, np.ndarray]]:
+        batch: list[ChunkRecord] = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield from zip(batch, embedding_model.encode([r.text for r in batch]))
+                batch = []
+        if batch:
+            yield from zip(batch, embedding_model.encode([r.text for r in batch]))
+
+    return embed_chunks
 
-        # Vector field for k-NN search
-        # Convert numpy array to Java float array
-        vector = embedding.astype(np.float32).tolist() 
-        java_vector = JArray('float')(vector)
-        doc.add(KnnVectorField("embedding", java_vector))
 
-        # Store document ID
-        doc.add(StoredField("doc_id", doc_id))
+def build_lucene_index(
+    raw_data_dir: Path,
+    index_dir: Path,
+    embedding_model: EmbeddingModel,
+    chunk_size: int = 400,
+    chunk_overlap: int = 50,
+    incremental: bool = False,
+    vector_backend: str = VECTOR_BACKEND,
+    bm25_backend: str = BM25_BACKEND,
+    workers: int = INGEST_WORKERS,
+    ram_buffer_mb: float = LUCENE_RAM_BUFFER_MB,
+    merge_policy: str = LUCENE_MERGE_POLICY,
+    force_merge_segments: int | None = LUCENE_FORCE_MERGE_SEGMENTS,
+    source_filter: Callable[[str], bool] | None = None,
+    dedup: bool = INGEST_DEDUP,
+    allow_full_rebuild: bool = True,
+) -> dict[str, StageStats]:
+    """
+    Build the Lucene index from the documents in ``raw_data_dir``.
+
+    Files are streamed through a read -> chunk -> embed -> write pipeline
+    whose stages run concurrently over bounded queues, so memory use depends
+    on INGEST_*_QUEUE_SIZE rather than on the corpus size. Returns the
+    per-stage throughput counters.
+
+    With ``incremental=True`` the manifest written next to the index is
+    compared against the current files, and only added or modified files are
+    re-chunked and re-embedded; chunks of removed files are deleted. The
+    index is left untouched when nothing changed. A missing manifest or
+    changed chunking parameters fall back to a full rebuild, or raise
+    FullRebuildRequired with ``allow_full_rebuild=False`` (to build a new
+    index version instead of rebuilding the served one in place).
+
+    ``vector_backend`` picks where vectors go: "lucene" (kNN vector field in
+    the Lucene index, see LUCENE_VECTOR_*) or "numpy" (memory-mapped matrix in
+    ``index_dir/NUMPY_INDEX_DIRNAME``). ``bm25_backend`` likewise picks
+    "lucene" or "numpy" (inverted index next to the NumPy chunk store). The
+    Lucene index is written whenever PyLucene is available and either
+    backend is "lucene"; with both set to "numpy" no JVM is started.
+
+    With ``workers > 1`` (0 = one per core) documents are read and chunked
+    in that many processes and that many threads add documents to the
+    Lucene IndexWriter. ``ram_buffer_mb`` and ``merge_policy`` configure
+    the IndexWriter; ``force_merge_segments`` merges a full build down to
+    that many segments before committing. Chunk order, and so document ids,
+    do not depend on ``workers``.
+
+    ``source_filter`` restricts the index to files whose name it accepts
+    (used to build one shard, see build_sharded_index).
+
+    With ``dedup`` exact and near-duplicate chunks (see ChunkDeduplicator)
+    are dropped before they are embedded; the first one seen is indexed,
+    and a duplicate from another file is recorded as an alias of it, so
+    source filters on that file still match it (see ChunkAlias).
+    The deduplicator's state is saved next to the manifest, so incremental
+    builds also skip duplicates of already indexed chunks, and re-process
+    files whose skipped chunks duplicated those of a changed or removed
+    file.
+    """
+    for name, backend in (("vector", vector_backend), ("BM25", bm25_backend)):
+        if backend not in ("lucene", "numpy"):
+            raise ValueError(f"Unknown {name} backend {backend!r}, expected 'lucene' or 'numpy'")
+
+    if not LUCENE_AVAILABLE and vector_backend != "numpy":
+        raise ImportError(
+            "PyLucene is not available. Please install PyLucene to build the index."
+        )
+
+    started_at = time.perf_counter()
+    workers = max(1, workers or os.cpu_count() or 1)
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    use_lucene = LUCENE_AVAILABLE and "lucene" in (vector_backend, bm25_backend)
+    use_numpy = "numpy" in (vector_backend, bm25_backend)
+
+    directory = None
+    if use_lucene:
+        # Initialize Lucene VM
+        _import_lucene()
+        if not lucene.getVMEnv():
+            lucene.initVM(vmargs=["-Xmx2g"])
+        directory = FSDirectory.open(Paths.get(str(index_dir)))
+    elif not LUCENE_AVAILABLE and bm25_backend == "lucene":
+        print("PyLucene not available, building the NumPy vector index only (no BM25)")
+
+    numpy_dir = index_dir / NUMPY_INDEX_DIRNAME
+    deduplicator = ChunkDeduplicator() if dedup else None
+    params = {
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "chunk_sentence_lookback": CHUNK_SENTENCE_LOOKBACK,
+        # Chunks hold character spans of their file's text, stored once
+        "chunk_storage": "document_spans",
+        "embedding_model": embedding_model.model_name,
+        "vector_backend": vector_backend,
+        "bm25_backend": bm25_backend,
+        "lucene": use_lucene,
+        "lucene_vector_similarity": LUCENE_VECTOR_SIMILARITY,
+        "lucene_vector_encoding": LUCENE_VECTOR_ENCODING,
+        # Indexes without these fields cannot be filtered or reranked, rebuild them
+        "metadata_fields": ["mtime", "size", "chunk_index"],
+        "dedup": deduplicator.params if deduplicator is not None else None,
+        # Older deduplicated indexes lost the sources of skipped chunks
+        "dedup_aliases": deduplicator is not None,
+    }
+    manifest = load_manifest(index_dir) if incremental else None
+    if incremental and (
+        manifest is None
+        or manifest.get("params") != params
+        or (directory is not None and not DirectoryReader.indexExists(directory))
+        or (use_numpy and not NumpyVectorIndex.exists(numpy_dir))
+        or (bm25_backend == "numpy" and not BM25Index.exists(numpy_dir / BM25_DIRNAME))
+        or (deduplicator is not None and not (index_dir / DEDUP_FILE).exists())
+    ):
+        if not allow_full_rebuild:
+            if directory is not None:
+                directory.close()
+            raise FullRebuildRequired(f"No usable manifest in {index_dir} for this configuration")
+        print("No usable manifest for this index and configuration, doing a full rebuild")
+        incremental = False
+        manifest = None
+
+    print(f"Scanning documents in {raw_data_dir}...")
+    with span("ingest.scan"):
+        files = list_document_files(raw_data_dir)
+        if source_filter is not None:
+            files = [file_path for file_path in files if source_filter(file_path.name)]
+        file_hashes = {file_path.name: file_sha256(file_path) for file_path in files}
+
+    stale_sources: list[str] = []
+    if incremental:
+        old_hashes = manifest["files"]
+        changed = {name for name, sha in file_hashes.items() if old_hashes.get(name) != sha}
+        removed = sorted(name for name in old_hashes if name not in file_hashes)
+        if not changed and not removed:
+            print(f"Index in {index_dir} is up to date, nothing to do")
+            if directory is not None:
+                directory.close()
+            return {}
+        print(
+            f"Incremental update: {len(changed)} added or modified, "
+            f"{len(removed)} removed"
+        )
+        stale_sources = removed + sorted(name for name in changed if name in old_hashes)
+        if deduplicator is not None:
+            deduplicator = ChunkDeduplicator.load(index_dir / DEDUP_FILE)
+            # Their skipped chunks are only indexed as chunks of the stale files
+            dependents = deduplicator.dependents(set(stale_sources)) & set(file_hashes) - changed
+            if dependents:
+                print(f"Re-indexing {len(dependents)} files with duplicates of changed or removed files")
+                changed |= dependents
+                stale_sources += sorted(dependents)
+            deduplicator = deduplicator.without_sources(set(stale_sources))
+        files = [file_path for file_path in files if file_path.name in changed]
+    elif not files:
+        if directory is not None:
+            directory.close()
+        raise ValueError(f"No documents found in {raw_data_dir}")
 
-        writer.addDocument(doc)
-        doc_id += 1
+    print(f"{'Updating' if incremental else 'Building'} index in {index_dir} from {len(files)} files...")
+
+    sinks = []
+    if directory is not None:
+        sinks.append(
+            LuceneIndexSink(
+                directory, incremental, store_vectors=vector_backend == "lucene", threads=workers,
+                ram_buffer_mb=ram_buffer_mb, merge_policy=merge_policy,
+                # Merging after an incremental update would rewrite the whole index
+                force_merge_segments=None if incremental else force_merge_segments,
+            )
+        )
+    if use_numpy:
+        sinks.append(NumpyIndexSink(index_dir, incremental, with_bm25=bm25_backend == "numpy"))
+    sink = IndexSinks(sinks, first_doc_id=manifest["next_doc_id"] if incremental else 0)
+    embed_batch_size = EMBEDDING_BATCH_SIZE * EMBEDDING_MAX_CONCURRENCY
+    try:
+        # Deletions and additions become visible together at commit
+        for source in stale_sources:
+            sink.delete_source(source)
+
+        if workers > 1:
+            # Each item is one file's chunks, already split by a worker process
+            source = _read_and_chunk_parallel(files, chunk_size, chunk_overlap, workers)
+            chunk_stage = _flatten_stage
+        else:
+            source = _read_files(files)
+            chunk_stage = _chunk_stage(chunk_size, chunk_overlap)
+
+        stages = [Stage("chunk", chunk_stage, INGEST_CHUNK_QUEUE_SIZE)]
+        aliases: list[ChunkAlias] = []
+        if deduplicator is not None:
+            stages.append(Stage("dedup", _dedup_stage(deduplicator, aliases), INGEST_CHUNK_QUEUE_SIZE))
+        # Batches as large as the model's in-flight capacity keep Ollama busy
+        stages.append(Stage("embed", _embed_stage(embedding_model, embed_batch_size), INGEST_CHUNK_QUEUE_SIZE))
+
+        stats = run_pipeline(
+            source=source,
+            source_name="read",
+            source_queue_size=INGEST_DOCUMENT_QUEUE_SIZE,
+            stages=stages,
+            sink=sink.add,
+        )
+        for alias in dict.fromkeys(aliases):
+            sink.add_alias(alias)
+
+        if not incremental and sink.added == 0:
+            raise ValueError(f"No documents found in {raw_data_dir}")
+    except BaseException:
+        sink.rollback()
+        if directory is not None:
+            directory.close()
+        raise
+
+    with span("ingest.commit"):
+        sink.commit()
+    if directory is not None:
+        directory.close()
+
+    if deduplicator is not None:
+        deduplicator.save(index_dir / DEDUP_FILE)
+        skipped = deduplicator.exact_duplicates + deduplicator.near_duplicates
+        print(
+            f"Skipped {skipped} of {sink.added + skipped} chunks as duplicates "
+            f"({deduplicator.exact_duplicates} exact, {deduplicator.near_duplicates} near)"
+        )
+    else:
+        (index_dir / DEDUP_FILE).unlink(missing_ok=True)
+
+    write_manifest(
+        index_dir,
+        {
+            "params": params,
+            "files": file_hashes,
+            "next_doc_id": sink.next_doc_id,
+        },
+    )
+
+    for stage_stats in stats.values():
+        record(f"ingest.{stage_stats.name}", stage_stats.elapsed)
+        print(f"  {stage_stats}")
+    record("ingest.build", time.perf_counter() - started_at)
+    print(f"Index {'updated' if incremental else 'built successfully'} with {sink.added} new chunks in {index_dir}")
 
-        if (doc_id + 1) % 100 == 0:
-            print(f"Indexed {doc_id + 1} chunks...")
+    return stats
 
-    writer.commit()
-    writer.close()
 
-    print(f"Index built successfully with {doc_id} documents in {index_dir}")
+def build_sharded_index(
+    raw_data_dir: Path,
+    index_dir: Path,
+    embedding_model: EmbeddingModel,
+    num_shards: int,
+    shards: list[int] | None = None,
+    incremental: bool = False,
+    **kwargs,
+) -> dict[int, dict[str, StageStats]]:
+    """
+    Build the index as ``num_shards`` independent indexes in
+    ``index_dir/shard-NN``, each holding the files whose name hashes to it
+    (see shard_for_source). Other arguments are passed to
+    build_lucene_index for every shard.
+
+    ``shards`` limits the build to those shard numbers; the others are left
+    as they are. Changing the number of shards of an existing index
+    rebuilds all of them. Shards without files are not created, and
+    retrieval skips them.
+    """
+    index_dir = Path(index_dir)
+    if num_shards < 2:
+        raise ValueError("A sharded index needs at least 2 shards")
+    selected = sorted(set(range(num_shards) if shards is None else shards))
+    if any(shard not in range(num_shards) for shard in selected):
+        raise ValueError(f"Shard numbers must be between 0 and {num_shards - 1}")
+
+    existing = read_shard_count(index_dir)
+    if existing is not None and existing != num_shards:
+        if incremental and not kwargs.get("allow_full_rebuild", True):
+            raise FullRebuildRequired(f"{index_dir} has {existing} shards, not {num_shards}")
+        print(f"Index has {existing} shards, rebuilding all {num_shards}")
+        remove_shards(index_dir, keep=num_shards)
+        selected = list(range(num_shards))
+        incremental = False
+    elif existing is None and len(selected) < num_shards:
+        raise ValueError(f"{index_dir} is not a {num_shards}-shard index yet, build all shards first")
+
+    sources = {file_path.name for file_path in list_document_files(raw_data_dir)}
+    stats: dict[int, dict[str, StageStats]] = {}
+    for shard in selected:
+        path = shard_dir(index_dir, shard)
+        has_files = any(shard_for_source(source, num_shards) == shard for source in sources)
+        if not has_files and not (incremental and path.exists()):
+            print(f"Shard {shard}: no documents, skipping")
+            shutil.rmtree(path, ignore_errors=True)
+            continue
+
+        print(f"\n--- Shard {shard}/{num_shards} ---")
+        stats[shard] = build_lucene_index(
+            raw_data_dir, path, embedding_model,
+            # A shard that had no documents yet is new, not rebuilt
+            incremental=incremental and path.exists(),
+            source_filter=lambda source, shard=shard: shard_for_source(source, num_shards) == shard,
+            **kwargs,
+        )
 
+    write_shard_count(index_dir, num_shards)
+    return stats
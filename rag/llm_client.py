@@ -1,5 +1,11 @@
+import json
+from typing import AsyncIterator, Iterator
+
+import httpx
 import requests
 
+from rag.async_http import AsyncClientPool
+
 class OllamaLLMClient:
     def __init__(
         self,
@@ -8,17 +14,21 @@ class OllamaLLMClient:
     ):
         self.model_name = model_name
         self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
 
     def generate(self, prompt: str, stream: bool = False) -> str:
+        if stream:
+            return "".join(self.generate_stream(prompt))
+
         url = f"{self.base_url}/api/generate"
         payload = {
             "model": self.model_name,
             "prompt": prompt,
-            "stream": stream,
+            "stream": False,
         }
 
         try:
-            response = requests.post(url, json=payload, timeout=120)
+            response = self.session.post(url, json=payload, timeout=120)
             response.raise_for_status()
             result = response.json()
             return result.get("response", "")
@@ -29,3 +39,90 @@ class OllamaLLMClient:
             )
         except requests.exceptions.RequestException as e:
             raise RuntimeError(f"Error calling Ollama API: {e}")
+
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        """Yield response tokens as Ollama produces them (NDJSON stream)."""
+        url = f"{self.base_url}/api/generate"
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": True,
+        }
+
+        try:
+            # The timeout bounds the wait between chunks, not the whole answer
+            with self.session.post(url, json=payload, stream=True, timeout=120) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if "error" in event:
+                        raise RuntimeError(f"Error calling Ollama API: {event['error']}")
+                    token = event.get("response", "")
+                    if token:
+                        yield token
+                    if event.get("done"):
+                        return
+        except requests.exceptions.ConnectionError:
+            raise ConnectionError(
+                f"Could not connect to Ollama at {self.base_url}. "
+                "Make sure Ollama is running and the server is accessible."
+            )
+        except requests.exceptions.RequestException as e:
+            raise RuntimeError(f"Error calling Ollama API: {e}")
+
+
+class AsyncOllamaLLMClient:
+    """asyncio counterpart of OllamaLLMClient sharing one connection pool per event loop."""
+
+    def __init__(
+        self,
+        model_name: str = "mistral",
+        base_url: str = "http://localhost:11434",
+        max_connections: int = 32,
+    ):
+        self.model_name = model_name
+        self.base_url = base_url.rstrip("/")
+        self.clients = AsyncClientPool(self.base_url, max_connections, timeout=120)
+
+    async def generate(self, prompt: str) -> str:
+        payload = {"model": self.model_name, "prompt": prompt, "stream": False}
+        try:
+            response = await self.clients.get().post("/api/generate", json=payload)
+            response.raise_for_status()
+            return response.json().get("response", "")
+        except httpx.ConnectError:
+            raise ConnectionError(
+                f"Could not connect to Ollama at {self.base_url}. "
+                "Make sure Ollama is running and the server is accessible."
+            )
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Error calling Ollama API: {e}")
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        payload = {"model": self.model_name, "prompt": prompt, "stream": True}
+        try:
+            async with self.clients.get().stream("POST", "/api/generate", json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if "error" in event:
+                        raise RuntimeError(f"Error calling Ollama API: {event['error']}")
+                    token = event.get("response", "")
+                    if token:
+                        yield token
+                    if event.get("done"):
+                        return
+        except httpx.ConnectError:
+            raise ConnectionError(
+                f"Could not connect to Ollama at {self.base_url}. "
+                "Make sure Ollama is running and the server is accessible."
+            )
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Error calling Ollama API: {e}")
+
+    async def aclose(self) -> None:
+        await self.clients.aclose()
@@ -0,0 +1,177 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+from rag.config import QUERY_EMBEDDING_MAX_BATCH_SIZE, QUERY_EMBEDDING_MAX_WAIT_MS
+from rag.embedding_model import EmbeddingModel
+from rag.tracing import METRICS, record, record_error, span
+
+logger = logging.getLogger(__name__)
+
+
+class _Request(NamedTuple):
+    text: str
+    future: Future
+    enqueued_at: float
+
+
+class MicroBatchingEmbedder:
+    """
+    Coalesces concurrent single-query ``encode`` calls into batched
+    embedding requests.
+
+    A dispatcher thread takes the first waiting query, keeps collecting
+    queries for up to ``max_wait_ms`` or until ``max_batch_size`` are
+    waiting, and embeds them with one ``embedding_model.encode`` call; each
+    caller blocks on its own future. At most ``embedding_model.max_concurrency``
+    batches are in flight, and while they are, new queries pile up into
+    the next batch, so batches grow with load instead of requests queueing
+    behind each other. Multi-text calls (e.g. ``search_batch``) are already
+    batched and go straight to the model.
+
+    Queue depth and batch size are exported as the
+    ``rag_query_embedding_queue_depth`` and ``rag_query_embedding_batch_size``
+    histograms, time spent waiting for a batch as the ``embed.queue_wait``
+    stage.
+    """
+
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel,
+        max_batch_size: int = QUERY_EMBEDDING_MAX_BATCH_SIZE,
+        max_wait_ms: float = QUERY_EMBEDDING_MAX_WAIT_MS,
+    ):
+        self.embedding_model = embedding_model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.batches = 0
+        self.texts = 0
+
+        self._queue: queue.Queue[_Request | None] = queue.Queue()
+        self._slots = threading.BoundedSemaphore(embedding_model.max_concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=embedding_model.max_concurrency, thread_name_prefix="embed-batch"
+        )
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+
+    @property
+    def model_name(self) -> str:
+        return self.embedding_model.model_name
+
+    @property
+    def dimension(self) -> int | None:
+        return self.embedding_model.dimension
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        texts = list(texts)
+        if len(texts) != 1:
+            return self.embedding_model.encode(texts)
+
+        with span("embed.query"):
+            future: Future = Future()
+            # Checked and queued together, so nothing is queued behind close()'s sentinel
+            with self._lock:
+                closed = self._closed
+                if not closed:
+                    self._ensure_started()
+                    self._queue.put(_Request(texts[0], future, time.perf_counter()))
+            if closed:
+                return self.embedding_model.encode(texts)
+            return future.result()[None, :]
+
+    def close(self) -> None:
+        """Stop the dispatcher after the queued queries; the model stays open."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+        self._executor.shutdown(wait=True)
+
+    def _ensure_started(self) -> None:
+        """Start the dispatcher; called with ``self._lock`` held."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._dispatch, name="query-embedding-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def _fail_pending(self) -> None:
+        """Fail requests left behind the sentinel, so no caller waits forever."""
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if request is not None:
+                request.future.set_exception(RuntimeError("Query embedding batcher is closed"))
+
+    def _dispatch(self) -> None:
+        while True:
+            # Wait for a free slot first, so queries keep collecting while
+            # all batches are in flight
+            self._slots.acquire()
+            first = self._queue.get()
+            if first is None:
+                self._slots.release()
+                self._fail_pending()
+                return
+
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+
+            METRICS.observe_size("query_embedding_queue_depth", self._queue.qsize())
+            METRICS.observe_size("query_embedding_batch_size", len(batch))
+            self._executor.submit(self._run_batch, batch)
+            if stop:
+                self._fail_pending()
+                return
+
+    def _run_batch(self, batch: list[_Request]) -> None:
+        try:
+            started_at = time.perf_counter()
+            for request in batch:
+                record("embed.queue_wait", started_at - request.enqueued_at)
+
+            # Sessions often search the same text at once
+            unique_texts = list(dict.fromkeys(request.text for request in batch))
+            try:
+                vectors = self.embedding_model.encode(unique_texts)
+            except Exception as e:
+                logger.exception("Error embedding a batch of %d queries", len(unique_texts))
+                record_error("embed.query")
+                for request in batch:
+                    request.future.set_exception(e)
+                return
+
+            with self._lock:
+                self.batches += 1
+                self.texts += len(batch)
+            rows = {text: row for row, text in enumerate(unique_texts)}
+            for request in batch:
+                request.future.set_result(vectors[rows[request.text]])
+        finally:
+            self._slots.release()
@@ -1,26 +1,99 @@
+import math
+import re
+from datetime import datetime
+from functools import cached_property
 from typing import Any, Literal, TypedDict
 from pydantic import BaseModel, ConfigDict
+from pydantic.json_schema import SkipJsonSchema
 
 # from rag.retriever import LuceneBM25Retriever, LuceneVectorRetriever
 
+RetrievalMode = Literal["bm25", "vector", "hybrid"]
+RAGPipeline = Literal["agent", "direct"]
+
+
 class RetrievedChunkModel(BaseModel):
     id: int
     source: str
     chunk_index: int
     content: str
     score: float
+    # Character span of the content in the source file, for citations
+    # (optional, so the agent's answer validates without them)
+    start: int | None = None
+    end: int | None = None
+
+
+class MetadataFilter(BaseModel):
+    """
+    Restricts retrieval to chunks of matching files. ``sources`` (exact
+    file names) and ``source_patterns`` (globs with ``*`` and ``?``) are
+    alternatives: a file matches if it is listed or matches any pattern.
+    ``modified_since`` / ``modified_until`` bound the file's modification
+    time (inclusive) when it was indexed. All given conditions must hold.
+    """
+
+    sources: list[str] = []
+    source_patterns: list[str] = []
+    modified_since: datetime | None = None
+    modified_until: datetime | None = None
+
+    def is_empty(self) -> bool:
+        return not (self.sources or self.source_patterns or self.has_time_range())
+
+    def has_time_range(self) -> bool:
+        return self.modified_since is not None or self.modified_until is not None
+
+    def mtime_range(self) -> tuple[int, int]:
+        """Inclusive bounds in whole epoch seconds, as the mtime field is indexed."""
+        low = math.floor(self.modified_since.timestamp()) if self.modified_since else -(2**63)
+        high = math.floor(self.modified_until.timestamp()) if self.modified_until else 2**63 - 1
+        return low, high
+
+    @cached_property
+    def _pattern_re(self) -> re.Pattern | None:
+        if not self.source_patterns:
+            return None
+        # Same syntax as Lucene's WildcardQuery
+        return re.compile("|".join(
+            "".join(".*" if c == "*" else "." if c == "?" else re.escape(c) for c in pattern)
+            for pattern in self.source_patterns
+        ), re.S)
+
+    def matches(self, source: str, mtime: float | None) -> bool:
+        if self.sources or self.source_patterns:
+            pattern_re = self._pattern_re
+            if source not in self.sources and not (pattern_re and pattern_re.fullmatch(source)):
+                return False
+        if self.has_time_range():
+            if mtime is None or math.isnan(mtime):
+                return False
+            low, high = self.mtime_range()
+            if not low <= math.floor(mtime) <= high:
+                return False
+        return True
+
+    def cache_key(self) -> str:
+        """Stable string identifying this filter, empty when it filters nothing."""
+        return "" if self.is_empty() else self.model_dump_json()
 
 
 class RAGResult(BaseModel):
     answer: str
-    retrieval_mode: Literal["bm25", "vector"]
+    retrieval_mode: RetrievalMode
     chunks: list[RetrievedChunkModel]
+    # Seconds per stage, filled in by run_rag; hidden from the agent's output schema
+    timings: SkipJsonSchema[dict[str, float] | None] = None
 
 
 class RAGDeps(BaseModel):
     # model_config = ConfigDict(arbitrary_types_allowed=True)
     bm25: Any
     vector: Any
+    hybrid: Any = None
+    async_embedding: Any = None  # set for the async query path
+    filters: MetadataFilter | None = None  # applied to every retrieval
+    reranker: Any = None  # MMRReranker over the retrieved candidates, if enabled
 
 class RetrievedChunk(TypedDict):
     id: int
@@ -28,4 +101,6 @@ class RetrievedChunk(TypedDict):
     chunk_index: int
     content: str
     score: float
+    start: int  # character span of content in the source file
+    end: int
     
\ No newline at end of file
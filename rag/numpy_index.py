@@ -0,0 +1,465 @@
+import functools
+import itertools
+import json
+import mmap
+import os
+import shutil
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from rag.bm25 import BM25Index, build_bm25_index, update_bm25_index
+from rag.config import NUMPY_DOCUMENT_CACHE_ENTRIES, NUMPY_SEARCH_BLOCK_ROWS, NUMPY_VECTOR_DTYPE
+from rag.models import MetadataFilter
+from rag.vector_encoding import l2_normalize
+
+
+# Files of a NumPy index directory
+CHUNKS_FILE = "chunks.jsonl"  # one JSON record per row
+DOCUMENTS_FILE = "documents.bin"  # zlib-compressed text of each indexed file, appended
+OFFSETS_FILE = "offsets.npy"  # int64 byte offset of every row in chunks.jsonl, plus the end
+DELETED_FILE = "deleted.npy"  # bool tombstone per row
+CHUNK_INDEXES_FILE = "chunk_indexes.npy"  # int32 chunk_index of every row
+SOURCES_FILE = "sources.json"  # source -> rows, for deleting a file's chunks
+FILES_FILE = "files.json"  # source -> {"mtime", "size"} of the indexed file
+ALIASES_FILE = "aliases.json"  # source -> {"mtime", "rows"} holding its deduplicated chunks
+VECTORS_FILE = "vectors.bin"  # row-major (count, dim) matrix
+META_FILE = "meta.json"  # count, dim and dtype; written last on commit
+BM25_DIRNAME = "bm25"  # optional BM25 inverted index over the live rows
+
+
+class ChunkStore:
+    """
+    Read-only side table of chunk records, addressed by row.
+
+    ``chunks.jsonl`` is memory-mapped and ``offsets.npy`` gives each row's
+    byte range in it, so fetching a record is a slice plus one json.loads.
+    Each row's source file is kept as an index into ``source_names``, so a
+    metadata filter is evaluated once per file and broadcast to the rows.
+    A file whose chunks were dropped as duplicates also matches the rows
+    of the kept chunks (``alias_rows``). ``chunk_rows`` maps each source's
+    chunk indexes to rows, so chunks are found without reading records.
+
+    Records hold no text: each points to its file's text in
+    ``documents.bin``, stored once per file, and the chunk is sliced from
+    it. Recently used documents are kept decompressed.
+    """
+
+    def __init__(self, path: Path, count: int, document_cache_entries: int = NUMPY_DOCUMENT_CACHE_ENTRIES):
+        self.path = Path(path)
+        self.count = count
+        self._documents_file = None
+        self._documents_mmap = None
+        # Per store, so a reopened index never serves another index's documents
+        self.document = functools.lru_cache(maxsize=document_cache_entries)(self._read_document)
+        self.source_names: list[str] = []
+        self.source_mtimes = np.zeros(0)
+        self.source_rows: dict[str, np.ndarray] = {}
+        self.alias_rows: dict[str, np.ndarray] = {}
+        self.alias_mtimes: dict[str, float] = {}
+        # source -> row of each chunk_index, -1 for indexes with no live row
+        self.chunk_rows: dict[str, np.ndarray] = {}
+        # -1 for rows no live source owns
+        self.source_ids = np.full(count, -1, dtype=np.int32)
+        if count:
+            self.offsets = np.load(self.path / OFFSETS_FILE, mmap_mode="r")
+            self.deleted = np.load(self.path / DELETED_FILE)[:count]
+            self._file = open(self.path / CHUNKS_FILE, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._load_sources()
+            documents_path = self.path / DOCUMENTS_FILE
+            if documents_path.exists() and documents_path.stat().st_size:
+                self._documents_file = open(documents_path, "rb")
+                self._documents_mmap = mmap.mmap(self._documents_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self.deleted = np.zeros(0, dtype=bool)
+            self._file = None
+            self._mmap = None
+
+    def _load_sources(self) -> None:
+        sources = json.loads((self.path / SOURCES_FILE).read_text())
+        files_path = self.path / FILES_FILE
+        files = json.loads(files_path.read_text()) if files_path.exists() else {}
+        self.source_names = list(sources)
+        self.source_mtimes = np.array(
+            [files.get(name, {}).get("mtime", np.nan) for name in self.source_names], dtype=np.float64
+        )
+        chunk_indexes = _load_chunk_indexes(self.path, self.count)
+        for source_id, (name, rows) in enumerate(sources.items()):
+            rows = np.asarray(rows, dtype=np.int64)
+            # A concurrent incremental commit may list rows past our count
+            rows = rows[rows < self.count]
+            self.source_rows[name] = rows
+            self.source_ids[rows] = source_id
+            if rows.size:
+                indexes = chunk_indexes[rows]
+                chunk_rows = np.full(int(indexes.max()) + 1, -1, dtype=np.int64)
+                chunk_rows[indexes] = rows
+                self.chunk_rows[name] = chunk_rows
+        aliases_path = self.path / ALIASES_FILE
+        aliases = json.loads(aliases_path.read_text()) if aliases_path.exists() else {}
+        for name, alias in aliases.items():
+            rows = np.asarray(alias["rows"], dtype=np.int64)
+            self.alias_rows[name] = rows[rows < self.count]
+            self.alias_mtimes[name] = alias["mtime"]
+
+    @property
+    def live_count(self) -> int:
+        return int(self.count - self.deleted.sum())
+
+    def filter_mask(self, filters: MetadataFilter | None) -> np.ndarray | None:
+        """Boolean mask of the rows ``filters`` accepts, None when it filters nothing."""
+        if filters is None or filters.is_empty():
+            return None
+        allowed = np.zeros(len(self.source_names) + 1, dtype=bool)  # last entry: no source
+        for source_id, (name, mtime) in enumerate(zip(self.source_names, self.source_mtimes)):
+            allowed[source_id] = filters.matches(name, float(mtime))
+        mask = allowed[self.source_ids]
+        for name, rows in self.alias_rows.items():
+            if filters.matches(name, self.alias_mtimes[name]):
+                mask[rows] = True
+        return mask
+
+    def record(self, row: int) -> dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self._mmap[start:end])
+
+    def find_rows(self, keys: list[tuple[str, int]]) -> np.ndarray:
+        """Live row holding each (source, chunk_index) of ``keys``, -1 where there is none."""
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        for i, (source, chunk_index) in enumerate(keys):
+            chunk_rows = self.chunk_rows.get(source)
+            if chunk_rows is not None and 0 <= chunk_index < len(chunk_rows):
+                rows[i] = chunk_rows[chunk_index]
+        return rows
+
+    def _read_document(self, offset: int, length: int) -> str:
+        return zlib.decompress(self._documents_mmap[offset:offset + length]).decode("utf-8")
+
+    def content(self, record: dict) -> str:
+        """Text of the chunk ``record``, sliced from its file's text."""
+        offset, length = record["document"]
+        return self.document(offset, length)[record["start"]:record["end"]]
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+        if self._documents_mmap is not None:
+            self.document.cache_clear()
+            self._documents_mmap.close()
+            self._documents_file.close()
+            self._documents_mmap = None
+
+
+class NumpyVectorIndex:
+    """
+    Exact dense top-k search over a memory-mapped float32/float16 matrix.
+
+    Vectors are L2-normalized at write time, so scores are cosine
+    similarities. Pages of the matrix are shared by every process mapping
+    the same index.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        meta = json.loads((self.path / META_FILE).read_text())
+        self.meta = meta
+        self.count = meta["count"]
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+        self.store = ChunkStore(self.path, self.count)
+        if self.count:
+            self.vectors = np.memmap(
+                self.path / VECTORS_FILE, dtype=self.dtype, mode="r", shape=(self.count, self.dim)
+            )
+        else:
+            self.vectors = np.zeros((0, self.dim or 0), dtype=self.dtype)
+
+    @staticmethod
+    def exists(path: Path) -> bool:
+        return (Path(path) / META_FILE).exists()
+
+    def generation(self) -> int:
+        return self.meta["generation"]
+
+    @staticmethod
+    def read_generation(path: Path) -> int:
+        return json.loads((Path(path) / META_FILE).read_text())["generation"]
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        block_rows: int = NUMPY_SEARCH_BLOCK_ROWS,
+        allowed: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return (rows, scores), both (n_queries, k), best first. Rows of
+        deleted chunks, and with an ``allowed`` row mask rows outside it,
+        are never returned; k may be smaller than top_k.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = l2_normalize(queries)
+        n_queries = queries.shape[0]
+        excluded = self.store.deleted if allowed is None else self.store.deleted | ~allowed
+        k = min(top_k, int(self.count - excluded.sum()))
+        if k <= 0:
+            return np.zeros((n_queries, 0), dtype=np.int64), np.zeros((n_queries, 0), dtype=np.float32)
+
+        best_rows = np.zeros((n_queries, 0), dtype=np.int64)
+        best_scores = np.zeros((n_queries, 0), dtype=np.float32)
+        # With a filter, score only the rows it allows instead of masking them out
+        candidates = None if allowed is None else np.flatnonzero(~excluded)
+        total = self.count if candidates is None else candidates.size
+        for start in range(0, total, block_rows):
+            end = min(start + block_rows, total)
+            block_ids = None if candidates is None else candidates[start:end]
+            # Upcast one block at a time so float16 storage never needs a full float32 copy
+            block = np.asarray(
+                self.vectors[start:end] if block_ids is None else self.vectors[block_ids], dtype=np.float32
+            )
+            scores = queries @ block.T
+            if block_ids is None:
+                deleted = excluded[start:end]
+                if deleted.any():
+                    scores[:, deleted] = -np.inf
+
+            kk = min(k, end - start)
+            part = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+            best_rows = np.concatenate([best_rows, part + start if block_ids is None else block_ids[part]], axis=1)
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, axis=1)], axis=1)
+
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def close(self) -> None:
+        self.store.close()
+        self.vectors = None
+
+
+class NumpyIndexWriter:
+    """
+    Pipeline sink writing chunk records and vectors to a NumPy index.
+
+    A full build writes into a sibling ``.tmp`` directory that replaces the
+    old index on commit. An incremental build appends rows and tombstones
+    the rows of deleted sources; readers only see rows up to the count in
+    meta.json, which is rewritten last. With ``with_bm25`` every commit
+    writes a BM25 index: an incremental commit merges the postings of the
+    added rows into the previous one, a full build tokenizes every row.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        incremental: bool,
+        dtype: str = NUMPY_VECTOR_DTYPE,
+        with_bm25: bool = False,
+    ):
+        self.final_path = Path(path)
+        self.with_bm25 = with_bm25
+        self.incremental = incremental and NumpyVectorIndex.exists(self.final_path)
+
+        if self.incremental:
+            self.path = self.final_path
+            meta = json.loads((self.path / META_FILE).read_text())
+            self.dtype = np.dtype(meta["dtype"])
+            self.dim = meta["dim"]
+            self.generation = meta.get("generation", 0)
+            self.start_count = meta["count"]
+            self.start_documents_size = meta.get("documents_size", 0)
+            self.offsets = list(np.load(self.path / OFFSETS_FILE)[: self.start_count + 1]) if self.start_count else [0]
+            self.deleted = list(np.load(self.path / DELETED_FILE)[: self.start_count]) if self.start_count else []
+            self.chunk_indexes = list(_load_chunk_indexes(self.path, self.start_count)) if self.start_count else []
+            self.sources = json.loads((self.path / SOURCES_FILE).read_text()) if self.start_count else {}
+            files_path = self.path / FILES_FILE
+            self.files = json.loads(files_path.read_text()) if files_path.exists() else {}
+            aliases_path = self.path / ALIASES_FILE
+            self.aliases = json.loads(aliases_path.read_text()) if aliases_path.exists() else {}
+            # Drop anything a crashed writer appended past the committed count
+            self._truncate(self.offsets[-1], self.start_count, self.start_documents_size)
+        else:
+            self.path = self.final_path.with_name(self.final_path.name + ".tmp")
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path.mkdir(parents=True)
+            self.dtype = np.dtype(dtype)
+            self.dim = None
+            # Keep counting generations across rebuilds so readers notice the swap
+            self.generation = (
+                json.loads((self.final_path / META_FILE).read_text()).get("generation", 0)
+                if NumpyVectorIndex.exists(self.final_path) else 0
+            )
+            self.start_count = 0
+            self.start_documents_size = 0
+            self.offsets = [0]
+            self.deleted = []
+            self.chunk_indexes = []
+            self.sources = {}
+            self.files = {}
+            self.aliases = {}
+
+        # (source, chunk_index) -> row of the rows added, for aliases
+        self._added_rows: dict[tuple[str, int], int] = {}
+        self._committed_store: ChunkStore | None = None
+        self.documents_size = self.start_documents_size
+        self._chunks_file = open(self.path / CHUNKS_FILE, "ab")
+        self._vectors_file = open(self.path / VECTORS_FILE, "ab")
+        self._documents_file = open(self.path / DOCUMENTS_FILE, "ab")
+
+    @property
+    def count(self) -> int:
+        return len(self.deleted)
+
+    def delete_source(self, source: str) -> None:
+        for row in self.sources.pop(source, []):
+            self.deleted[row] = True
+        self.files.pop(source, None)
+        self.aliases.pop(source, None)
+
+    def add_document(self, text: str) -> list[int]:
+        """Append a file's text; returns the [offset, length] its chunk records point to."""
+        data = zlib.compress(text.encode("utf-8"))
+        self._documents_file.write(data)
+        location = [self.documents_size, len(data)]
+        self.documents_size += len(data)
+        return location
+
+    def add(self, record: dict, embedding: np.ndarray) -> None:
+        vector = l2_normalize(np.asarray(embedding, dtype=np.float32)[None, :])[0]
+        if self.dim is None:
+            self.dim = int(vector.shape[0])
+
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        self._chunks_file.write(line)
+        self._vectors_file.write(vector.astype(self.dtype).tobytes())
+
+        self.sources.setdefault(record["source"], []).append(self.count)
+        self._added_rows[(record["source"], record["chunk_index"])] = self.count
+        if "mtime" in record:
+            self.files[record["source"]] = {"mtime": record["mtime"], "size": record.get("size", 0)}
+        self.offsets.append(self.offsets[-1] + len(line))
+        self.chunk_indexes.append(record["chunk_index"])
+        self.deleted.append(False)
+
+    def add_alias(self, source: str, canonical_source: str, canonical_chunk_index: int, mtime: float) -> None:
+        """Let filters on ``source`` match the row of the chunk a duplicate of it was dropped for."""
+        row = self._added_rows.get((canonical_source, canonical_chunk_index), -1)
+        if row < 0 and self.start_count:
+            if self._committed_store is None:
+                self._committed_store = ChunkStore(self.path, self.start_count)
+            row = int(self._committed_store.find_rows([(canonical_source, canonical_chunk_index)])[0])
+        # The committed row may belong to a source deleted by this update
+        if row >= 0 and not self.deleted[row]:
+            self.aliases.setdefault(source, {"mtime": mtime, "rows": []})["rows"].append(row)
+
+    def _close_files(self) -> None:
+        self._chunks_file.close()
+        self._vectors_file.close()
+        self._documents_file.close()
+        if self._committed_store is not None:
+            self._committed_store.close()
+            self._committed_store = None
+
+    def commit(self) -> None:
+        self._close_files()
+
+        # Replace rather than overwrite: open readers keep their mapped copies
+        _atomic_save(self.path / OFFSETS_FILE, np.asarray(self.offsets, dtype=np.int64))
+        _atomic_save(self.path / DELETED_FILE, np.asarray(self.deleted, dtype=bool))
+        _atomic_save(self.path / CHUNK_INDEXES_FILE, np.asarray(self.chunk_indexes, dtype=np.int32))
+        _atomic_write_text(self.path / SOURCES_FILE, json.dumps(self.sources))
+        _atomic_write_text(self.path / FILES_FILE, json.dumps(self.files))
+        _atomic_write_text(self.path / ALIASES_FILE, json.dumps(self.aliases))
+        if self.with_bm25:
+            self._build_bm25()
+        meta = {
+            "count": self.count,
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "generation": self.generation + 1,
+            "documents_size": self.documents_size,
+        }
+        _atomic_write_text(self.path / META_FILE, json.dumps(meta))
+
+        if not self.incremental:
+            _replace_dir(self.path, self.final_path)
+
+    def _build_bm25(self) -> None:
+        store = ChunkStore(self.path, self.count)
+        try:
+            path = self.path / BM25_DIRNAME
+            base = BM25Index(path) if self.incremental and BM25Index.exists(path) else None
+            # Only an index of exactly the rows this update started from can be extended
+            if base is not None and (base.count, base.generation()) != (self.start_count, self.generation):
+                base = None
+            first_row = 0 if base is None else self.start_count
+            live_documents = (
+                (row, store.content(store.record(row)))
+                for row in range(first_row, self.count) if not store.deleted[row]
+            )
+            tmp_path = self.path / (BM25_DIRNAME + ".tmp")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if base is None:
+                build_bm25_index(tmp_path, live_documents, self.count, self.generation + 1)
+            else:
+                update_bm25_index(tmp_path, base, live_documents, self.count, store.deleted, self.generation + 1)
+            _replace_dir(tmp_path, path)
+        finally:
+            store.close()
+
+    def rollback(self) -> None:
+        self._close_files()
+        if self.incremental:
+            self._truncate(self.offsets[self.start_count], self.start_count, self.start_documents_size)
+        else:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def _truncate(self, chunk_bytes: int, rows: int, document_bytes: int) -> None:
+        if (self.path / CHUNKS_FILE).exists():
+            os.truncate(self.path / CHUNKS_FILE, chunk_bytes)
+        if (self.path / DOCUMENTS_FILE).exists():
+            os.truncate(self.path / DOCUMENTS_FILE, document_bytes)
+        if self.dim is not None and (self.path / VECTORS_FILE).exists():
+            os.truncate(self.path / VECTORS_FILE, rows * self.dim * self.dtype.itemsize)
+
+
+def _load_chunk_indexes(path: Path, count: int) -> np.ndarray:
+    """chunk_index of the first ``count`` rows, read from the records for indexes that predate the file."""
+    chunk_indexes_path = path / CHUNK_INDEXES_FILE
+    if chunk_indexes_path.exists():
+        return np.load(chunk_indexes_path)[:count]
+    with open(path / CHUNKS_FILE, "rb") as f:
+        return np.array([json.loads(line)["chunk_index"] for line in itertools.islice(f, count)], dtype=np.int32)
+
+
+def _replace_dir(new_path: Path, path: Path) -> None:
+    # Readers holding files of the old directory keep them until they close
+    old_path = path.with_name(path.name + ".old")
+    shutil.rmtree(old_path, ignore_errors=True)
+    if path.exists():
+        os.replace(path, old_path)
+    os.replace(new_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def _atomic_save(path: Path, array: np.ndarray) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _atomic_write_text(path: Path, text: str) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
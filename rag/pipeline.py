@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, NamedTuple
+
+
+class Stage(NamedTuple):
+    name: str
+    fn: Callable[[Iterable[Any]], Iterable[Any]]
+    queue_size: int  # capacity of the queue feeding the next stage
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    def record(self) -> None:
+        now = time.perf_counter()
+        if self.started_at is None:
+            self.started_at = now
+        self.finished_at = now
+        self.items += 1
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.elapsed if self.elapsed > 0 else float(self.items)
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "items": self.items,
+            "elapsed_s": round(self.elapsed, 3),
+            "items_per_s": round(self.throughput, 2),
+        }
+
+    def __repr__(self) -> str:
+        return f"{self.name}: {self.items} items in {self.elapsed:.2f}s ({self.throughput:.1f}/s)"
+
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def run_pipeline(
+    source: Iterable[Any],
+    source_name: str,
+    stages: list[Stage],
+    sink: Callable[[Any], None],
+    sink_name: str = "write",
+    source_queue_size: int = 8,
+) -> dict[str, StageStats]:
+    """
+    Run ``source -> stages... -> sink`` with every stage in its own thread.
+
+    Stages are connected by bounded queues, so memory use is bounded by the
+    queue sizes rather than by the number of items. The sink runs in the
+    calling thread (the one attached to the JVM when writing to Lucene).
+    The first exception raised by any stage cancels the others and is
+    re-raised here.
+    """
+    stop = threading.Event()
+    errors: list[BaseException] = []
+    stats = {source_name: StageStats(source_name)}
+    stats.update({stage.name: StageStats(stage.name) for stage in stages})
+    stats[sink_name] = StageStats(sink_name)
+
+    def put(q: queue.Queue, item: Any) -> None:
+        while True:
+            if stop.is_set():
+                raise _Cancelled()
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def drain(q: queue.Queue) -> Iterator[Any]:
+        while True:
+            if stop.is_set():
+                raise _Cancelled()
+            try:
+                item = q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def run_stage(name: str, items: Iterable[Any], out_q: queue.Queue) -> None:
+        try:
+            for item in items:
+                put(out_q, item)
+                stats[name].record()
+            put(out_q, _DONE)
+        except _Cancelled:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    queues = [queue.Queue(maxsize=max(1, source_queue_size))]
+    threads = [
+        threading.Thread(
+            target=run_stage, args=(source_name, source, queues[0]),
+            name=f"pipeline-{source_name}", daemon=True,
+        )
+    ]
+    for stage in stages:
+        out_q = queue.Queue(maxsize=max(1, stage.queue_size))
+        threads.append(
+            threading.Thread(
+                target=run_stage, args=(stage.name, stage.fn(drain(queues[-1])), out_q),
+                name=f"pipeline-{stage.name}", daemon=True,
+            )
+        )
+        queues.append(out_q)
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        for item in drain(queues[-1]):
+            sink(item)
+            stats[sink_name].record()
+    except _Cancelled:
+        pass
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        if errors:
+            stop.set()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    return stats
@@ -1,85 +1,212 @@
 # rag/pydantic_rag_agent.py
 
-from typing import Literal
+import asyncio
+import threading
 from pathlib import Path
 
 from pydantic_ai import Agent, RunContext
-from pydantic_ai.models.openai import OpenAIChatModel
-from pydantic_ai.providers.ollama import OllamaProvider
 
-from rag.models import RAGDeps, RAGResult, RetrievedChunkModel
-from rag.retriever import LuceneBM25Retriever, LuceneVectorRetriever
-from rag.config import INDEX_DIR, OLLAMA_BASE_URL, OLLAMA_MODEL_NAME, EMBEDDING_MODEL_NAME
-
-
-ollama_model = OpenAIChatModel(
-    model_name=OLLAMA_MODEL_NAME,
-    provider=OllamaProvider(base_url=OLLAMA_BASE_URL),  
-)
+from rag.models import MetadataFilter, RAGDeps, RAGPipeline, RAGResult, RetrievalMode, RetrievedChunkModel
+from rag.answer_cache import alookup_answer, lookup_answer, store_answer
+from rag.retrieval_service import RetrievalService, aget_retrieval_service, aretrieve, get_retrieval_service
+from rag.retriever import get_lucene_executor
+from rag.direct_pipeline import arun_direct_rag, run_direct_rag
+from rag.tracing import Trace, log_trace, span, start_trace
+from rag.config import CONTEXT_PACKING, OLLAMA_BASE_URL, OLLAMA_MODEL_NAME, RAG_PIPELINE
+from rag.context_packing import pack_context
 
 
 SYSTEM_PROMPT = """
 You are a retrieval-augmented assistant.
 
 - You MUST first call the `retrieve_chunks` tool to get relevant document chunks.
-- The user message will explicitly tell you which retrieval mode to use: "bm25" or "vector".
+- The user message will explicitly tell you which retrieval mode to use: "bm25", "vector" or "hybrid".
 - Use only the information from the retrieved chunks when answering.
 - If the chunks do not contain an answer, say that you don't know.
 - Return a concise, clear answer in the `answer` field and include all chunks you used.
 """
 
 
-rag_agent = Agent(
-    model=ollama_model,
-    deps_type=RAGDeps,
-    output_type=RAGResult,
-    system_prompt=SYSTEM_PROMPT,
-)
+_rag_agent: Agent | None = None
+_rag_agent_lock = threading.Lock()
+
 
+def get_rag_agent() -> Agent:
+    """The process-wide agent, built on first use rather than at import."""
+    global _rag_agent
+    with _rag_agent_lock:
+        if _rag_agent is None:
+            # Imports the OpenAI client, only needed by the agent pipeline
+            from pydantic_ai.models.openai import OpenAIChatModel
+            from pydantic_ai.providers.ollama import OllamaProvider
 
-@rag_agent.tool
-def retrieve_chunks(
+            ollama_model = OpenAIChatModel(
+                model_name=OLLAMA_MODEL_NAME,
+                provider=OllamaProvider(base_url=OLLAMA_BASE_URL),
+            )
+            agent = Agent(
+                model=ollama_model,
+                deps_type=RAGDeps,
+                output_type=RAGResult,
+                system_prompt=SYSTEM_PROMPT,
+            )
+            agent.tool(retrieve_chunks)
+            _rag_agent = agent
+        return _rag_agent
+
+
+async def retrieve_chunks(
     ctx: RunContext[RAGDeps],
     query: str,
-    mode: Literal["bm25", "vector"] = "bm25",
+    mode: RetrievalMode = "bm25",
     top_k: int = 5,
+    filters: MetadataFilter | None = None,
 ) -> list[RetrievedChunkModel]:
     """
-    Retrieve relevant chunks from the Lucene index.
+    Retrieve relevant chunks from the index.
 
-    mode="bm25"   -> LuceneBM25Retriever
-    mode="vector" -> LuceneVectorRetriever
-    """
-    if mode == "bm25":
-        results = ctx.deps.bm25.search(query, top_k=top_k)
-    else:
-        results = ctx.deps.vector.search(query, top_k=top_k)
+    mode="bm25"   -> LuceneBM25Retriever, or NumpyBM25Retriever with BM25_BACKEND = "numpy"
+    mode="vector" -> LuceneVectorRetriever, or NumpyVectorRetriever with VECTOR_BACKEND = "numpy"
+    mode="hybrid" -> HybridRetriever (BM25 and vector in parallel, rank-fused)
 
+    filters restricts the search to files by name, glob pattern or
+    modification date; filters chosen by the user always take precedence.
+    """
+    deps = ctx.deps
+    if deps.filters is None and filters is not None:
+        deps = deps.model_copy(update={"filters": filters})
+    # Lucene runs on the bounded executor, so neither run_sync nor run
+    # blocks the agent's event loop while searching
+    results = await aretrieve(deps, query, mode, top_k)
+
+    if CONTEXT_PACKING:
+        # Tool output is the agent's context: merged, deduplicated, within budget
+        return [
+            RetrievedChunkModel(
+                id=passage.id, source=passage.source, chunk_index=passage.first_chunk,
+                content=passage.content, score=passage.score, start=passage.start, end=passage.end,
+            )
+            for passage in pack_context(results).passages
+        ]
     return [RetrievedChunkModel(**r) for r in results]
 
 def run_rag(
     question: str,
-    mode: Literal["bm25", "vector"],
+    mode: RetrievalMode,
     top_k: int = 5,
     index_dir: Path | None = None,
+    pipeline: RAGPipeline = RAG_PIPELINE,
+    vector_backend: str | None = None,
+    filters: MetadataFilter | None = None,
+) -> RAGResult:
+    # Retrievers and the index searcher are shared across calls and threads
+    service = get_retrieval_service(index_dir, vector_backend)
+
+    with start_trace() as trace:
+        lookup = lookup_answer(service, question, mode, top_k, filters)
+    if lookup.result is not None:
+        return _cache_hit(lookup.result, mode, trace)
+
+    if pipeline == "direct":
+        result = run_direct_rag(
+            question, mode, top_k=top_k, index_dir=index_dir, vector_backend=vector_backend, filters=filters
+        )
+    else:
+        result = _run_agent(service, question, mode, top_k, filters)
+
+    store_answer(service, lookup, question, mode, top_k, result)
+    return result
+
+
+def _run_agent(
+    service: RetrievalService,
+    question: str,
+    mode: RetrievalMode,
+    top_k: int,
+    filters: MetadataFilter | None = None,
 ) -> RAGResult:
-    index_path = index_dir or Path(INDEX_DIR)
+    with start_trace() as trace:
+        with span("rag.agent"):
+            deps = service.deps(filters=filters)
+
+            user_message = (
+                f"Retrieval mode: {mode}. Top_k: {top_k}. "
+                f"User question: {question}"
+            )
 
-    bm25_retriever = LuceneBM25Retriever(index_path)
-    from rag.embedding_model import EmbeddingModel
-    embedding_model = EmbeddingModel(EMBEDDING_MODEL_NAME)
-    vector_retriever = LuceneVectorRetriever(index_path, embedding_model)
+            with span("agent"):
+                result = get_rag_agent().run_sync(
+                    user_message,
+                    deps=deps,
+                )
 
-    deps = RAGDeps(bm25=bm25_retriever, vector=vector_retriever)
+    return _with_timings(result.data, mode, trace)
+
+
+async def arun_rag(
+    question: str,
+    mode: RetrievalMode,
+    top_k: int = 5,
+    index_dir: Path | None = None,
+    pipeline: RAGPipeline = RAG_PIPELINE,
+    vector_backend: str | None = None,
+    filters: MetadataFilter | None = None,
+) -> RAGResult:
+    """Async run_rag: awaits the LLM and embedding calls instead of blocking a thread."""
+    service = await aget_retrieval_service(index_dir, vector_backend)
+
+    with start_trace() as trace:
+        lookup = await alookup_answer(service, question, mode, top_k, filters)
+    if lookup.result is not None:
+        return _cache_hit(lookup.result, mode, trace)
+
+    if pipeline == "direct":
+        result = await arun_direct_rag(
+            question, mode, top_k=top_k, index_dir=index_dir, vector_backend=vector_backend, filters=filters
+        )
+    else:
+        result = await _arun_agent(service, question, mode, top_k, filters)
 
-    user_message = (
-        f"Retrieval mode: {mode}. Top_k: {top_k}. "
-        f"User question: {question}"
-    )
+    store_answer(service, lookup, question, mode, top_k, result)
+    return result
 
-    result = rag_agent.run_sync(
-        user_message,
-        deps=deps,
-    )
 
-    return result.data
+async def _arun_agent(
+    service: RetrievalService,
+    question: str,
+    mode: RetrievalMode,
+    top_k: int,
+    filters: MetadataFilter | None = None,
+) -> RAGResult:
+    with start_trace() as trace:
+        with span("rag.agent"):
+            loop = asyncio.get_running_loop()
+            deps = await loop.run_in_executor(get_lucene_executor(), service.deps, True, filters)
+
+            user_message = (
+                f"Retrieval mode: {mode}. Top_k: {top_k}. "
+                f"User question: {question}"
+            )
+
+            with span("agent"):
+                result = await get_rag_agent().run(
+                    user_message,
+                    deps=deps,
+                )
+
+    return _with_timings(result.data, mode, trace)
+
+
+def _cache_hit(result: RAGResult, mode: RetrievalMode, trace: Trace) -> RAGResult:
+    log_trace(f"cached answer ({mode})", trace)
+    result.timings = trace.timings()
+    return result
+
+
+def _with_timings(result: RAGResult, mode: RetrievalMode, trace: Trace) -> RAGResult:
+    log_trace(f"agent RAG ({mode})", trace)
+    timings = trace.timings()
+    # The agent span covers its tool calls; what is left is spent in the LLM
+    timings["agent.llm"] = round(max(timings.get("agent", 0.0) - timings.get("retrieve", 0.0), 0.0), 4)
+    result.timings = timings
+    return result
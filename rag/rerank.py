@@ -0,0 +1,94 @@
+import logging
+
+import numpy as np
+
+from rag.config import RERANK_MMR_LAMBDA, RERANK_POOL_MULTIPLIER
+from rag.models import RetrievedChunk
+from rag.tracing import record_error, span
+from rag.vector_encoding import l2_normalize
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_scores(scores: np.ndarray) -> np.ndarray:
+    """Min-max scale to [0, 1], so BM25, cosine and fused scores compare; all 1 when equal."""
+    scores = np.asarray(scores, dtype=np.float64)
+    low, high = scores.min(), scores.max()
+    if high - low <= 0:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+
+def mmr_select(
+    relevance: np.ndarray, vectors: np.ndarray, top_k: int, mmr_lambda: float = RERANK_MMR_LAMBDA
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Greedy Maximal Marginal Relevance: return (indices, values) of up to
+    ``top_k`` candidates, each maximizing
+    ``mmr_lambda * relevance - (1 - mmr_lambda) * max similarity to those picked``.
+
+    The pairwise cosine similarities come from one matrix product, and each
+    step updates the running maximum similarity of all candidates at once.
+    Values never increase, so they can serve as the final scores.
+    """
+    n = relevance.shape[0]
+    k = min(top_k, n)
+    unit = l2_normalize(np.asarray(vectors, dtype=np.float32))
+    similarity = unit @ unit.T
+    gain = mmr_lambda * relevance
+    penalty = np.zeros(n)
+    available = np.ones(n, dtype=bool)
+    selected = np.empty(k, dtype=np.int64)
+    values = np.empty(k)
+    for step in range(k):
+        objective = np.where(available, gain - (1 - mmr_lambda) * penalty, -np.inf)
+        best = int(np.argmax(objective))
+        selected[step], values[step] = best, objective[best]
+        available[best] = False
+        penalty = similarity[best] if step == 0 else np.maximum(penalty, similarity[best])
+    return selected, values
+
+
+class MMRReranker:
+    """
+    Reorders an over-fetched candidate list by relevance and diversity.
+
+    Retrieval fetches ``pool_size(top_k)`` candidates; ``rerank`` reads
+    their indexed vectors from the vector retriever (nothing is embedded),
+    scales the retriever scores to [0, 1] and keeps ``top_k`` by MMR,
+    scored by their MMR values.
+    """
+
+    def __init__(
+        self,
+        pool_multiplier: int = RERANK_POOL_MULTIPLIER,
+        mmr_lambda: float = RERANK_MMR_LAMBDA,
+    ):
+        if not 0.0 <= mmr_lambda <= 1.0:
+            raise ValueError(f"RERANK_MMR_LAMBDA must be between 0 and 1, got {mmr_lambda}")
+        self.pool_multiplier = max(1, pool_multiplier)
+        self.mmr_lambda = mmr_lambda
+
+    def pool_size(self, top_k: int) -> int:
+        return top_k * self.pool_multiplier
+
+    def rerank(self, chunks: list[RetrievedChunk], top_k: int, vector_retriever) -> list[RetrievedChunk]:
+        """``vector_retriever`` is the one the chunks were searched in (its ``stored_vectors``)."""
+        if len(chunks) <= 1:
+            return chunks[:top_k]
+        with span("rerank"):
+            try:
+                with span("rerank.vectors"):
+                    vectors = vector_retriever.stored_vectors(chunks)
+                if any(vector is None for vector in vectors):
+                    # E.g. a file deleted since the search; keep the relevance order
+                    logger.debug("No indexed vector for some candidates, skipping MMR")
+                    return chunks[:top_k]
+                relevance = normalize_scores(np.array([chunk["score"] for chunk in chunks]))
+                selected, values = mmr_select(relevance, np.stack(vectors), top_k, self.mmr_lambda)
+            except Exception:
+                # Relevance order is still a valid answer
+                logger.exception("Error during reranking")
+                record_error("rerank")
+                return chunks[:top_k]
+            return [{**chunks[i], "score": float(value)} for i, value in zip(selected, values)]
@@ -0,0 +1,428 @@
+import asyncio
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from rag.config import (
+    ANSWER_CACHE_ENABLED,
+    INDEX_DIR,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_CACHE_DIR,
+    INDEX_REFRESH_INTERVAL_SECONDS,
+    INDEX_RETIRE_SECONDS,
+    INDEX_WARMUP_QUERY,
+    OLLAMA_HOST,
+    QUERY_EMBEDDING_BATCHING,
+    RERANK_MMR,
+    VECTOR_BACKEND,
+    BM25_BACKEND,
+)
+from rag.answer_cache import AnswerCache
+from rag.embedding_cache import EmbeddingCache
+from rag.embedding_model import AsyncEmbeddingModel, EmbeddingModel
+from rag.index_versions import current_version
+from rag.micro_batcher import MicroBatchingEmbedder
+from rag.models import MetadataFilter, RAGDeps, RetrievalMode, RetrievedChunk
+from rag.rerank import MMRReranker
+from rag.retriever import (
+    LUCENE_AVAILABLE,
+    HybridRetriever,
+    LuceneBM25Retriever,
+    LuceneSearcherManager,
+    LuceneVectorRetriever,
+    NumpyBM25Retriever,
+    NumpyVectorRetriever,
+    ShardedLuceneBM25Retriever,
+    ShardedNumpyBM25Retriever,
+    ShardedVectorRetriever,
+    get_lucene_executor,
+)
+from rag.sharding import read_shard_count, shard_dir
+from rag.tracing import bound_to_context, record_error, span
+
+logger = logging.getLogger(__name__)
+
+
+class _OpenIndex(NamedTuple):
+    """Retrievers over one index version."""
+
+    path: Path  # directory the index path resolved to when opened
+    num_shards: int | None
+    bm25: Any
+    vector: Any
+    hybrid: HybridRetriever | None
+    searcher_managers: list[LuceneSearcherManager]
+    numpy_retrievers: list[NumpyBM25Retriever | NumpyVectorRetriever]
+
+    def close(self) -> None:
+        if self.hybrid is not None:
+            self.hybrid.close()
+        if isinstance(self.bm25, ShardedLuceneBM25Retriever):
+            self.bm25.close()
+        for retriever in self.numpy_retrievers:
+            retriever.close()
+        for searcher_manager in self.searcher_managers:
+            searcher_manager.close()
+
+
+class RetrievalService:
+    """
+    Long-lived retrievers over one index, shared by every session and thread
+    of the process.
+
+    The index is opened once; ``maybe_refresh()`` picks up new commits (at
+    most every INDEX_REFRESH_INTERVAL_SECONDS) without reopening unchanged
+    segments. With ``vector_backend="numpy"`` vector search needs no JVM,
+    and with ``bm25_backend="numpy"`` neither does BM25; with only one of
+    them set and no PyLucene, only that retrieval mode is available.
+
+    A sharded index (see build_sharded_index) opens every shard and
+    searches them in parallel through ShardedRetriever.
+
+    When ``index_dir`` is switched to a new version (see publish_version),
+    the refresh opens and warms it up in the background and then swaps it
+    in; the replaced retrievers are closed INDEX_RETIRE_SECONDS later.
+
+    ``generation`` counts the index reopens, and ``answer_cache`` (when
+    ANSWER_CACHE_ENABLED) holds answers for the current generation.
+    """
+
+    def __init__(
+        self,
+        index_dir: Path,
+        embedding_model: EmbeddingModel | None = None,
+        refresh_interval: float = INDEX_REFRESH_INTERVAL_SECONDS,
+        vector_backend: str = VECTOR_BACKEND,
+        bm25_backend: str = BM25_BACKEND,
+    ):
+        self.index_dir = Path(index_dir)
+        self.refresh_interval = refresh_interval
+        self.vector_backend = vector_backend
+        self.bm25_backend = bm25_backend
+        self.embedding_model = embedding_model or EmbeddingModel(
+            EMBEDDING_MODEL_NAME, base_url=OLLAMA_HOST, cache=EmbeddingCache(EMBEDDING_CACHE_DIR)
+        )
+        # Single-query embeddings from concurrent searches share requests
+        self.query_embedding_model = (
+            MicroBatchingEmbedder(self.embedding_model) if QUERY_EMBEDDING_BATCHING else self.embedding_model
+        )
+
+        self._index = self._open(current_version(self.index_dir))
+        # Shares the cache with the sync model so either path can warm it
+        self.async_embedding_model = AsyncEmbeddingModel(
+            self.embedding_model.model_name,
+            self.embedding_model.base_url,
+            cache=self.embedding_model.cache,
+        )
+
+        self.reranker = MMRReranker() if RERANK_MMR else None
+        self.answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
+        self.generation = 0
+
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = time.monotonic()
+        self._switch_thread: threading.Thread | None = None
+        self._failed_version: Path | None = None
+        self._retired: list[tuple[float, _OpenIndex]] = []
+        self._closed = False
+
+    @property
+    def bm25(self) -> Any:
+        return self._index.bm25
+
+    @property
+    def vector(self) -> Any:
+        return self._index.vector
+
+    @property
+    def hybrid(self) -> HybridRetriever | None:
+        return self._index.hybrid
+
+    @property
+    def num_shards(self) -> int | None:
+        return self._index.num_shards
+
+    @property
+    def searcher_managers(self) -> list[LuceneSearcherManager]:
+        return self._index.searcher_managers
+
+    def _open(self, path: Path) -> _OpenIndex:
+        """Open the retrievers of the index (version) in ``path``."""
+        searcher_managers: list[LuceneSearcherManager] = []
+        numpy_retrievers: list[NumpyBM25Retriever | NumpyVectorRetriever] = []
+        num_shards = read_shard_count(path)
+        try:
+            if num_shards:
+                # Shards without documents were never created
+                shard_dirs = [shard_dir(path, shard) for shard in range(num_shards)]
+                shards = [
+                    self._open_index(shard_path, searcher_managers, numpy_retrievers)
+                    for shard_path in shard_dirs if shard_path.exists()
+                ]
+                if not shards:
+                    raise FileNotFoundError(
+                        f"No shards found in {path}. "
+                        "Please build the index first using: python -m scripts.build_index"
+                    )
+                # BM25 scores with the statistics of all shards, like a single index
+                bm25 = None
+                if self.bm25_backend == "numpy":
+                    bm25 = ShardedNumpyBM25Retriever([shard_bm25 for shard_bm25, _ in shards])
+                elif searcher_managers:
+                    bm25 = ShardedLuceneBM25Retriever(searcher_managers)
+                vector = ShardedVectorRetriever([shard_vector for _, shard_vector in shards], self.query_embedding_model)
+            else:
+                bm25, vector = self._open_index(path, searcher_managers, numpy_retrievers)
+        except BaseException:
+            for retriever in numpy_retrievers:
+                retriever.close()
+            for searcher_manager in searcher_managers:
+                searcher_manager.close()
+            raise
+        hybrid = HybridRetriever(bm25, vector) if bm25 is not None else None
+        return _OpenIndex(path, num_shards, bm25, vector, hybrid, searcher_managers, numpy_retrievers)
+
+    def _open_index(
+        self,
+        index_dir: Path,
+        searcher_managers: list[LuceneSearcherManager],
+        numpy_retrievers: list[NumpyBM25Retriever | NumpyVectorRetriever],
+    ) -> tuple[LuceneBM25Retriever | NumpyBM25Retriever | None, Any]:
+        """Open the BM25 (None without a usable backend) and vector retrievers of one index."""
+        searcher_manager = None
+        if LUCENE_AVAILABLE and "lucene" in (self.vector_backend, self.bm25_backend):
+            searcher_manager = LuceneSearcherManager(index_dir)
+            searcher_managers.append(searcher_manager)
+
+        bm25 = None
+        if self.bm25_backend == "numpy":
+            bm25 = NumpyBM25Retriever(index_dir)
+            numpy_retrievers.append(bm25)
+        elif searcher_manager is not None:
+            bm25 = LuceneBM25Retriever(index_dir, searcher_manager=searcher_manager)
+
+        if self.vector_backend == "numpy":
+            vector = NumpyVectorRetriever(index_dir, self.query_embedding_model)
+            numpy_retrievers.append(vector)
+        else:
+            vector = LuceneVectorRetriever(
+                index_dir, self.query_embedding_model, searcher_manager=searcher_manager
+            )
+        return bm25, vector
+
+    def deps(self, include_async: bool = False, filters: MetadataFilter | None = None) -> RAGDeps:
+        self.maybe_refresh()
+        index = self._index
+        return RAGDeps(
+            bm25=index.bm25,
+            vector=index.vector,
+            hybrid=index.hybrid,
+            async_embedding=self.async_embedding_model if include_async else None,
+            filters=filters,
+            reranker=self.reranker,
+        )
+
+    def warm_up(self, query: str = INDEX_WARMUP_QUERY, index: _OpenIndex | None = None) -> None:
+        """
+        Run ``query`` once through every retriever, so the first user query
+        does not pay for starting the JVM, reading the index from disk or
+        loading the embedding model into Ollama.
+        """
+        if not query:
+            return
+        index = index or self._index
+        started_at = time.perf_counter()
+        if index.bm25 is not None:
+            index.bm25.search(query, top_k=1)
+        try:
+            query_vector = self.query_embedding_model.encode([query])[0]
+        except Exception as e:
+            logger.warning("Embedding model not warmed up: %s", e)
+        else:
+            if hasattr(index.vector, "search_by_vector"):
+                index.vector.search_by_vector(query_vector, top_k=1)
+        logger.info("Warmed up index %s in %.2fs", index.path, time.perf_counter() - started_at)
+
+    def maybe_refresh(self, force: bool = False) -> bool:
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return False
+        # Only one thread pays for the check; the others keep searching
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            self._last_refresh = now
+            self._close_retired(now)
+            path = current_version(self.index_dir)
+            if path != self._index.path:
+                switching = self._switch_thread is not None and self._switch_thread.is_alive()
+                if not switching and path != self._failed_version:
+                    self._switch_thread = threading.Thread(
+                        target=self._switch_to, args=(path,), name="index-switch", daemon=True
+                    )
+                    self._switch_thread.start()
+                return False
+
+            refreshed = False
+            for searcher_manager in self._index.searcher_managers:
+                refreshed = searcher_manager.maybe_refresh() or refreshed
+            for retriever in self._index.numpy_retrievers:
+                refreshed = retriever.maybe_refresh() or refreshed
+            if refreshed:
+                self.generation += 1
+                print(f"Reopened searcher on updated index {self.index_dir}")
+            return refreshed
+        finally:
+            self._refresh_lock.release()
+
+    def _switch_to(self, path: Path) -> None:
+        """Open and warm up the index version in ``path``, then serve it."""
+        try:
+            index = self._open(path)
+        except Exception:
+            logger.exception("Could not open new index version %s, still serving %s", path, self._index.path)
+            self._failed_version = path
+            return
+        self.warm_up(index=index)
+        with self._refresh_lock:
+            if self._closed:
+                index.close()
+                return
+            # Searches already holding the old retrievers finish on them
+            self._retired.append((time.monotonic(), self._index))
+            self._index = index
+            self.generation += 1
+        print(f"Switched to index version {path}")
+
+    def _close_retired(self, now: float) -> None:
+        while self._retired and now - self._retired[0][0] >= INDEX_RETIRE_SECONDS:
+            _, index = self._retired.pop(0)
+            index.close()
+
+    def close(self) -> None:
+        with self._refresh_lock:
+            self._closed = True
+            for _, index in self._retired:
+                index.close()
+            self._retired.clear()
+            self._index.close()
+        if self.query_embedding_model is not self.embedding_model:
+            self.query_embedding_model.close()
+        self.embedding_model.close()
+
+
+def _check_mode(deps: RAGDeps, mode: RetrievalMode) -> None:
+    if mode in ("bm25", "hybrid") and deps.bm25 is None:
+        raise RuntimeError(
+            f"{mode} retrieval requires PyLucene or BM25_BACKEND = \"numpy\", "
+            "only vector retrieval is available"
+        )
+
+
+def retrieve(deps: RAGDeps, query: str, mode: RetrievalMode, top_k: int) -> list[RetrievedChunk]:
+    """
+    Search with ``mode``, restricted to ``deps.filters`` if set. With
+    ``deps.reranker`` a larger candidate pool is fetched and reranked.
+    """
+    _check_mode(deps, mode)
+    k = deps.reranker.pool_size(top_k) if deps.reranker is not None else top_k
+    with span("retrieve"):
+        if mode == "bm25":
+            chunks = deps.bm25.search(query, top_k=k, filters=deps.filters)
+        elif mode == "hybrid" and deps.hybrid is not None:
+            chunks = deps.hybrid.search(query, top_k=k, filters=deps.filters)
+        else:
+            chunks = deps.vector.search(query, top_k=k, filters=deps.filters)
+        if deps.reranker is not None:
+            chunks = deps.reranker.rerank(chunks, top_k, deps.vector)
+        return chunks
+
+
+async def aretrieve(deps: RAGDeps, query: str, mode: RetrievalMode, top_k: int) -> list[RetrievedChunk]:
+    """
+    Non-blocking retrieve(): Lucene calls run on the bounded JVM-attached
+    executor, and with ``deps.async_embedding`` set the query embedding is
+    awaited instead of holding an executor thread during the HTTP call.
+    """
+    _check_mode(deps, mode)
+    loop = asyncio.get_running_loop()
+    executor = get_lucene_executor()
+
+    # Executor threads do not inherit the context; bind it so their spans
+    # are recorded in this query's trace
+    async def bm25(k: int) -> list[RetrievedChunk]:
+        return await loop.run_in_executor(
+            executor, bound_to_context(deps.bm25.search, query, k, filters=deps.filters)
+        )
+
+    async def vector(k: int) -> list[RetrievedChunk]:
+        if deps.async_embedding is None or not hasattr(deps.vector, "search_by_vector"):
+            return await loop.run_in_executor(
+                executor, bound_to_context(deps.vector.search, query, k, filters=deps.filters)
+            )
+        with span("vector"):
+            try:
+                query_vector = (await deps.async_embedding.encode([query]))[0]
+                return await loop.run_in_executor(
+                    executor, bound_to_context(deps.vector.search_by_vector, query_vector, k, filters=deps.filters)
+                )
+            except Exception:
+                logger.exception("Error during vector search")
+                record_error("vector")
+                return []
+
+    k = deps.reranker.pool_size(top_k) if deps.reranker is not None else top_k
+    with span("retrieve"):
+        if mode == "bm25":
+            chunks = await bm25(k)
+        elif mode == "hybrid" and deps.hybrid is not None:
+            with span("hybrid"):
+                candidates = k * deps.hybrid.candidate_multiplier
+                result_lists = await asyncio.gather(bm25(candidates), vector(candidates))
+                chunks = deps.hybrid.fuse(list(result_lists), k)
+        else:
+            chunks = await vector(k)
+        if deps.reranker is not None:
+            # Reads the candidates' vectors, from Lucene on a JVM-attached thread
+            chunks = await loop.run_in_executor(
+                executor, bound_to_context(deps.reranker.rerank, chunks, top_k, deps.vector)
+            )
+        return chunks
+
+
+_services: dict[tuple[Path, str], RetrievalService] = {}
+_services_lock = threading.Lock()
+
+
+def get_retrieval_service(
+    index_dir: Path | None = None, vector_backend: str | None = None
+) -> RetrievalService:
+    """Return the process-wide service for ``index_dir``, opening it on first use."""
+    # Not resolved: a symlinked index_dir is followed to each new version
+    index_path = Path(index_dir or INDEX_DIR).absolute()
+    backend = vector_backend or VECTOR_BACKEND
+    with _services_lock:
+        service = _services.get((index_path, backend))
+        if service is None:
+            service = RetrievalService(index_path, vector_backend=backend)
+            _services[(index_path, backend)] = service
+        return service
+
+
+async def aget_retrieval_service(
+    index_dir: Path | None = None, vector_backend: str | None = None
+) -> RetrievalService:
+    # Opening the index blocks and needs a JVM-attached thread
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_lucene_executor(), get_retrieval_service, index_dir, vector_backend
+    )
+
+
+def close_retrieval_services() -> None:
+    with _services_lock:
+        for service in _services.values():
+            service.close()
+        _services.clear()
@@ -1,28 +1,81 @@
-from typing import Any
+import heapq
+import importlib.util
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
 from pathlib import Path
 import numpy as np
-from rag.models import RetrievedChunk
-
-try:
-    import lucene  # type: ignore
-    from lucene import JArray  # type: ignore
-
-    from java.nio.file import Paths  # type: ignore
-    from org.apache.lucene.analysis.standard import StandardAnalyzer  # type: ignore
-    from org.apache.lucene.index import DirectoryReader  # type: ignore
-    from org.apache.lucene.queryparser.classic import QueryParser  # type: ignore
-    from org.apache.lucene.search import IndexSearcher, TopDocs  # type: ignore
-    from org.apache.lucene.store import FSDirectory  # type: ignore
-    from org.apache.lucene.search.similarities import BM25Similarity  # type: ignore
-    from org.apache.lucene.search import KnnVectorQuery  # type: ignore
-
-    LUCENE_AVAILABLE = True
-except ImportError:
-    LUCENE_AVAILABLE = False
+from rag.models import MetadataFilter, RetrievedChunk
+from rag.fusion import reciprocal_rank_fusion, weighted_score_fusion
+from rag.bm25 import BM25Index, CollectionStats, merge_collection_stats
+from rag.numpy_index import BM25_DIRNAME, ChunkStore, NumpyVectorIndex
+from rag.tracing import bound_to_context, record_error, span
+from rag.vector_encoding import encode_vector
+from rag.config import (
+    HYBRID_FUSION,
+    HYBRID_RRF_K,
+    HYBRID_BM25_WEIGHT,
+    HYBRID_VECTOR_WEIGHT,
+    HYBRID_CANDIDATE_MULTIPLIER,
+    LUCENE_EXECUTOR_WORKERS,
+    LUCENE_VECTOR_SIMILARITY,
+    LUCENE_VECTOR_ENCODING,
+    LUCENE_KNN_NUM_CANDIDATES,
+    LUCENE_DOCUMENT_CACHE_ENTRIES,
+    NUMPY_INDEX_DIRNAME,
+    SHARD_SEARCH_WORKERS,
+)
+
+# Deduplicated file's source -> (its mtime, (source, chunk_index) of each kept chunk it matches)
+ChunkAliases = dict[str, tuple[float | None, list[tuple[str, int]]]]
+
+# PyLucene is imported on first use (see _import_lucene), so processes on
+# the NumPy backends never load the JVM libraries
+LUCENE_AVAILABLE = importlib.util.find_spec("lucene") is not None
+if not LUCENE_AVAILABLE:
     print("Warning: PyLucene not available. Please install PyLucene.")
 
+_lucene_import_lock = threading.Lock()
+_lucene_imported = False
+
+
+def _import_lucene() -> None:
+    """Import PyLucene and the Java classes used here, once per process."""
+    global lucene, JArray, Paths, StandardAnalyzer, QueryParser, IndexSearcher, SearcherManager, TopDocs
+    global FSDirectory, BM25Similarity, KnnByteVectorQuery, KnnFloatVectorQuery, DirectoryReader, MultiReader, Term
+    global LeafReaderContext, ReaderUtil
+    global IntPoint, LongPoint, BooleanClause, BooleanQuery, TermQuery, WildcardQuery, Executors, _lucene_imported
+    if _lucene_imported:
+        return
+    with _lucene_import_lock:
+        if _lucene_imported:
+            return
+        import lucene  # type: ignore
+        from lucene import JArray  # type: ignore
+
+        from java.nio.file import Paths  # type: ignore
+        from org.apache.lucene.analysis.standard import StandardAnalyzer  # type: ignore
+        from org.apache.lucene.queryparser.classic import QueryParser  # type: ignore
+        from org.apache.lucene.search import IndexSearcher, SearcherManager, TopDocs  # type: ignore
+        from org.apache.lucene.store import FSDirectory  # type: ignore
+        from org.apache.lucene.search.similarities import BM25Similarity  # type: ignore
+        from org.apache.lucene.search import KnnByteVectorQuery, KnnFloatVectorQuery  # type: ignore
+        from org.apache.lucene.index import DirectoryReader, MultiReader, Term  # type: ignore
+        from org.apache.lucene.index import LeafReaderContext, ReaderUtil  # type: ignore
+        from org.apache.lucene.document import IntPoint, LongPoint  # type: ignore
+        from org.apache.lucene.search import BooleanClause, BooleanQuery, TermQuery, WildcardQuery  # type: ignore
+        from java.util.concurrent import Executors  # type: ignore
+
+        _lucene_imported = True
+
+
+logger = logging.getLogger(__name__)
 
 def ensure_lucene_env() -> Any:
+    _import_lucene()
     env = lucene.getVMEnv()
     if env is None:
         lucene.initVM(vmargs=["-Xmx2g"])
@@ -32,10 +85,60 @@ def ensure_lucene_env() -> Any:
     return env
 
 
-class LuceneBM25Retriever:
-    def __init__(self, index_dir: Path):
+_lucene_executor: ThreadPoolExecutor | None = None
+_lucene_executor_lock = threading.Lock()
+
+
+def get_lucene_executor() -> ThreadPoolExecutor:
+    """
+    Bounded, process-wide pool for running blocking Lucene calls off the
+    event loop. Its threads are attached to the JVM once, when they start.
+    """
+    global _lucene_executor
+    with _lucene_executor_lock:
+        if _lucene_executor is None:
+            _lucene_executor = ThreadPoolExecutor(
+                max_workers=LUCENE_EXECUTOR_WORKERS,
+                thread_name_prefix="lucene",
+                initializer=ensure_lucene_env if LUCENE_AVAILABLE else None,
+            )
+        return _lucene_executor
+
+
+_shard_executor: ThreadPoolExecutor | None = None
+
+
+def get_shard_executor() -> ThreadPoolExecutor:
+    """
+    Process-wide pool searching index shards in parallel. Separate from the
+    Lucene executor, whose threads block on these searches.
+    """
+    global _shard_executor
+    with _lucene_executor_lock:
+        if _shard_executor is None:
+            _shard_executor = ThreadPoolExecutor(
+                max_workers=SHARD_SEARCH_WORKERS,
+                thread_name_prefix="shard",
+                initializer=ensure_lucene_env if LUCENE_AVAILABLE else None,
+            )
+        return _shard_executor
+
+
+class LuceneSearcherManager:
+    """
+    Shares one IndexSearcher over an index between threads.
+
+    Thin wrapper around Lucene's SearcherManager: ``acquire()`` hands out the
+    current searcher, ``maybe_refresh()`` reopens it with
+    DirectoryReader.openIfChanged after a commit, and retired readers are
+    closed once the last search using them releases them. ``documents()``
+    keeps recently used file texts per reader version, ``aliases()`` the
+    alias documents of the current reader.
+    """
+
+    def __init__(self, index_dir: Path, document_cache_entries: int = LUCENE_DOCUMENT_CACHE_ENTRIES):
         if not LUCENE_AVAILABLE:
-            raise ImportError("PyLucene is required for BM25 retrieval.")
+            raise ImportError("PyLucene is required for Lucene retrieval.")
 
         ensure_lucene_env()
 
@@ -50,96 +153,742 @@ class LuceneBM25Retriever:
             )
 
         self.directory = FSDirectory.open(Paths.get(str(self.index_dir)))
-        self.reader = DirectoryReader.open(self.directory)
-        self.searcher = IndexSearcher(self.reader)
-        self.searcher.setSimilarity(BM25Similarity())
-        self.analyzer = StandardAnalyzer()
-        self.query_parser = QueryParser("content", self.analyzer)
+        # A null SearcherFactory yields IndexSearchers with the default
+        # BM25Similarity, the same similarity the index is written with
+        self.manager = SearcherManager(self.directory, None)
+        # (reader version, source) -> stored text, None when the reader has no such file
+        self._documents: OrderedDict[tuple[int, str], str | None] = OrderedDict()
+        self._documents_lock = threading.Lock()
+        self.document_cache_entries = document_cache_entries
+        # (reader version, stored_aliases of that reader)
+        self._aliases: tuple[int, ChunkAliases] | None = None
 
-    def search(self, query: str, top_k: int = 5) -> list[RetrievedChunk]:
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
         ensure_lucene_env()
+        searcher = self.manager.acquire()
+        try:
+            yield searcher
+        finally:
+            self.manager.release(searcher)
 
+    def maybe_refresh(self) -> bool:
+        """Swap in a new searcher if the index changed; returns True if it did."""
+        ensure_lucene_env()
+        before = self.manager.acquire()
         try:
-            parsed_query = self.query_parser.parse(query)
-            top_docs: TopDocs = self.searcher.search(parsed_query, top_k)
-
-            results: list[RetrievedChunk] = []
-            for score_doc in top_docs.scoreDocs:
-                doc = self.searcher.doc(score_doc.doc)
-                chunk: RetrievedChunk = {
-                    "id": score_doc.doc,
-                    "source": doc.get("source"),
-                    "chunk_index": int(doc.get("chunk_index")),
-                    "content": doc.get("content"),
-                    "score": float(score_doc.score),
-                }
-                results.append(chunk)
-
-            return results
-        except Exception as e:
-            print(f"Error during BM25 search: {e}")
-            return []
+            self.manager.maybeRefresh()
+        finally:
+            self.manager.release(before)
+        with self.acquire() as after:
+            changed = not after.equals(before)
+        if changed:
+            with self._documents_lock:
+                self._documents.clear()
+                self._aliases = None
+        return changed
+
+    def documents(self, searcher: Any, sources: set[str]) -> dict[str, str]:
+        """``stored_documents`` for a searcher of this manager, through a bounded LRU."""
+        version = DirectoryReader.cast_(searcher.getIndexReader()).getVersion()
+        documents: dict[str, str] = {}
+        missing: set[str] = set()
+        with self._documents_lock:
+            for source in sources:
+                key = (version, source)
+                if key not in self._documents:
+                    missing.add(source)
+                    continue
+                self._documents.move_to_end(key)
+                if self._documents[key] is not None:
+                    documents[source] = self._documents[key]
+        if not missing:
+            return documents
+        found = stored_documents(searcher, missing)
+        documents.update(found)
+        with self._documents_lock:
+            for source in missing:
+                self._documents[(version, source)] = found.get(source)
+            while len(self._documents) > self.document_cache_entries:
+                self._documents.popitem(last=False)
+        return documents
+
+    def aliases(self, searcher: Any) -> ChunkAliases:
+        """``stored_aliases`` for a searcher of this manager, read once per reader version."""
+        version = DirectoryReader.cast_(searcher.getIndexReader()).getVersion()
+        with self._documents_lock:
+            if self._aliases is not None and self._aliases[0] == version:
+                return self._aliases[1]
+        aliases = stored_aliases(searcher)
+        with self._documents_lock:
+            self._aliases = (version, aliases)
+        return aliases
+
+    def close(self):
+        ensure_lucene_env()
+        self.manager.close()
+        self.directory.close()
+
+
+class LuceneBM25Retriever:
+    def __init__(self, index_dir: Path, searcher_manager: LuceneSearcherManager | None = None):
+        if not LUCENE_AVAILABLE:
+            raise ImportError("PyLucene is required for BM25 retrieval.")
+
+        ensure_lucene_env()
+
+        self.index_dir = Path(index_dir)
+        self._owns_manager = searcher_manager is None
+        self.searcher_manager = searcher_manager or LuceneSearcherManager(self.index_dir)
+        self.analyzer = StandardAnalyzer()
+        self._local = threading.local()
+
+    @property
+    def query_parser(self) -> Any:
+        # QueryParser is not thread-safe, keep one per thread
+        parser = getattr(self._local, "query_parser", None)
+        if parser is None:
+            parser = QueryParser("content", self.analyzer)
+            self._local.query_parser = parser
+        return parser
+
+    def search(
+        self, query: str, top_k: int = 5, filters: MetadataFilter | None = None
+    ) -> list[RetrievedChunk]:
+        ensure_lucene_env()
+
+        with span("bm25"):
+            try:
+                parsed_query = self.query_parser.parse(query)
+                with self.searcher_manager.acquire() as searcher:
+                    parsed_query = _filtered(parsed_query, filters, lambda: self.searcher_manager.aliases(searcher))
+                    with span("bm25.query"):
+                        top_docs: TopDocs = searcher.search(parsed_query, top_k)
+                    with span("bm25.fetch_docs"):
+                        return _collect_hits(searcher, top_docs, self.searcher_manager.documents)
+            except Exception:
+                logger.exception("Error during BM25 search")
+                record_error("bm25")
+                return []
 
     def close(self):
-        if hasattr(self, "reader"):
-            self.reader.close()
+        if self._owns_manager:
+            self.searcher_manager.close()
+
+
+def _filter_query(filters: MetadataFilter | None, aliases: Callable[[], ChunkAliases] | None = None) -> Any:
+    """
+    Lucene query matching the documents ``filters`` accepts, None when it
+    filters nothing. With ``aliases`` a source filter also matches the kept
+    chunks that files it accepts were deduplicated into.
+    """
+    if filters is None or filters.is_empty():
+        return None
+    builder = BooleanQuery.Builder()
+    if filters.sources or filters.source_patterns:
+        # source is indexed untokenized, so names and globs match whole file names
+        sources = BooleanQuery.Builder()
+        for source in filters.sources:
+            sources.add(TermQuery(Term("source", source)), BooleanClause.Occur.SHOULD)
+        for pattern in filters.source_patterns:
+            sources.add(WildcardQuery(Term("source", pattern)), BooleanClause.Occur.SHOULD)
+        builder.add(sources.build(), BooleanClause.Occur.FILTER)
+    if filters.has_time_range():
+        low, high = filters.mtime_range()
+        builder.add(LongPoint.newRangeQuery("mtime", low, high), BooleanClause.Occur.FILTER)
+    filter_query = builder.build()
+    if aliases is None or not (filters.sources or filters.source_patterns):
+        return filter_query
+    chunks = _aliased_chunks(filters, aliases())
+    if not chunks:
+        return filter_query
+    either = BooleanQuery.Builder()
+    either.add(filter_query, BooleanClause.Occur.SHOULD)
+    either.add(_chunks_query(chunks), BooleanClause.Occur.SHOULD)
+    return either.build()
+
+
+def _aliased_chunks(filters: MetadataFilter, aliases: ChunkAliases) -> dict[str, set[int]]:
+    """Kept chunks, by source, of the deduplicated files ``filters`` accepts."""
+    # Without patterns only the named files can match, no need to scan them all
+    names = aliases if filters.source_patterns else [source for source in filters.sources if source in aliases]
+    chunks: dict[str, set[int]] = {}
+    for name in names:
+        mtime, kept = aliases[name]
+        if filters.matches(name, mtime):
+            for source, chunk_index in kept:
+                chunks.setdefault(source, set()).add(chunk_index)
+    return chunks
+
+
+def _chunks_query(chunks: dict[str, set[int]]) -> Any:
+    """Query for the chunk documents with the given chunk indexes of each source."""
+    builder = BooleanQuery.Builder()
+    for source, chunk_indexes in chunks.items():
+        chunk_query = BooleanQuery.Builder()
+        chunk_query.add(TermQuery(Term("source", source)), BooleanClause.Occur.FILTER)
+        chunk_query.add(
+            IntPoint.newSetQuery("chunk_index", JArray('int')(sorted(chunk_indexes))), BooleanClause.Occur.FILTER
+        )
+        builder.add(chunk_query.build(), BooleanClause.Occur.SHOULD)
+    return builder.build()
+
+
+def _filtered(query: Any, filters: MetadataFilter | None, aliases: Callable[[], ChunkAliases] | None = None) -> Any:
+    """``query`` restricted by non-scoring FILTER clauses."""
+    filter_query = _filter_query(filters, aliases)
+    if filter_query is None:
+        return query
+    builder = BooleanQuery.Builder()
+    builder.add(query, BooleanClause.Occur.MUST)
+    builder.add(filter_query, BooleanClause.Occur.FILTER)
+    return builder.build()
+
+
+def stored_documents(searcher: Any, sources: set[str]) -> dict[str, str]:
+    """Text of each file in ``sources``, stored once in the index next to its chunks."""
+    documents: dict[str, str] = {}
+    for source in sources:
+        builder = BooleanQuery.Builder()
+        builder.add(TermQuery(Term("source", source)), BooleanClause.Occur.FILTER)
+        builder.add(TermQuery(Term("kind", "document")), BooleanClause.Occur.FILTER)
+        top_docs = searcher.search(builder.build(), 1)
+        if len(top_docs.scoreDocs):
+            documents[source] = searcher.doc(top_docs.scoreDocs[0].doc).get("document")
+    return documents
+
+
+def stored_aliases(searcher: Any) -> ChunkAliases:
+    """Every alias document: the deduplicated file's source -> (mtime, its kept chunks)."""
+    query = TermQuery(Term("kind", "alias"))
+    aliases: ChunkAliases = {}
+    for score_doc in searcher.search(query, max(1, searcher.count(query))).scoreDocs:
+        doc = searcher.doc(score_doc.doc)
+        mtime = doc.get("mtime")
+        alias = aliases.setdefault(doc.get("source"), (None if mtime is None else float(mtime), []))
+        alias[1].append((doc.get("canonical_source"), int(doc.get("canonical_chunk_index"))))
+    return aliases
+
+
+def _collect_hits(
+    searcher: Any,
+    top_docs: Any,
+    documents: Callable[[Any, set[str]], dict[str, str]] = stored_documents,
+) -> list[RetrievedChunk]:
+    hits = [(score_doc, searcher.doc(score_doc.doc)) for score_doc in top_docs.scoreDocs]
+    # Chunks only store their span; slice it from the file's text
+    texts = documents(searcher, {doc.get("source") for _, doc in hits})
+    results: list[RetrievedChunk] = []
+    for score_doc, doc in hits:
+        source = doc.get("source")
+        start, end = int(doc.get("start")), int(doc.get("end"))
+        chunk: RetrievedChunk = {
+            "id": score_doc.doc,
+            "source": source,
+            "chunk_index": int(doc.get("chunk_index")),
+            "content": texts.get(source, "")[start:end],
+            "score": float(score_doc.score),
+            "start": start,
+            "end": end,
+        }
+        results.append(chunk)
+
+    return results
 
 
 class LuceneVectorRetriever:
-    def __init__(self, index_dir: Path, embedding_model):
+    def __init__(
+        self,
+        index_dir: Path,
+        embedding_model,
+        searcher_manager: LuceneSearcherManager | None = None,
+        similarity: str = LUCENE_VECTOR_SIMILARITY,
+        encoding: str = LUCENE_VECTOR_ENCODING,
+        num_candidates: int | None = LUCENE_KNN_NUM_CANDIDATES,
+    ):
         if not LUCENE_AVAILABLE:
             raise ImportError("PyLucene is required for vector retrieval.")
 
         ensure_lucene_env()
 
         self.index_dir = Path(index_dir)
-        if not self.index_dir.exists():
-            self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.embedding_model = embedding_model
+        self._owns_manager = searcher_manager is None
+        self.searcher_manager = searcher_manager or LuceneSearcherManager(self.index_dir)
+        # Must match the settings the index was built with
+        self.similarity = similarity
+        self.encoding = encoding
+        self.num_candidates = num_candidates
 
-        if not any(self.index_dir.iterdir()):
+    def _knn_query(self, query_vector: np.ndarray, k: int, filter_query: Any = None) -> Any:
+        vector = encode_vector(query_vector, self.similarity, self.encoding)
+        if self.encoding == "int8":
+            target = JArray('byte')(vector.tobytes())
+            query_class = KnnByteVectorQuery
+        else:
+            target = JArray('float')(vector.tolist())
+            query_class = KnnFloatVectorQuery
+        if filter_query is None:
+            return query_class("embedding", target, k)
+        # Filtered during the HNSW walk (exact search when few documents match),
+        # so top_k hits come back without over-fetching
+        return query_class("embedding", target, k, filter_query)
+
+    def search(
+        self, query: str, top_k: int = 5, filters: MetadataFilter | None = None
+    ) -> list[RetrievedChunk]:
+        ensure_lucene_env()
+
+        with span("vector"):
+            try:
+                query_vector = self.embedding_model.encode([query])[0]  # shape: (dim,)
+                return self.search_by_vector(query_vector, top_k, filters=filters)
+            except Exception:
+                logger.exception("Error during vector search")
+                record_error("vector")
+                return []
+
+    def search_by_vector(
+        self, query_vector: np.ndarray, top_k: int = 5, filters: MetadataFilter | None = None
+    ) -> list[RetrievedChunk]:
+        """kNN search for an already embedded query (used by the async path)."""
+        ensure_lucene_env()
+
+        with self.searcher_manager.acquire() as searcher:
+            # Exploring more HNSW candidates than top_k raises recall
+            knn_query = self._knn_query(
+                query_vector,
+                max(top_k, self.num_candidates or 0),
+                _filter_query(filters, lambda: self.searcher_manager.aliases(searcher)),
+            )
+            with span("vector.knn"):
+                top_docs: TopDocs = searcher.search(knn_query, top_k)
+            with span("vector.fetch_docs"):
+                return _collect_hits(searcher, top_docs, self.searcher_manager.documents)
+
+    def stored_vectors(self, chunks: list[RetrievedChunk]) -> list[np.ndarray | None]:
+        """Indexed vectors of ``chunks``, found by (source, chunk_index); None where missing."""
+        ensure_lucene_env()
+        wanted: dict[str, set[int]] = {}
+        for chunk in chunks:
+            wanted.setdefault(chunk["source"], set()).add(chunk["chunk_index"])
+        found: dict[tuple[str, int], np.ndarray] = {}
+        with self.searcher_manager.acquire() as searcher:
+            leaves = searcher.getIndexReader().leaves()
+            # Only chunk documents index chunk_index, so every hit is a wanted chunk
+            query = _chunks_query(wanted)
+            for score_doc in searcher.search(query, max(1, len(chunks))).scoreDocs:
+                doc = searcher.doc(score_doc.doc)
+                found[(doc.get("source"), int(doc.get("chunk_index")))] = self._read_vector(leaves, score_doc.doc)
+        return [found.get((chunk["source"], chunk["chunk_index"])) for chunk in chunks]
+
+    def _read_vector(self, leaves: Any, doc: int) -> np.ndarray | None:
+        leaf = LeafReaderContext.cast_(leaves.get(ReaderUtil.subIndex(doc, leaves)))
+        if self.encoding == "int8":
+            values = leaf.reader().getByteVectorValues("embedding")
+        else:
+            values = leaf.reader().getFloatVectorValues("embedding")
+        target = doc - leaf.docBase
+        if values is None or values.advance(target) != target:
+            return None
+        return np.array(list(values.vectorValue()), dtype=np.float32)
+
+    def close(self):
+        if self._owns_manager:
+            self.searcher_manager.close()
+
+
+class NumpyVectorRetriever:
+    """
+    JVM-free vector retriever over the memory-mapped NumPy index that
+    build_lucene_index writes with vector_backend="numpy".
+    """
+
+    def __init__(self, index_dir: Path, embedding_model):
+        self.index_dir = Path(index_dir)
+        self.path = self.index_dir / NUMPY_INDEX_DIRNAME
+        if not NumpyVectorIndex.exists(self.path):
             raise FileNotFoundError(
-                f"Index directory {self.index_dir} exists but is empty. "
-                "Please build the index first using: python -m scripts.build_index"
+                f"NumPy vector index {self.path} not found. Please build the index "
+                "with VECTOR_BACKEND = \"numpy\" using: python -m scripts.build_index"
             )
 
         self.embedding_model = embedding_model
-        self.directory = FSDirectory.open(Paths.get(str(self.index_dir)))
-        self.reader = DirectoryReader.open(self.directory)
-        self.searcher = IndexSearcher(self.reader)
+        self.index = NumpyVectorIndex(self.path)
+        self._lock = threading.Lock()
+
+    def search(
+        self, query: str, top_k: int = 5, filters: MetadataFilter | None = None
+    ) -> list[RetrievedChunk]:
+        with span("vector"):
+            try:
+                query_vector = self.embedding_model.encode([query])[0]
+                return self.search_by_vector(query_vector, top_k, filters=filters)
+            except Exception:
+                logger.exception("Error during vector search")
+                record_error("vector")
+                return []
+
+    def search_by_vector(
+        self, query_vector: np.ndarray, top_k: int = 5, filters: MetadataFilter | None = None
+    ) -> list[RetrievedChunk]:
+        return self.search_batch_by_vector(np.atleast_2d(query_vector), top_k, filters=filters)[0]
+
+    def search_batch(
+        self, queries: list[str], top_k: int = 5, filters: MetadataFilter | None = None
+    ) -> list[list[RetrievedChunk]]:
+        """Embed and search many queries with one embedding call and one matrix product."""
+        return self.search_batch_by_vector(self.embedding_model.encode(queries), top_k, filters=filters)
+
+    def search_batch_by_vector(
+        self, query_vectors: np.ndarray, top_k: int = 5, filters: MetadataFilter | None = None
+    ) -> list[list[RetrievedChunk]]:
+        index = self.index
+        with span("vector.knn"):
+            rows, scores = index.search(query_vectors, top_k, allowed=index.store.filter_mask(filters))
+        with span("vector.fetch_docs"):
+            return [
+                _collect_rows(index.store, query_rows, query_scores)
+                for query_rows, query_scores in zip(rows, scores)
+            ]
+
+    def stored_vectors(self, chunks: list[RetrievedChunk]) -> list[np.ndarray | None]:
+        """Indexed vectors of ``chunks``, found by (source, chunk_index); None where missing."""
+        index = self.index
+        rows = index.store.find_rows([(chunk["source"], chunk["chunk_index"]) for chunk in chunks])
+        found = np.flatnonzero(rows >= 0)
+        vectors: list[np.ndarray | None] = [None] * len(chunks)
+        # One fancy-indexed read for all the rows found
+        for i, vector in zip(found, np.asarray(index.vectors[rows[found]], dtype=np.float32)):
+            vectors[i] = vector
+        return vectors
+
+    def maybe_refresh(self) -> bool:
+        """Reopen the index if a build committed a new generation."""
+        with self._lock:
+            if NumpyVectorIndex.read_generation(self.path) == self.index.generation():
+                return False
+            # Searches still holding the old index keep their own mappings,
+            # which are released when the last of them drops it
+            self.index = NumpyVectorIndex(self.path)
+            return True
+
+    def close(self):
+        self.index.close()
+
+
+class NumpyBM25Retriever:
+    """
+    JVM-free BM25 retriever over the array-backed inverted index that
+    build_lucene_index writes with bm25_backend="numpy".
+    """
+
+    def __init__(self, index_dir: Path):
+        self.index_dir = Path(index_dir)
+        self.store_path = self.index_dir / NUMPY_INDEX_DIRNAME
+        self.path = self.store_path / BM25_DIRNAME
+        if not BM25Index.exists(self.path):
+            raise FileNotFoundError(
+                f"BM25 index {self.path} not found. Please build the index "
+                "with BM25_BACKEND = \"numpy\" using: python -m scripts.build_index"
+            )
+
+        self._lock = threading.Lock()
+        self.index, self.store = self._open()
+
+    def _open(self) -> tuple[BM25Index, ChunkStore]:
+        index = BM25Index(self.path)
+        # Rows below the count the BM25 index was built for never change
+        return index, ChunkStore(self.store_path, index.count)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        stats: CollectionStats | None = None,
+        filters: MetadataFilter | None = None,
+    ) -> list[RetrievedChunk]:
+        with span("bm25"):
+            try:
+                index, store = self.index, self.store
+                with span("bm25.query"):
+                    rows, scores = index.search(query, top_k, stats, store.filter_mask(filters))
+                with span("bm25.fetch_docs"):
+                    return _collect_rows(store, rows, scores)
+            except Exception:
+                logger.exception("Error during BM25 search")
+                record_error("bm25")
+                return []
+
+    def maybe_refresh(self) -> bool:
+        """Reopen the index if a build committed a new generation."""
+        with self._lock:
+            if BM25Index.read_generation(self.path) == self.index.generation():
+                return False
+            self.index, self.store = self._open()
+            return True
+
+    def close(self):
+        self.store.close()
+
+
+def _collect_rows(store: ChunkStore, rows: np.ndarray, scores: np.ndarray) -> list[RetrievedChunk]:
+    results: list[RetrievedChunk] = []
+    for row, score in zip(rows, scores):
+        record = store.record(int(row))
+        chunk: RetrievedChunk = {
+            "id": record["id"],
+            "source": record["source"],
+            "chunk_index": record["chunk_index"],
+            "content": store.content(record),
+            "score": float(score),
+            "start": record["start"],
+            "end": record["end"],
+        }
+        results.append(chunk)
+
+    return results
+
+
+class ShardedRetriever:
+    """
+    Searches one retriever per index shard in parallel and merges their
+    results into the global top_k by score.
+
+    Every shard returns its own top_k, so the merge is exact as long as
+    scores are comparable across shards: true for vector search, while
+    BM25 needs the statistics of all shards (ShardedNumpyBM25Retriever,
+    ShardedLuceneBM25Retriever).
+    """
+
+    def __init__(self, retrievers: list, executor: ThreadPoolExecutor | None = None):
+        self.retrievers = retrievers
+        self.executor = executor or get_shard_executor()
+
+    def _fan_out(self, method: str, *args: Any, **kwargs: Any) -> list[list[RetrievedChunk]]:
+        futures = [
+            self.executor.submit(bound_to_context(getattr(retriever, method), *args, **kwargs))
+            for retriever in self.retrievers
+        ]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def merge(result_lists: list[list[RetrievedChunk]], top_k: int) -> list[RetrievedChunk]:
+        with span("shards.merge"):
+            return heapq.nlargest(
+                top_k, (chunk for results in result_lists for chunk in results), key=lambda chunk: chunk["score"]
+            )
+
+    def search(
+        self, query: str, top_k: int = 5, filters: MetadataFilter | None = None
+    ) -> list[RetrievedChunk]:
+        return self.merge(self._fan_out("search", query, top_k, filters=filters), top_k)
 
-    def _numpy_to_java_float_array(self, vector: np.ndarray) -> Any:
-        vec = vector.astype(np.float32)
-        return JArray('float')(vec.tolist())
+    def maybe_refresh(self) -> bool:
+        refreshed = False
+        for retriever in self.retrievers:
+            if hasattr(retriever, "maybe_refresh"):
+                refreshed = retriever.maybe_refresh() or refreshed
+        return refreshed
+
+    def close(self):
+        for retriever in self.retrievers:
+            retriever.close()
+
+
+class ShardedNumpyBM25Retriever(ShardedRetriever):
+    """
+    ShardedRetriever over NumpyBM25Retrievers that scores every shard with
+    the document frequencies and lengths of all shards, so the merged
+    ranking is the one a single index would give.
+    """
+
+    def search(
+        self, query: str, top_k: int = 5, filters: MetadataFilter | None = None
+    ) -> list[RetrievedChunk]:
+        # Statistics of the whole collection, as Lucene scores filtered queries
+        with span("bm25.stats"):
+            stats = merge_collection_stats(
+                retriever.index.collection_stats(query) for retriever in self.retrievers
+            )
+        return self.merge(self._fan_out("search", query, top_k, stats=stats, filters=filters), top_k)
+
+
+class ShardedLuceneBM25Retriever(LuceneBM25Retriever):
+    """
+    Lucene BM25 over all shards at once: each query searches a MultiReader
+    over the shards' current readers, so Lucene uses global term statistics,
+    through an IndexSearcher that searches their segments concurrently on a
+    Java thread pool.
+    """
+
+    def __init__(self, searcher_managers: list[LuceneSearcherManager], threads: int = SHARD_SEARCH_WORKERS):
+        if not LUCENE_AVAILABLE:
+            raise ImportError("PyLucene is required for BM25 retrieval.")
 
-    def search(self, query: str, top_k: int = 5) -> list[RetrievedChunk]:
         ensure_lucene_env()
 
+        self.searcher_managers = searcher_managers
+        self.analyzer = StandardAnalyzer()
+        self._local = threading.local()
+        self._java_executor = Executors.newFixedThreadPool(threads)
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        with self._acquire() as (searcher, _):
+            yield searcher
+
+    @contextmanager
+    def _acquire(self) -> Iterator[tuple[Any, list[tuple[LuceneSearcherManager, Any]]]]:
+        """The MultiReader searcher and the shard searchers it reads."""
+        ensure_lucene_env()
+        acquired = []
         try:
-            query_vector = self.embedding_model.encode([query])[0]  # shape: (dim,)
-            java_vector = self._numpy_to_java_float_array(query_vector)
-
-            knn_query = KnnVectorQuery("embedding", java_vector, top_k)
-            top_docs: TopDocs = self.searcher.search(knn_query, top_k)
-
-            results: list[RetrievedChunk] = []
-            for score_doc in top_docs.scoreDocs:
-                doc = self.searcher.doc(score_doc.doc)
-                chunk: RetrievedChunk = {
-                    "id": score_doc.doc,
-                    "source": doc.get("source"),
-                    "chunk_index": int(doc.get("chunk_index")),
-                    "content": doc.get("content"),
-                    "score": float(score_doc.score),
-                }
-                results.append(chunk)
-
-            return results
-        except Exception as e:
-            print(f"Error during vector search: {e}")
-            import traceback
-            traceback.print_exc()
-            return []
+            for searcher_manager in self.searcher_managers:
+                acquired.append((searcher_manager, searcher_manager.manager.acquire()))
+            # Not closing the sub-readers: they stay owned by their SearcherManagers
+            reader = MultiReader([searcher.getIndexReader() for _, searcher in acquired], False)
+            try:
+                yield IndexSearcher(reader, self._java_executor), acquired
+            finally:
+                reader.close()
+        finally:
+            for searcher_manager, searcher in acquired:
+                searcher_manager.manager.release(searcher)
+
+    @staticmethod
+    def _documents(acquired: list[tuple[LuceneSearcherManager, Any]], sources: set[str]) -> dict[str, str]:
+        """File texts from each shard's document cache; a file is stored in one shard."""
+        documents: dict[str, str] = {}
+        for searcher_manager, searcher in acquired:
+            remaining = sources - documents.keys()
+            if not remaining:
+                break
+            documents.update(searcher_manager.documents(searcher, remaining))
+        return documents
+
+    @staticmethod
+    def _aliases(acquired: list[tuple[LuceneSearcherManager, Any]]) -> ChunkAliases:
+        """Alias documents of every shard; a file is stored in one shard."""
+        aliases: ChunkAliases = {}
+        for searcher_manager, searcher in acquired:
+            aliases.update(searcher_manager.aliases(searcher))
+        return aliases
+
+    def search(
+        self, query: str, top_k: int = 5, filters: MetadataFilter | None = None
+    ) -> list[RetrievedChunk]:
+        ensure_lucene_env()
+
+        with span("bm25"):
+            try:
+                parsed_query = self.query_parser.parse(query)
+                with self._acquire() as (searcher, acquired):
+                    parsed_query = _filtered(parsed_query, filters, lambda: self._aliases(acquired))
+                    with span("bm25.query"):
+                        top_docs: TopDocs = searcher.search(parsed_query, top_k)
+                    with span("bm25.fetch_docs"):
+                        return _collect_hits(
+                            searcher, top_docs, lambda _, sources: self._documents(acquired, sources)
+                        )
+            except Exception:
+                logger.exception("Error during BM25 search")
+                record_error("bm25")
+                return []
+
+    def close(self):
+        ensure_lucene_env()
+        self._java_executor.shutdown()
+
+
+class ShardedVectorRetriever(ShardedRetriever):
+    """ShardedRetriever that embeds the query once and sends the vector to every shard."""
+
+    def __init__(self, retrievers: list, embedding_model, executor: ThreadPoolExecutor | None = None):
+        super().__init__(retrievers, executor)
+        self.embedding_model = embedding_model
+
+    def search(
+        self, query: str, top_k: int = 5, filters: MetadataFilter | None = None
+    ) -> list[RetrievedChunk]:
+        with span("vector"):
+            try:
+                query_vector = self.embedding_model.encode([query])[0]
+                return self.search_by_vector(query_vector, top_k, filters=filters)
+            except Exception:
+                logger.exception("Error during vector search")
+                record_error("vector")
+                return []
+
+    def search_by_vector(
+        self, query_vector: np.ndarray, top_k: int = 5, filters: MetadataFilter | None = None
+    ) -> list[RetrievedChunk]:
+        return self.merge(self._fan_out("search_by_vector", query_vector, top_k, filters=filters), top_k)
+
+    def stored_vectors(self, chunks: list[RetrievedChunk]) -> list[np.ndarray | None]:
+        """Each chunk's vector from the shard that holds it."""
+        vectors: list[np.ndarray | None] = [None] * len(chunks)
+        for retriever in self.retrievers:
+            missing = [i for i, vector in enumerate(vectors) if vector is None]
+            if not missing:
+                break
+            for i, vector in zip(missing, retriever.stored_vectors([chunks[i] for i in missing])):
+                vectors[i] = vector
+        return vectors
+
+
+class HybridRetriever:
+    """
+    Runs BM25 and vector search concurrently and fuses the two rankings,
+    so a hybrid query costs roughly the slower of the two searches.
+
+    The vector leg runs on the calling thread and the BM25 leg on the
+    process-wide Lucene executor (LUCENE_EXECUTOR_WORKERS), so concurrent
+    hybrid queries are not serialized behind a per-retriever pool.
+    """
+
+    def __init__(
+        self,
+        bm25_retriever,
+        vector_retriever,
+        fusion: str = HYBRID_FUSION,
+        rrf_k: int = HYBRID_RRF_K,
+        bm25_weight: float = HYBRID_BM25_WEIGHT,
+        vector_weight: float = HYBRID_VECTOR_WEIGHT,
+        candidate_multiplier: int = HYBRID_CANDIDATE_MULTIPLIER,
+        executor: ThreadPoolExecutor | None = None,
+    ):
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown fusion method {fusion!r}, expected 'rrf' or 'weighted'")
+
+        self.bm25_retriever = bm25_retriever
+        self.vector_retriever = vector_retriever
+        self.fusion = fusion
+        self.rrf_k = rrf_k
+        self.weights = [bm25_weight, vector_weight]
+        self.candidate_multiplier = max(1, candidate_multiplier)
+        self.executor = executor or get_lucene_executor()
+
+    def search(
+        self, query: str, top_k: int = 5, filters: MetadataFilter | None = None
+    ) -> list[RetrievedChunk]:
+        candidates = top_k * self.candidate_multiplier
+        with span("hybrid"):
+            bm25_future = self.executor.submit(
+                bound_to_context(self.bm25_retriever.search, query, candidates, filters=filters)
+            )
+            vector_results = self.vector_retriever.search(query, candidates, filters=filters)
+            return self.fuse([bm25_future.result(), vector_results], top_k)
+
+    def fuse(self, result_lists: list[list[RetrievedChunk]], top_k: int) -> list[RetrievedChunk]:
+        """Fuse [bm25_results, vector_results] into the final top_k."""
+        with span("hybrid.fuse"):
+            if self.fusion == "rrf":
+                fused = reciprocal_rank_fusion(result_lists, self.weights, k=self.rrf_k)
+            else:
+                fused = weighted_score_fusion(result_lists, self.weights)
+            return fused[:top_k]
 
     def close(self):
-        if hasattr(self, "reader"):
-            self.reader.close()
+        # The executor is shared and outlives this retriever
+        pass
@@ -0,0 +1,47 @@
+import hashlib
+import json
+import shutil
+from pathlib import Path
+
+# Written next to the shard directories once every shard has been built
+SHARDS_FILE = "shards.json"
+
+
+def shard_for_source(source: str, num_shards: int) -> int:
+    """Stable shard of a document, so a file stays in its shard across builds."""
+    digest = hashlib.blake2b(source.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % num_shards
+
+
+def shard_dir(index_dir: Path, shard: int) -> Path:
+    return Path(index_dir) / f"shard-{shard:02d}"
+
+
+def read_shard_count(index_dir: Path) -> int | None:
+    """Number of shards of a sharded index, None for a single index."""
+    path = Path(index_dir) / SHARDS_FILE
+    if not path.exists():
+        return None
+    try:
+        return int(json.loads(path.read_text(encoding="utf-8"))["num_shards"])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Warning: could not read shard layout {path}: {e}")
+        return None
+
+
+def write_shard_count(index_dir: Path, num_shards: int) -> None:
+    path = Path(index_dir) / SHARDS_FILE
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps({"num_shards": num_shards}, indent=2), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def remove_shards(index_dir: Path, keep: int = 0) -> None:
+    """Delete shard directories from ``keep`` on; with ``keep=0`` the layout file too."""
+    index_dir = Path(index_dir)
+    if keep == 0:
+        (index_dir / SHARDS_FILE).unlink(missing_ok=True)
+    for path in sorted(index_dir.glob("shard-*")):
+        suffix = path.name.split("-", 1)[1]
+        if path.is_dir() and suffix.isdigit() and int(suffix) >= keep:
+            shutil.rmtree(path)
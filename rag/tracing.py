@@ -0,0 +1,223 @@
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from cached lookups to slow CPU generations
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+# Upper bounds for counts such as batch sizes and queue depths
+SIZE_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+# Upper bounds for prompt token counts
+TOKEN_BUCKETS = (0, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+class Trace:
+    """Timing spans recorded while answering one query."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._spans: list[tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, duration: float) -> None:
+        with self._lock:
+            self._spans.append((name, duration))
+
+    @property
+    def spans(self) -> list[tuple[str, float]]:
+        with self._lock:
+            return list(self._spans)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def timings(self) -> dict[str, float]:
+        """Seconds per span name (summed when a stage ran more than once), plus the total."""
+        totals: dict[str, float] = {}
+        for name, duration in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration
+        totals["total"] = self.elapsed()
+        return {name: round(seconds, 4) for name, seconds in totals.items()}
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """Process-wide stage latency histograms, size histograms and error counters."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.histograms: dict[str, Histogram] = {}
+        self.sizes: dict[str, Histogram] = {}
+        self.errors: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def observe_size(self, name: str, value: float, buckets: tuple[float, ...] = SIZE_BUCKETS) -> None:
+        """Record a count, exported as the ``rag_<name>`` histogram."""
+        with self._lock:
+            histogram = self.sizes.get(name)
+            if histogram is None:
+                histogram = self.sizes[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def count_error(self, stage: str) -> None:
+        with self._lock:
+            self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = [
+            "# HELP rag_stage_duration_seconds Duration of RAG query and ingestion stages.",
+            "# TYPE rag_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for stage in sorted(self.histograms):
+                histogram = self.histograms[stage]
+                label = _escape_label(stage)
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'rag_stage_duration_seconds_bucket{{stage="{label}",le="{bound}"}} {count}')
+                lines.append(f'rag_stage_duration_seconds_bucket{{stage="{label}",le="+Inf"}} {histogram.count}')
+                lines.append(f'rag_stage_duration_seconds_sum{{stage="{label}"}} {histogram.sum:.6f}')
+                lines.append(f'rag_stage_duration_seconds_count{{stage="{label}"}} {histogram.count}')
+
+            for name in sorted(self.sizes):
+                histogram = self.sizes[name]
+                family = f"rag_{name}"
+                lines.append(f"# TYPE {family} histogram")
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{family}_bucket{{le="{bound}"}} {count}')
+                lines.append(f'{family}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{family}_sum {histogram.sum:g}")
+                lines.append(f"{family}_count {histogram.count}")
+
+            lines.append("# HELP rag_stage_errors_total Errors raised or swallowed in RAG stages.")
+            lines.append("# TYPE rag_stage_errors_total counter")
+            for stage in sorted(self.errors):
+                lines.append(f'rag_stage_errors_total{{stage="{_escape_label(stage)}"}} {self.errors[stage]}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = MetricsRegistry()
+_current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("rag_trace", default=None)
+
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace() -> Iterator[Trace]:
+    """Collect the spans of everything run in this context (and bound_to_context threads)."""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a stage into the metrics registry and the current trace, if any."""
+    started_at = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        METRICS.count_error(name)
+        raise
+    finally:
+        duration = time.perf_counter() - started_at
+        METRICS.observe(name, duration)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, duration)
+
+
+def record(name: str, duration: float, trace: Trace | None = None) -> None:
+    """Record a duration measured elsewhere, e.g. across a generator that outlives the trace context."""
+    METRICS.observe(name, duration)
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.add(name, duration)
+
+
+def log_trace(label: str, trace: Trace) -> None:
+    timings = trace.timings()
+    stages = ", ".join(f"{name}={seconds:.3f}s" for name, seconds in timings.items() if name != "total")
+    logger.info("%s took %.3fs (%s)", label, timings["total"], stages)
+
+
+def record_error(name: str) -> None:
+    METRICS.count_error(name)
+
+
+def bound_to_context(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Callable[[], Any]:
+    """
+    Bind ``fn(*args, **kwargs)`` to a copy of the current context, so spans
+    recorded on an executor thread still land in the caller's trace.
+    """
+    return functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+_metrics_server: ThreadingHTTPServer | None = None
+_metrics_server_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = METRICS.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread; later calls reuse the running server."""
+    global _metrics_server
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+            _metrics_server = server
+        return _metrics_server
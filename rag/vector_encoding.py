@@ -0,0 +1,48 @@
+import numpy as np
+
+
+VECTOR_SIMILARITIES = ("euclidean", "cosine", "dot_product", "maximum_inner_product")
+VECTOR_ENCODINGS = ("float32", "int8")
+
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# Components of a unit vector have a standard deviation of about
+# 1/sqrt(dim); the int8 range covers this many of them before clipping
+INT8_CLIP_SIGMAS = 4.0
+
+
+def quantize_int8(vectors: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize and scale to [-127, 127], a quarter of the float32 size.
+
+    The scale depends only on the dimension, so every vector is scaled
+    alike and dot products and distances keep their order.
+    """
+    normalized = l2_normalize(np.asarray(vectors, dtype=np.float32))
+    scale = 127 * np.sqrt(normalized.shape[-1]) / INT8_CLIP_SIGMAS
+    return np.clip(np.rint(normalized * scale), -127, 127).astype(np.int8)
+
+
+def encode_vector(vector: np.ndarray, similarity: str, encoding: str) -> np.ndarray:
+    """
+    Prepare one embedding for a Lucene vector field or query.
+
+    int8 vectors are always normalized before quantizing, and dot_product
+    requires unit-length float vectors, so both index and query vectors go
+    through the same transformation here.
+    """
+    if encoding not in VECTOR_ENCODINGS:
+        raise ValueError(f"Unknown vector encoding {encoding!r}, expected one of {VECTOR_ENCODINGS}")
+    if similarity not in VECTOR_SIMILARITIES:
+        raise ValueError(f"Unknown vector similarity {similarity!r}, expected one of {VECTOR_SIMILARITIES}")
+
+    vector = np.asarray(vector, dtype=np.float32)
+    if encoding == "int8":
+        return quantize_int8(vector)
+    if similarity == "dot_product":
+        return l2_normalize(vector)
+    return vector
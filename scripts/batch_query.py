@@ -0,0 +1,310 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Iterator
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from rag.config import INDEX_DIR, RAG_PIPELINE, VECTOR_BACKEND
+from rag.models import MetadataFilter
+from rag.retrieval_service import close_retrieval_services, get_retrieval_service, retrieve
+from rag.retriever import LUCENE_AVAILABLE, ensure_lucene_env
+from rag.tracing import start_trace
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Answer a JSONL file of questions with concurrent workers, writing results as JSONL.",
+        epilog='Input lines look like {"id": "q1", "question": "...", "mode": "hybrid", "top_k": 5, '
+        '"filters": {"source_patterns": ["*.md"]}}; only "question" is required.',
+    )
+    parser.add_argument("input", type=Path, help="JSONL file of questions.")
+    parser.add_argument("output", type=Path, help="JSONL results; an existing file is resumed.")
+    parser.add_argument("--index-dir", type=Path, default=INDEX_DIR)
+    parser.add_argument("--vector-backend", choices=["lucene", "numpy"], default=VECTOR_BACKEND)
+    parser.add_argument(
+        "--mode", choices=["bm25", "vector", "hybrid"], default="vector",
+        help="Retrieval mode of questions without one (default: %(default)s).",
+    )
+    parser.add_argument("--top-k", type=int, default=5, help="Chunks per question without top_k (default: %(default)s).")
+    parser.add_argument("--pipeline", choices=["agent", "direct"], default=RAG_PIPELINE)
+    parser.add_argument(
+        "--generate", action=argparse.BooleanOptionalAction, default=True,
+        help="Generate answers; --no-generate only retrieves (default: %(default)s).",
+    )
+    parser.add_argument("--workers", type=int, default=8, help="Questions in flight (default: %(default)s).")
+    parser.add_argument("--include-content", action="store_true", help="Write chunk texts, not only their ids.")
+    parser.add_argument("--restart", action="store_true", help="Discard existing results instead of resuming.")
+    parser.add_argument("--summary", type=Path, help="Also write the run summary as JSON to this file.")
+    return parser.parse_args()
+
+
+def read_questions(path: Path, default_mode: str, default_top_k: int) -> list[dict[str, Any]]:
+    questions = []
+    seen: set[str] = set()
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                question = item["question"]
+                filters = MetadataFilter(**item["filters"]) if item.get("filters") else None
+            except (ValueError, KeyError, TypeError) as e:
+                sys.exit(f"Error: {path}:{line_number}: invalid question: {e}")
+            question_id = str(item.get("id", line_number))
+            if question_id in seen:
+                sys.exit(f"Error: {path}:{line_number}: duplicate id {question_id!r}")
+            seen.add(question_id)
+            questions.append({
+                "id": question_id,
+                "question": question,
+                "mode": item.get("mode", default_mode),
+                "top_k": int(item.get("top_k", default_top_k)),
+                "filters": filters,
+            })
+    return questions
+
+
+def load_checkpoint(path: Path) -> set[str]:
+    """
+    Ids already answered in ``path``. Failed questions and a line cut off
+    by an interrupted write are dropped from the file, so they run again.
+    """
+    if not path.exists():
+        return set()
+    done: set[str] = set()
+    kept: list[str] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if "error" not in result:
+                done.add(str(result["id"]))
+                kept.append(line if line.endswith("\n") else line + "\n")
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text("".join(kept), encoding="utf-8")
+    os.replace(tmp_path, path)
+    return done
+
+
+def make_runner(args: argparse.Namespace):
+    """Function answering one question with the shared retrievers."""
+    if not args.generate:
+        service = get_retrieval_service(args.index_dir, args.vector_backend)
+
+        def run(item: dict[str, Any]) -> dict[str, Any]:
+            with start_trace() as trace:
+                deps = service.deps(filters=item["filters"])
+                chunks = retrieve(deps, item["question"], item["mode"], item["top_k"])
+            return {"chunks": chunks, "timings": trace.timings()}
+
+        return run
+
+    if args.pipeline == "direct":
+        # Same code path as run_rag(pipeline="direct"), without needing pydantic-ai
+        from rag.direct_pipeline import run_direct_rag as run_pipeline
+    else:
+        from rag.rag_agent import run_rag
+
+        def run_pipeline(*pipeline_args, **kwargs):
+            return run_rag(*pipeline_args, pipeline="agent", **kwargs)
+
+    def run(item: dict[str, Any]) -> dict[str, Any]:
+        result = run_pipeline(
+            item["question"], item["mode"], top_k=item["top_k"], index_dir=args.index_dir,
+            vector_backend=args.vector_backend, filters=item["filters"],
+        )
+        return {
+            "answer": result.answer,
+            "chunks": [chunk.model_dump() for chunk in result.chunks],
+            "timings": result.timings or {},
+        }
+
+    return run
+
+
+def run_batch(
+    items: list[dict[str, Any]], run, workers: int
+) -> Iterator[tuple[dict[str, Any], dict[str, Any] | None, str | None, float]]:
+    """
+    Yield (item, result, error, seconds) as questions finish, with at most
+    ``workers`` in flight. On interruption, questions not yet started are
+    cancelled.
+    """
+    def timed(item: dict[str, Any]) -> tuple[dict[str, Any] | None, str | None, float]:
+        started_at = time.perf_counter()
+        try:
+            return run(item), None, time.perf_counter() - started_at
+        except Exception as e:
+            return None, repr(e), time.perf_counter() - started_at
+
+    pending = iter(items)
+    in_flight: dict[Future, dict[str, Any]] = {}
+    executor = ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="batch-query",
+        initializer=ensure_lucene_env if LUCENE_AVAILABLE else None,
+    )
+    try:
+        while True:
+            while len(in_flight) < workers:
+                item = next(pending, None)
+                if item is None:
+                    break
+                in_flight[executor.submit(timed, item)] = item
+            if not in_flight:
+                return
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield (in_flight.pop(future), *future.result())
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def to_record(
+    item: dict[str, Any], result: dict[str, Any] | None, error: str | None, seconds: float, include_content: bool
+) -> dict[str, Any]:
+    record = {
+        "id": item["id"],
+        "question": item["question"],
+        "mode": item["mode"],
+        "top_k": item["top_k"],
+        "latency_s": round(seconds, 4),
+    }
+    if error is not None:
+        record["error"] = error
+        return record
+    if "answer" in result:
+        record["answer"] = result["answer"].strip()
+    record["chunks"] = [
+        chunk if include_content else {key: value for key, value in chunk.items() if key != "content"}
+        for chunk in result["chunks"]
+    ]
+    record["timings"] = result["timings"]
+    return record
+
+
+def percentiles(seconds: list[float]) -> dict[str, float]:
+    if not seconds:
+        return {"count": 0}
+    ms = np.asarray(seconds) * 1000
+    return {
+        "count": len(seconds),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def main():
+    args = parse_args()
+    if args.workers < 1:
+        sys.exit("Error: --workers must be at least 1.")
+
+    questions = read_questions(args.input, args.mode, args.top_k)
+    if args.restart:
+        args.output.unlink(missing_ok=True)
+    done = load_checkpoint(args.output)
+    todo = [item for item in questions if item["id"] not in done]
+
+    print("=" * 60)
+    print("Batch query")
+    print("=" * 60)
+    print(f"Questions: {len(questions)} ({len(questions) - len(todo)} already answered)")
+    print(f"Index directory: {args.index_dir}")
+    print(f"Vector backend: {args.vector_backend}")
+    print(f"Pipeline: {args.pipeline if args.generate else 'retrieval only'}")
+    print(f"Workers: {args.workers}")
+    print("=" * 60)
+    if not todo:
+        print("Nothing to do.")
+        return
+
+    # Open the shared retrievers before timing. Every question is answered
+    # from the index: approximate answer-cache hits would hand one question
+    # the answer of a similar one.
+    service = get_retrieval_service(args.index_dir, args.vector_backend)
+    service.answer_cache = None
+    service.warm_up()
+    if service.bm25 is None and any(item["mode"] != "vector" for item in todo):
+        close_retrieval_services()
+        sys.exit("Error: bm25 and hybrid retrieval require PyLucene or BM25_BACKEND = \"numpy\".")
+    run = make_runner(args)
+
+    latencies: list[float] = []
+    stage_seconds: dict[str, list[float]] = {}
+    errors = 0
+    interrupted = False
+    started_at = time.perf_counter()
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(args.output, "a", encoding="utf-8") as out:
+            for count, (item, result, error, seconds) in enumerate(run_batch(todo, run, args.workers), start=1):
+                record = to_record(item, result, error, seconds, args.include_content)
+                # One flushed line per question is the checkpoint
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                if error is not None:
+                    errors += 1
+                    print(f"Question {item['id']} failed: {error}")
+                else:
+                    latencies.append(seconds)
+                    for stage, stage_time in record["timings"].items():
+                        stage_seconds.setdefault(stage, []).append(stage_time)
+                if count % 100 == 0:
+                    elapsed = time.perf_counter() - started_at
+                    print(f"  {count}/{len(todo)} questions ({count / elapsed:.1f}/s)")
+    except KeyboardInterrupt:
+        interrupted = True
+    finally:
+        elapsed = time.perf_counter() - started_at
+        close_retrieval_services()
+
+    answered = len(latencies)
+    summary = {
+        "questions": len(questions),
+        "answered_before": len(questions) - len(todo),
+        "answered": answered,
+        "errors": errors,
+        "interrupted": interrupted,
+        "elapsed_s": round(elapsed, 3),
+        "questions_per_s": round(answered / elapsed, 2) if elapsed > 0 else None,
+        "latency": percentiles(latencies),
+        "stages": {stage: percentiles(values) for stage, values in sorted(stage_seconds.items())},
+    }
+
+    print("\n" + "=" * 60)
+    print(f"Answered {answered} questions in {elapsed:.1f}s ({summary['questions_per_s']}/s), {errors} errors")
+    latency = summary["latency"]
+    if answered:
+        print(
+            f"Latency: mean {latency['mean_ms']}ms, p50 {latency['p50_ms']}ms, p90 {latency['p90_ms']}ms, "
+            f"p95 {latency['p95_ms']}ms, p99 {latency['p99_ms']}ms, max {latency['max_ms']}ms"
+        )
+        for stage, stats in summary["stages"].items():
+            print(f"  {stage}: p50 {stats['p50_ms']}ms, p95 {stats['p95_ms']}ms")
+    if interrupted:
+        print("Interrupted; run the same command again to resume.")
+    elif errors:
+        print("Failed questions are retried when the same command is run again.")
+    print("=" * 60)
+    if args.summary:
+        args.summary.write_text(json.dumps(summary, indent=2))
+        print(f"Summary written to {args.summary}")
+    if interrupted:
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
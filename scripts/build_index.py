@@ -1,15 +1,94 @@
+import argparse
+import shutil
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from rag.config import RAW_DATA_DIR, INDEX_DIR, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL_NAME
-from rag.ingestion import build_lucene_index
+from rag.config import (
+    RAW_DATA_DIR, INDEX_DIR, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_DIR,
+    VECTOR_BACKEND, BM25_BACKEND, OLLAMA_HOST, INGEST_WORKERS, LUCENE_RAM_BUFFER_MB, LUCENE_MERGE_POLICY,
+    LUCENE_FORCE_MERGE_SEGMENTS, INDEX_SHARDS, INGEST_DEDUP,
+)
+from rag.index_versions import new_version_dir, prune_versions, publish_version
+from rag.ingestion import FullRebuildRequired, build_lucene_index, build_sharded_index
+from rag.sharding import read_shard_count
 from rag.embedding_model import EmbeddingModel
+from rag.embedding_cache import EmbeddingCache
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build the Lucene index from raw documents.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only re-index files added, modified or removed since the last build.",
+    )
+    parser.add_argument(
+        "--vector-backend",
+        choices=["lucene", "numpy"],
+        default=VECTOR_BACKEND,
+        help="Where to store chunk embeddings (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--bm25-backend",
+        choices=["lucene", "numpy"],
+        default=BM25_BACKEND,
+        help="Which BM25 index to build (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=INGEST_WORKERS,
+        help="Processes reading and chunking documents, and threads writing to Lucene "
+        "(0 = one per core, default: %(default)s).",
+    )
+    parser.add_argument(
+        "--ram-buffer-mb",
+        type=float,
+        default=LUCENE_RAM_BUFFER_MB,
+        help="Lucene IndexWriter RAM buffer before flushing a segment (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--merge-policy",
+        choices=["tiered", "log_byte_size"],
+        default=LUCENE_MERGE_POLICY,
+        help="Lucene segment merge policy (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--force-merge",
+        type=int,
+        default=LUCENE_FORCE_MERGE_SEGMENTS,
+        metavar="SEGMENTS",
+        help="After a full build, merge the Lucene index down to this many segments.",
+    )
+    parser.add_argument(
+        "--dedup",
+        action=argparse.BooleanOptionalAction,
+        default=INGEST_DEDUP,
+        help="Skip exact and near-duplicate chunks before embedding (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=INDEX_SHARDS,
+        help="Split the index into this many shards by hash of the file name (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--shard",
+        type=int,
+        action="append",
+        dest="only_shards",
+        metavar="N",
+        help="Only rebuild shard N of a sharded index (repeatable).",
+    )
+    return parser.parse_args()
 
 
 def main():
     """Build the Lucene index from raw documents."""
+    args = parse_args()
+
     print("=" * 60)
     print("Building Lucene Index")
     print("=" * 60)
@@ -18,6 +97,15 @@ def main():
     print(f"Chunk size: {CHUNK_SIZE}")
     print(f"Chunk overlap: {CHUNK_OVERLAP}")
     print(f"Embedding model: {EMBEDDING_MODEL_NAME}")
+    print(f"Embedding cache: {EMBEDDING_CACHE_DIR}")
+    print(f"Vector backend: {args.vector_backend}")
+    print(f"BM25 backend: {args.bm25_backend}")
+    print(f"Mode: {'incremental' if args.incremental else 'full rebuild'}")
+    print(f"Workers: {args.workers or 'one per core'}")
+    print(f"Deduplication: {'on' if args.dedup else 'off'}")
+    if args.shards > 1:
+        shards = ", ".join(map(str, args.only_shards)) if args.only_shards else "all"
+        print(f"Shards: {args.shards} (building {shards})")
     print("=" * 60)
 
     if not RAW_DATA_DIR.exists():
@@ -26,18 +114,76 @@ def main():
         sys.exit(1)
 
     print("\nInitializing embedding model...")
-    embedding_model = EmbeddingModel(EMBEDDING_MODEL_NAME)
+    embedding_model = EmbeddingModel(
+        EMBEDDING_MODEL_NAME, base_url=OLLAMA_HOST, cache=EmbeddingCache(EMBEDDING_CACHE_DIR)
+    )
+
+    options = dict(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        vector_backend=args.vector_backend,
+        bm25_backend=args.bm25_backend,
+        workers=args.workers,
+        ram_buffer_mb=args.ram_buffer_mb,
+        merge_policy=args.merge_policy,
+        force_merge_segments=args.force_merge,
+        dedup=args.dedup,
+    )
+
+    def build(index_dir: Path, incremental: bool) -> bool:
+        """Returns whether the index changed (an incremental build may find nothing to do)."""
+        if incremental and read_shard_count(index_dir) != (args.shards if args.shards > 1 else None):
+            raise FullRebuildRequired(f"{index_dir} does not have {args.shards} shard(s)")
+        if args.shards > 1:
+            shard_stats = build_sharded_index(
+                RAW_DATA_DIR, index_dir, embedding_model, args.shards, shards=args.only_shards,
+                incremental=incremental, allow_full_rebuild=False, **options
+            )
+            return any(shard_stats.values())
+        return bool(build_lucene_index(
+            RAW_DATA_DIR, index_dir, embedding_model,
+            incremental=incremental, allow_full_rebuild=False, **options
+        ))
 
     try:
-        build_lucene_index(
-            raw_data_dir=RAW_DATA_DIR,
-            index_dir=INDEX_DIR,
-            embedding_model=embedding_model,
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-        )
+        if args.only_shards:
+            if args.shards < 2:
+                print("Error: --shard requires --shards greater than 1.")
+                sys.exit(1)
+            # The other shards are kept, so the selected ones are rebuilt in place
+            shard_stats = build_sharded_index(
+                RAW_DATA_DIR, INDEX_DIR, embedding_model, args.shards, shards=args.only_shards,
+                incremental=args.incremental, **options
+            )
+            outcome = "updated" if any(shard_stats.values()) else "up to date"
+        else:
+            rebuild = True
+            if args.incremental and INDEX_DIR.exists() and any(INDEX_DIR.iterdir()):
+                try:
+                    # Searchers pick up incremental commits in place
+                    outcome = "updated" if build(INDEX_DIR, incremental=True) else "up to date"
+                    rebuild = False
+                except FullRebuildRequired as e:
+                    print(f"{e}, building a new index version")
+            if rebuild:
+                # Built beside the served index, which stays usable until the switch
+                version_dir = new_version_dir(INDEX_DIR)
+                try:
+                    build(version_dir, incremental=False)
+                except BaseException:
+                    shutil.rmtree(version_dir, ignore_errors=True)
+                    raise
+                publish_version(INDEX_DIR, version_dir)
+                outcome = "built"
+                print(f"Switched {INDEX_DIR} to {version_dir.name}")
+                for path in prune_versions(INDEX_DIR):
+                    print(f"Removed old index version {path.name}")
         print("\n" + "=" * 60)
-        print("Index built successfully!")
+        print({
+            "up to date": "Index is up to date!",
+            "updated": "Index updated successfully!",
+            "built": "Index built successfully!",
+        }[outcome])
         print("=" * 60)
     except Exception as e:
         print(f"\nError building index: {e}")
@@ -0,0 +1,215 @@
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from rag.config import (
+    INDEX_DIR, EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_DIR, VECTOR_BACKEND, NUMPY_INDEX_DIRNAME,
+    LUCENE_VECTOR_SIMILARITY, OLLAMA_HOST,
+)
+from rag.embedding_cache import EmbeddingCache
+from rag.embedding_model import EmbeddingModel
+from rag.numpy_index import NumpyVectorIndex
+from rag.retriever import (
+    LUCENE_AVAILABLE,
+    LuceneVectorRetriever,
+    NumpyVectorRetriever,
+    ensure_lucene_env,
+    stored_documents,
+)
+from rag.vector_encoding import l2_normalize
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Measure recall@k and latency of the vector index against exact brute-force search."
+    )
+    parser.add_argument("--index-dir", type=Path, default=INDEX_DIR)
+    parser.add_argument("--backend", choices=["lucene", "numpy"], default=VECTOR_BACKEND)
+    parser.add_argument(
+        "--queries", type=Path,
+        help="File with one query per line (default: sample chunk texts from the index).",
+    )
+    parser.add_argument("--num-queries", type=int, default=100, help="Chunks to sample as queries.")
+    parser.add_argument("--k", default="5,10", help="Comma-separated k values for recall@k.")
+    parser.add_argument(
+        "--num-candidates", default="0,50,100,200",
+        help="Comma-separated HNSW candidate counts to sweep (0 = k; Lucene only).",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file.")
+    return parser.parse_args()
+
+
+def load_corpus(index_dir: Path, backend: str) -> list[tuple[str, int, str]]:
+    """Return (source, chunk_index, content) of every live chunk in the index."""
+    if backend == "numpy":
+        index = NumpyVectorIndex(index_dir / NUMPY_INDEX_DIRNAME)
+        try:
+            corpus = []
+            for row in range(index.count):
+                if not index.store.deleted[row]:
+                    record = index.store.record(row)
+                    corpus.append((record["source"], record["chunk_index"], index.store.content(record)))
+            return corpus
+        finally:
+            index.close()
+
+    from java.nio.file import Paths  # type: ignore
+    from org.apache.lucene.index import DirectoryReader, MultiBits  # type: ignore
+    from org.apache.lucene.search import IndexSearcher  # type: ignore
+    from org.apache.lucene.store import FSDirectory  # type: ignore
+
+    ensure_lucene_env()
+    directory = FSDirectory.open(Paths.get(str(index_dir)))
+    reader = DirectoryReader.open(directory)
+    try:
+        searcher = IndexSearcher(reader)
+        live_docs = MultiBits.getLiveDocs(reader)
+        chunks = []
+        for doc_num in range(reader.maxDoc()):
+            if live_docs is not None and not live_docs.get(doc_num):
+                continue
+            doc = searcher.doc(doc_num)
+            # Skip the documents holding each file's text and the alias documents
+            if doc.get("chunk_index") is not None:
+                chunks.append((
+                    doc.get("source"), int(doc.get("chunk_index")), int(doc.get("start")), int(doc.get("end")),
+                ))
+        documents = stored_documents(searcher, {source for source, _, _, _ in chunks})
+        return [
+            (source, chunk_index, documents.get(source, "")[start:end])
+            for source, chunk_index, start, end in chunks
+        ]
+    finally:
+        reader.close()
+        directory.close()
+
+
+def exact_top_k(queries: np.ndarray, vectors: np.ndarray, k: int, similarity: str) -> np.ndarray:
+    """Brute-force top-k rows under the similarity the index was built with."""
+    if similarity in ("cosine", "dot_product"):
+        scores = l2_normalize(queries) @ l2_normalize(vectors).T
+    elif similarity == "maximum_inner_product":
+        scores = queries @ vectors.T
+    else:
+        # Negative squared distance ranks like euclidean similarity
+        scores = 2 * queries @ vectors.T - (vectors ** 2).sum(axis=1)[None, :]
+    top = np.argpartition(-scores, min(k, scores.shape[1]) - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def index_size_bytes(index_dir: Path, backend: str) -> int:
+    if backend == "numpy":
+        files = (index_dir / NUMPY_INDEX_DIRNAME).glob("*")
+    else:
+        # Lucene files only; small segments keep vectors inside compound .cfs files
+        files = (path for path in index_dir.iterdir() if path.name != NUMPY_INDEX_DIRNAME)
+    return sum(path.stat().st_size for path in files if path.is_file())
+
+
+def main():
+    args = parse_args()
+    k_values = sorted(int(k) for k in args.k.split(","))
+    max_k = k_values[-1]
+    candidate_sweep = [int(n) for n in args.num_candidates.split(",")] if args.backend == "lucene" else [0]
+    # The NumPy backend always scores cosine similarity
+    similarity = LUCENE_VECTOR_SIMILARITY if args.backend == "lucene" else "cosine"
+
+    if args.backend == "lucene" and not LUCENE_AVAILABLE:
+        print("Error: PyLucene is required to evaluate the Lucene vector index.")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("Evaluating vector index")
+    print("=" * 60)
+    print(f"Index directory: {args.index_dir}")
+    print(f"Backend: {args.backend}")
+    print(f"Similarity: {similarity}")
+    print("=" * 60)
+
+    embedding_model = EmbeddingModel(
+        EMBEDDING_MODEL_NAME, base_url=OLLAMA_HOST, cache=EmbeddingCache(EMBEDDING_CACHE_DIR)
+    )
+    try:
+        corpus = load_corpus(args.index_dir, args.backend)
+        if not corpus:
+            print("Error: the index is empty.")
+            sys.exit(1)
+        keys = [(source, chunk_index) for source, chunk_index, _ in corpus]
+
+        if args.queries:
+            queries = [line.strip() for line in args.queries.read_text().splitlines() if line.strip()]
+        else:
+            rng = random.Random(args.seed)
+            queries = [content for _, _, content in rng.sample(corpus, min(args.num_queries, len(corpus)))]
+
+        # Full-precision embeddings are the ground truth, so quantization
+        # loss in the index shows up as lost recall. Cached vectors make
+        # this cheap after a build.
+        print(f"\nEmbedding {len(corpus)} chunks and {len(queries)} queries...")
+        corpus_vectors = embedding_model.encode([content for _, _, content in corpus])
+        query_vectors = embedding_model.encode(queries)
+        exact = exact_top_k(query_vectors, corpus_vectors, max_k, similarity)
+
+        if args.backend == "numpy":
+            retriever = NumpyVectorRetriever(args.index_dir, embedding_model)
+        else:
+            retriever = LuceneVectorRetriever(args.index_dir, embedding_model)
+
+        results = []
+        try:
+            for num_candidates in candidate_sweep:
+                if args.backend == "lucene":
+                    retriever.num_candidates = num_candidates or None
+                latencies = []
+                hits = {k: 0 for k in k_values}
+                for query_vector, exact_rows in zip(query_vectors, exact):
+                    started_at = time.perf_counter()
+                    found = retriever.search_by_vector(query_vector, max_k)
+                    latencies.append(time.perf_counter() - started_at)
+
+                    found_keys = [(chunk["source"], chunk["chunk_index"]) for chunk in found]
+                    for k in k_values:
+                        expected = {keys[row] for row in exact_rows[:k]}
+                        hits[k] += len(expected & set(found_keys[:k]))
+
+                latencies_ms = np.asarray(latencies) * 1000
+                row = {
+                    "num_candidates": num_candidates or max_k,
+                    **{f"recall@{k}": round(hits[k] / (k * len(queries)), 4) for k in k_values},
+                    "latency_ms_mean": round(float(latencies_ms.mean()), 3),
+                    "latency_ms_p50": round(float(np.percentile(latencies_ms, 50)), 3),
+                    "latency_ms_p95": round(float(np.percentile(latencies_ms, 95)), 3),
+                }
+                results.append(row)
+                print("  " + "  ".join(f"{name}={value}" for name, value in row.items()))
+        finally:
+            retriever.close()
+    finally:
+        embedding_model.close()
+
+    report = {
+        "index_dir": str(args.index_dir),
+        "backend": args.backend,
+        "similarity": similarity,
+        "chunks": len(corpus),
+        "queries": len(queries),
+        "index_bytes": index_size_bytes(args.index_dir, args.backend),
+        "results": results,
+    }
+    print(f"\nIndex size: {report['index_bytes'] / 1e6:.1f} MB")
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import pytest
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from rag.config import EMBEDDING_MODEL_NAME
+from rag.embedding_model import EmbeddingModel
+
+
+@pytest.fixture
+def ollama():
+    with FakeOllamaServer(dim=32) as server:
+        yield server
+
+
+@pytest.fixture
+def embedding_model(ollama):
+    model = EmbeddingModel(EMBEDDING_MODEL_NAME, base_url=ollama.url)
+    yield model
+    model.close()
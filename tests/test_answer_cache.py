@@ -0,0 +1,132 @@
+import asyncio
+
+import numpy as np
+
+from rag.answer_cache import AnswerCache, alookup_answer, lookup_answer, store_answer
+from rag.models import MetadataFilter, RAGResult
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _CountingEmbedder:
+    def __init__(self, vectors: dict[str, list[float]]):
+        self.vectors = vectors
+        self.calls = 0
+
+    def encode(self, texts):
+        self.calls += 1
+        return np.asarray([self.vectors[text] for text in texts], dtype=np.float32)
+
+
+class _AsyncEmbedder:
+    def __init__(self, embedder: _CountingEmbedder):
+        self.embedder = embedder
+
+    async def encode(self, texts):
+        return self.embedder.encode(texts)
+
+
+class _Service:
+    """The attributes of RetrievalService the answer cache helpers use."""
+
+    def __init__(self, embedder: _CountingEmbedder):
+        self.answer_cache = AnswerCache()
+        self.generation = 0
+        self.query_embedding_model = embedder
+        self.async_embedding_model = _AsyncEmbedder(embedder)
+
+    def maybe_refresh(self) -> None:
+        pass
+
+
+def _result(answer: str, mode: str = "hybrid") -> RAGResult:
+    return RAGResult(answer=answer, retrieval_mode=mode, chunks=[])
+
+
+def test_exact_match_ignores_case_spacing_and_punctuation():
+    cache = AnswerCache()
+    cache.put("What is RAG?", "hybrid", 5, 0, _result("retrieval"))
+
+    assert cache.get("  what is   rag ", "hybrid", 5, 0).answer == "retrieval"
+    assert cache.get("What is RAG?", "bm25", 5, 0) is None
+    assert cache.get("What is RAG?", "hybrid", 3, 0) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_approximate_match_needs_the_same_mode_top_k_and_filter():
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put("what is rag", "hybrid", 5, 0, _result("retrieval"), query_vector=np.array([1.0, 0.0]))
+
+    assert cache.get("explain rag", "hybrid", 5, 0, query_vector=np.array([0.99, 0.1])).answer == "retrieval"
+    assert cache.get("explain rag", "hybrid", 5, 0, query_vector=np.array([0.5, 0.5])) is None
+    assert cache.get("explain rag", "vector", 5, 0, query_vector=np.array([1.0, 0.0])) is None
+    filter_key = MetadataFilter(sources=["a.txt"]).cache_key()
+    assert cache.get("explain rag", "hybrid", 5, 0, query_vector=np.array([1.0, 0.0]), filter_key=filter_key) is None
+
+
+def test_entries_expire():
+    clock = _Clock()
+    cache = AnswerCache(ttl_seconds=10, clock=clock)
+    cache.put("q", "bm25", 5, 0, _result("a"), query_vector=np.array([1.0, 0.0]))
+
+    clock.now = 9.9
+    assert cache.get("q", "bm25", 5, 0) is not None
+    clock.now = 10.0
+    assert cache.get("q", "bm25", 5, 0, query_vector=np.array([1.0, 0.0])) is None
+    assert len(cache) == 0
+
+
+def test_new_generation_drops_older_answers():
+    cache = AnswerCache()
+    cache.put("q", "bm25", 5, 1, _result("old"))
+
+    assert cache.get("q", "bm25", 5, 0) is None
+    assert cache.get("q", "bm25", 5, 2) is None
+    assert len(cache) == 0
+    # An answer computed on the replaced index is not stored
+    cache.put("q", "bm25", 5, 1, _result("stale"))
+    assert len(cache) == 0
+
+
+def test_evicts_least_recently_used():
+    cache = AnswerCache(max_entries=2)
+    cache.put("a", "bm25", 5, 0, _result("a"))
+    cache.put("b", "bm25", 5, 0, _result("b"))
+    cache.get("a", "bm25", 5, 0)
+    cache.put("c", "bm25", 5, 0, _result("c"))
+
+    assert cache.get("a", "bm25", 5, 0) is not None
+    assert cache.get("b", "bm25", 5, 0) is None
+
+
+def test_lookup_embeds_only_after_an_exact_miss():
+    embedder = _CountingEmbedder({"what is rag": [1.0, 0.0], "explain rag": [0.99, 0.1]})
+    service = _Service(embedder)
+
+    lookup = lookup_answer(service, "what is rag", "hybrid", 5)
+    assert lookup.result is None and embedder.calls == 1
+    store_answer(service, lookup, "what is rag", "hybrid", 5, _result("retrieval"))
+
+    assert lookup_answer(service, "What is RAG?", "hybrid", 5).result.answer == "retrieval"
+    assert embedder.calls == 1
+    assert lookup_answer(service, "explain rag", "hybrid", 5).result.answer == "retrieval"
+    assert embedder.calls == 2
+
+
+def test_bm25_lookup_never_embeds():
+    embedder = _CountingEmbedder({})
+    service = _Service(embedder)
+
+    lookup = lookup_answer(service, "what is rag", "bm25", 5)
+    store_answer(service, lookup, "what is rag", "bm25", 5, _result("retrieval", "bm25"))
+
+    assert lookup.query_vector is None
+    assert lookup_answer(service, "what is rag?", "bm25", 5).result.answer == "retrieval"
+    assert asyncio.run(alookup_answer(service, "what is rag", "bm25", 5)).result.answer == "retrieval"
+    assert embedder.calls == 0
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import rag.numpy_index as numpy_index
+from rag.bm25 import BM25Index, build_bm25_index, update_bm25_index
+from tests.test_numpy_index import _add_file
+
+DOCUMENTS = [
+    "apples grow on trees",
+    "red apples and green apples",
+    "bananas are yellow",
+    "cherries and apples",
+    "more cherries",
+]
+
+
+def test_search_ranks_by_bm25(tmp_path):
+    build_bm25_index(tmp_path, enumerate(DOCUMENTS), len(DOCUMENTS), 1)
+    index = BM25Index(tmp_path)
+    rows, scores = index.search("apples", 10)
+    # Higher term frequency first, then the shorter chunk
+    assert rows.tolist() == [1, 3, 0]
+    assert scores[0] > scores[1] > scores[2]
+    assert index.search("durian", 10)[0].size == 0
+    allowed = np.array([True, False, True, True, True])
+    assert index.search("apples", 10, allowed=allowed)[0].tolist() == [3, 0]
+
+
+def test_update_matches_full_build(tmp_path):
+    # Rows 0-2 were indexed; row 2 is deleted and rows 3-4 are added
+    build_bm25_index(tmp_path / "base", enumerate(DOCUMENTS[:3]), 3, 1)
+    deleted = np.array([False, False, True, False, False])
+    added = [(row, DOCUMENTS[row]) for row in (3, 4)]
+    update_bm25_index(tmp_path / "updated", BM25Index(tmp_path / "base"), added, 5, deleted, 2)
+    live = [(row, text) for row, text in enumerate(DOCUMENTS) if not deleted[row]]
+    build_bm25_index(tmp_path / "full", live, 5, 2)
+
+    updated, full = BM25Index(tmp_path / "updated"), BM25Index(tmp_path / "full")
+    # Terms only the deleted row had are gone
+    assert "bananas" not in updated.vocab
+    assert set(updated.vocab) == set(full.vocab)
+    assert updated.meta == full.meta
+    np.testing.assert_array_equal(updated.doc_lens, full.doc_lens)
+    for query in ("apples", "cherries", "red apples trees", "bananas"):
+        rows, scores = updated.search(query, 10)
+        full_rows, full_scores = full.search(query, 10)
+        np.testing.assert_array_equal(rows, full_rows)
+        np.testing.assert_allclose(scores, full_scores)
+
+
+def test_writer_extends_bm25_incrementally(tmp_path, monkeypatch):
+    path = tmp_path / "numpy_index"
+    writer = numpy_index.NumpyIndexWriter(path, incremental=False, with_bm25=True)
+    _add_file(writer, "a.txt", ["apples grow on trees", "red apples"], [[1, 0], [1, 0]])
+    writer.commit()
+
+    updates = []
+    monkeypatch.setattr(
+        numpy_index, "update_bm25_index", lambda *args: updates.append(args) or update_bm25_index(*args)
+    )
+    writer = numpy_index.NumpyIndexWriter(path, incremental=True, with_bm25=True)
+    writer.delete_source("a.txt")
+    _add_file(writer, "b.txt", ["cherries and apples"], [[0, 1]])
+    writer.commit()
+
+    assert len(updates) == 1
+    index = BM25Index(path / numpy_index.BM25_DIRNAME)
+    assert index.meta["num_docs"] == 1
+    assert index.search("apples", 10)[0].tolist() == [2]
+    assert index.search("trees", 10)[0].size == 0
@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from rag.ingestion import chunk_spans, chunk_text
+
+
+def _document(num_words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = []
+    for i in range(num_words):
+        word = rng.choice(["policy", "refund", "naïve", "東京", "data", "(note.)", "end."])
+        words.append(word + rng.choice([" ", "  ", "\n", "\t", " 　"]))
+    return "  " + "".join(words)
+
+
+def _word_index(text: str, spans: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Spans as (first word, last word + 1) indexes into text.split()."""
+    starts = [0]
+    for i in range(1, len(text)):
+        if not text[i].isspace() and text[i - 1].isspace():
+            starts.append(i)
+    if text[0].isspace():
+        starts = starts[1:]
+    return [(starts.index(start), starts.index(start) + len(text[start:end].split())) for start, end in spans]
+
+
+@pytest.mark.parametrize("sentence_lookback", [0, 40])
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(50, 10), (100, 0), (30, 29)])
+def test_spans_cover_text_with_overlap(chunk_size, chunk_overlap, sentence_lookback):
+    text = _document(1000)
+    spans = chunk_spans(text, chunk_size, chunk_overlap, sentence_lookback)
+    words = _word_index(text, spans)
+
+    assert words[0][0] == 0
+    assert words[-1][1] == len(text.split())
+    for (first, last), (next_first, _) in zip(words, words[1:]):
+        assert 0 < last - first <= chunk_size
+        # The next chunk starts exactly chunk_overlap words before this one ends
+        assert next_first == last - chunk_overlap
+        assert next_first > first
+    for start, end in spans:
+        chunk = text[start:end]
+        assert chunk == chunk.strip()
+
+
+def test_chunks_end_at_sentences():
+    sentence = "one two three four five six seven eight nine ten. "
+    text = sentence * 20
+    for chunk in chunk_text(text, chunk_size=25, chunk_overlap=5):
+        assert chunk.endswith("ten.")
+
+
+def test_short_and_empty_text():
+    assert chunk_spans("", 10, 2) == []
+    assert chunk_spans(" \n\t ", 10, 2) == []
+    assert chunk_spans("  a few words  ", 10, 2) == [(2, 13)]
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        chunk_spans("some text", 10, 10)
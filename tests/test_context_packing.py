@@ -0,0 +1,71 @@
+from rag.context_packing import drop_near_duplicates, merge_adjacent, pack_context
+
+TEXT = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu"
+
+
+def _chunk(source: str, chunk_index: int, start: int, end: int, score: float, text: str = TEXT) -> dict:
+    return {
+        "id": chunk_index, "source": source, "chunk_index": chunk_index,
+        "content": text[start:end], "score": score, "start": start, "end": end,
+    }
+
+
+def test_merges_overlapping_consecutive_chunks():
+    # "gamma delta epsilon" overlaps "delta epsilon zeta eta"
+    chunks = [_chunk("a.txt", 1, 11, 30, 0.5), _chunk("a.txt", 2, 17, 39, 0.9), _chunk("a.txt", 0, 0, 10, 0.1)]
+
+    [passage] = merge_adjacent(chunks)
+
+    assert (passage.first_chunk, passage.last_chunk) == (0, 2)
+    assert (passage.start, passage.end) == (0, 39)
+    assert passage.content == "alpha beta gamma delta epsilon zeta eta"
+    assert passage.score == 0.9
+    assert passage.label == "a.txt, chunks 0-2"
+
+
+def test_keeps_gaps_and_sources_apart():
+    chunks = [_chunk("a.txt", 0, 0, 10, 0.5), _chunk("a.txt", 2, 17, 30, 0.4), _chunk("b.txt", 1, 0, 10, 0.3)]
+
+    passages = merge_adjacent(chunks)
+
+    assert [(p.source, p.first_chunk, p.last_chunk) for p in passages] == [
+        ("a.txt", 0, 0), ("a.txt", 2, 2), ("b.txt", 1, 1),
+    ]
+
+
+def test_repeated_chunk_is_kept_once_with_its_best_score():
+    passages = merge_adjacent([_chunk("a.txt", 0, 0, 10, 0.2), _chunk("a.txt", 0, 0, 10, 0.7)])
+
+    assert [(p.content, p.score) for p in passages] == [("alpha beta", 0.7)]
+
+
+def test_drops_near_duplicates_of_better_passages():
+    passages = merge_adjacent([
+        _chunk("a.txt", 0, 0, len(TEXT), 0.9),
+        _chunk("copy.txt", 0, 0, len(TEXT), 0.5),
+        _chunk("b.txt", 0, 0, 22, 0.7, "something else entirely"),
+    ])
+
+    assert [p.source for p in drop_near_duplicates(passages, threshold=0.8)] == ["a.txt", "b.txt"]
+
+
+def test_budget_truncates_the_last_passage_and_its_span():
+    chunks = [_chunk("a.txt", 0, 0, 22, 0.9), _chunk("b.txt", 0, 0, len(TEXT), 0.5)]
+
+    packed = pack_context(chunks, token_budget=16, min_passage_tokens=2, chars_per_token=2.0)
+
+    first, second = packed.passages
+    assert first.content == "alpha beta gamma delta"
+    assert second.content == "alpha ..."
+    assert (second.start, second.end) == (0, len("alpha"))
+    assert TEXT[second.start:second.end] == "alpha"
+    assert packed.tokens_after <= 16
+    assert packed.tokens_saved == packed.tokens_before - packed.tokens_after
+
+
+def test_budget_leaves_out_passages_too_small_to_fill():
+    chunks = [_chunk("a.txt", 0, 0, 22, 0.9), _chunk("b.txt", 0, 0, len(TEXT), 0.5)]
+
+    packed = pack_context(chunks, token_budget=16, min_passage_tokens=6, chars_per_token=2.0)
+
+    assert [p.source for p in packed.passages] == ["a.txt"]
@@ -0,0 +1,96 @@
+import hashlib
+
+import pytest
+
+from rag.dedup import ChunkDeduplicator
+from rag.ingestion import build_lucene_index
+from rag.models import MetadataFilter
+from rag.retrieval_service import RetrievalService, retrieve
+
+POLICY = "The refund policy allows returns within thirty days of purchase with a receipt. " * 20
+OTHER = "Zebras graze on the savanna while lions rest in the shade of acacia trees. " * 20
+
+
+def _text_with_nul_digest() -> str:
+    """A chunk whose digest ends with a NUL byte, as a bytes dtype would strip it."""
+    for i in range(100_000):
+        text = f"chunk number {i}"
+        if hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest().endswith(b"\0"):
+            return text
+    raise AssertionError("no digest ending with NUL found")
+
+
+def test_save_load_round_trip(tmp_path):
+    dedup = ChunkDeduplicator()
+    nul_text = _text_with_nul_digest()
+    assert dedup.add("a.txt", 0, POLICY) is None
+    assert dedup.add("a.txt", 1, nul_text) is None
+    assert dedup.add("b.txt", 0, OTHER) is None
+    assert dedup.add("c.md", 0, POLICY) == ("a.txt", 0)
+    dedup.save(tmp_path / "dedup.npz")
+
+    loaded = ChunkDeduplicator.load(tmp_path / "dedup.npz")
+    assert loaded.keys == dedup.keys
+    assert loaded.digests == dedup.digests
+    assert loaded.links == {"c.md": {"a.txt"}}
+    assert loaded.add("d.md", 0, nul_text) == ("a.txt", 1)
+    assert loaded.add("d.md", 1, POLICY.upper()) == ("a.txt", 0)
+
+
+def test_save_load_empty(tmp_path):
+    ChunkDeduplicator().save(tmp_path / "dedup.npz")
+    assert len(ChunkDeduplicator.load(tmp_path / "dedup.npz")) == 0
+
+
+@pytest.fixture
+def deduplicated_index(tmp_path, embedding_model):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    (raw / "a.txt").write_text(POLICY)
+    (raw / "b.txt").write_text(OTHER)
+    (raw / "c.md").write_text(POLICY)
+    index = tmp_path / "index"
+    build_lucene_index(raw, index, embedding_model, 200, 20, vector_backend="numpy", bm25_backend="numpy")
+    return raw, index
+
+
+@pytest.fixture
+def service(deduplicated_index, embedding_model):
+    service = RetrievalService(
+        deduplicated_index[1], embedding_model=embedding_model, vector_backend="numpy", bm25_backend="numpy"
+    )
+    yield service
+    service.close()
+
+
+@pytest.mark.parametrize("mode", ["bm25", "vector", "hybrid"])
+@pytest.mark.parametrize(
+    "filters", [MetadataFilter(sources=["c.md"]), MetadataFilter(source_patterns=["*.md"])]
+)
+def test_filter_on_duplicate_source(service, mode, filters):
+    chunks = retrieve(service.deps(filters=filters), "refund policy returns", mode, 3)
+    # c.md's chunks were dropped as duplicates of a.txt's
+    assert chunks
+    assert {chunk["source"] for chunk in chunks} == {"a.txt"}
+
+
+def test_removed_duplicate_no_longer_matches(deduplicated_index, service, embedding_model):
+    raw, index = deduplicated_index
+    (raw / "c.md").unlink()
+    build_lucene_index(
+        raw, index, embedding_model, 200, 20, incremental=True, vector_backend="numpy", bm25_backend="numpy"
+    )
+    service.maybe_refresh(force=True)
+    assert retrieve(service.deps(filters=MetadataFilter(sources=["c.md"])), "refund policy", "bm25", 3) == []
+
+
+def test_removed_canonical_reindexes_duplicate(deduplicated_index, service, embedding_model):
+    raw, index = deduplicated_index
+    (raw / "a.txt").unlink()
+    build_lucene_index(
+        raw, index, embedding_model, 200, 20, incremental=True, vector_backend="numpy", bm25_backend="numpy"
+    )
+    service.maybe_refresh(force=True)
+    chunks = retrieve(service.deps(filters=MetadataFilter(sources=["c.md"])), "refund policy", "vector", 3)
+    assert chunks
+    assert {chunk["source"] for chunk in chunks} == {"c.md"}
@@ -0,0 +1,89 @@
+import numpy as np
+
+from rag.embedding_cache import EmbeddingCache
+
+MODEL = "nomic-embed-text"
+
+
+def _vectors(count: int, dim: int = 8) -> np.ndarray:
+    return np.arange(count * dim, dtype=np.float32).reshape(count, dim)
+
+
+def test_reopen_reads_stored_vectors(tmp_path):
+    texts = [f"text {i}" for i in range(5)]
+    cache = EmbeddingCache(tmp_path)
+    cache.put_many(MODEL, texts, _vectors(5))
+
+    reopened = EmbeddingCache(tmp_path)
+    cached = reopened.get_many(MODEL, texts + ["missing"])
+    assert cached[-1] is None
+    np.testing.assert_array_equal(np.stack(cached[:-1]), _vectors(5))
+    assert len(reopened) == 5
+
+
+def test_compaction_drops_least_recently_used(tmp_path):
+    texts = [f"text {i}" for i in range(10)]
+    cache = EmbeddingCache(tmp_path, max_entries=10)
+    cache.put_many(MODEL, texts, _vectors(10))
+    cache.get_many(MODEL, texts[:3])
+    # The 11th entry compacts the store to 9: text 3, 4 (least recently used) are dropped
+    cache.put_many(MODEL, ["new"], _vectors(1) + 100)
+
+    assert len(cache) == 9
+    cached = cache.get_many(MODEL, texts + ["new"])
+    assert [i for i, vector in enumerate(cached) if vector is None] == [3, 4]
+    for i in (0, 1, 2, 5, 9):
+        np.testing.assert_array_equal(cached[i], _vectors(10)[i])
+    np.testing.assert_array_equal(cached[-1], _vectors(1)[0] + 100)
+
+
+def test_reopen_after_compaction(tmp_path):
+    texts = [f"text {i}" for i in range(10)]
+    cache = EmbeddingCache(tmp_path, max_entries=10)
+    other = EmbeddingCache(tmp_path, max_entries=10)
+    # Loaded before the compaction, so it must notice the rewritten files
+    other.get_many(MODEL, texts)
+    cache.put_many(MODEL, texts + ["new"], np.concatenate([_vectors(10), _vectors(1) + 100]))
+
+    for reader in (other, EmbeddingCache(tmp_path)):
+        cached = reader.get_many(MODEL, texts + ["new"])
+        assert sum(vector is None for vector in cached) == 2
+        for text, vector, expected in zip(texts, cached, _vectors(10)):
+            if vector is not None:
+                np.testing.assert_array_equal(vector, expected)
+        np.testing.assert_array_equal(cached[-1], _vectors(1)[0] + 100)
+
+
+def test_torn_write_is_dropped_on_reopen(tmp_path):
+    cache = EmbeddingCache(tmp_path)
+    cache.put_many(MODEL, ["a", "b"], _vectors(2))
+    store = tmp_path / MODEL
+    # A crash after the vector write, before its key was complete
+    with open(store / "vectors.f32", "ab") as f:
+        f.write(_vectors(1).tobytes())
+    with open(store / "keys.log", "a", encoding="ascii") as f:
+        f.write("deadbeef")
+
+    reopened = EmbeddingCache(tmp_path)
+    cached = reopened.get_many(MODEL, ["a", "b"])
+    np.testing.assert_array_equal(np.stack(cached), _vectors(2))
+    assert len(reopened) == 2
+    reopened.put_many(MODEL, ["c"], _vectors(1) + 1)
+    np.testing.assert_array_equal(EmbeddingCache(tmp_path).get_many(MODEL, ["c"])[0], _vectors(1)[0] + 1)
+
+
+def test_notices_compaction_that_restored_the_log_size(tmp_path):
+    texts = [f"text {i}" for i in range(10)]
+    cache = EmbeddingCache(tmp_path, max_entries=10)
+    other = EmbeddingCache(tmp_path, max_entries=10)
+    cache.put_many(MODEL, texts, _vectors(10))
+    assert len(other.get_many(MODEL, texts)) == 10
+    # Compacts to 9 rows, then appends a 10th: keys.log is back to its old size
+    cache.put_many(MODEL, ["new"], _vectors(1) + 100)
+    cache.put_many(MODEL, ["newer"], _vectors(1) + 200)
+
+    cached = other.get_many(MODEL, texts + ["new", "newer"])
+    assert [i for i, vector in enumerate(cached) if vector is None] == [0, 1]
+    for i in range(2, 10):
+        np.testing.assert_array_equal(cached[i], _vectors(10)[i])
+    np.testing.assert_array_equal(cached[-1], _vectors(1)[0] + 200)
@@ -0,0 +1,60 @@
+import pytest
+
+from rag.fusion import reciprocal_rank_fusion, weighted_score_fusion
+
+
+def _chunk(source: str, score: float, chunk_index: int = 0, id: int = 0) -> dict:
+    return {
+        "id": id, "source": source, "chunk_index": chunk_index, "content": source, "score": score, "start": 0, "end": 0,
+    }
+
+
+def _keys(chunks: list[dict]) -> list[str]:
+    return [chunk["source"] for chunk in chunks]
+
+
+def test_rrf_rewards_documents_ranked_by_both_lists():
+    bm25 = [_chunk("x", 12.0), _chunk("y", 8.0), _chunk("z", 1.0)]
+    vector = [_chunk("z", 0.9), _chunk("x", 0.8)]
+
+    fused = reciprocal_rank_fusion([bm25, vector], k=60)
+
+    assert _keys(fused) == ["x", "z", "y"]
+    assert fused[0]["score"] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[2]["score"] == pytest.approx(1 / 62)
+
+
+def test_rrf_weights_favour_one_list():
+    bm25 = [_chunk("x", 12.0), _chunk("y", 8.0)]
+    vector = [_chunk("y", 0.9), _chunk("x", 0.8)]
+
+    assert _keys(reciprocal_rank_fusion([bm25, vector], weights=[1.0, 2.0])) == ["y", "x"]
+    assert _keys(reciprocal_rank_fusion([bm25, vector], weights=[2.0, 1.0])) == ["x", "y"]
+
+
+def test_chunks_match_by_source_and_chunk_index_not_id():
+    # Each backend numbers documents its own way
+    bm25 = [_chunk("a", 5.0, chunk_index=0, id=7), _chunk("a", 4.0, chunk_index=1, id=8)]
+    vector = [_chunk("a", 0.9, chunk_index=1, id=1)]
+
+    fused = reciprocal_rank_fusion([bm25, vector])
+
+    assert [(chunk["source"], chunk["chunk_index"]) for chunk in fused] == [("a", 1), ("a", 0)]
+    assert len(fused) == 2
+
+
+def test_weighted_score_fusion_normalizes_each_list():
+    # Raw BM25 scores dwarf cosine similarities; min-max scaling evens them out
+    bm25 = [_chunk("x", 20.0), _chunk("y", 10.0)]
+    vector = [_chunk("y", 0.9), _chunk("z", 0.5)]
+
+    fused = weighted_score_fusion([bm25, vector], weights=[1.0, 1.5])
+
+    assert _keys(fused) == ["y", "x", "z"]
+    assert [chunk["score"] for chunk in fused] == pytest.approx([1.5, 1.0, 0.0])
+
+
+def test_weighted_score_fusion_skips_empty_lists_and_ties():
+    fused = weighted_score_fusion([[], [_chunk("x", 3.0), _chunk("y", 3.0)]], weights=[1.0, 0.5])
+
+    assert [chunk["score"] for chunk in fused] == [0.5, 0.5]
@@ -0,0 +1,116 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from rag.micro_batcher import MicroBatchingEmbedder
+
+
+class _RecordingModel:
+    """Embedding model stand-in: the vector of text ``"q<i>"`` is ``[i, 1]``."""
+
+    model_name = "fake"
+    dimension = 2
+
+    def __init__(self, max_concurrency: int = 1, fail: bool = False):
+        self.max_concurrency = max_concurrency
+        self.fail = fail
+        self.calls: list[list[str]] = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def encode(self, texts):
+        self.calls.append(list(texts))
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("embedding server down")
+        return np.array([[float(text[1:]), 1.0] for text in texts], dtype=np.float32)
+
+
+def _wait_until(condition) -> None:
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_queries_pile_up_while_a_batch_is_in_flight():
+    model = _RecordingModel()
+    embedder = MicroBatchingEmbedder(model, max_batch_size=8, max_wait_ms=1)
+    try:
+        # Hold the first batch in the model so the following queries queue up
+        model.release.clear()
+        with ThreadPoolExecutor(9) as pool:
+            first = pool.submit(embedder.encode, ["q0"])
+            _wait_until(lambda: model.calls)
+            rest = [pool.submit(embedder.encode, [f"q{i}"]) for i in range(1, 9)]
+            _wait_until(lambda: embedder._queue.qsize() == 8)
+            model.release.set()
+            results = [first.result(5)] + [future.result(5) for future in rest]
+    finally:
+        embedder.close()
+
+    for i, vector in enumerate(results):
+        assert vector.tolist() == [[float(i), 1.0]]
+    assert len(model.calls) == 2
+    assert sorted(model.calls[1]) == [f"q{i}" for i in range(1, 9)]
+    assert (embedder.batches, embedder.texts) == (2, 9)
+
+
+def test_repeated_text_is_embedded_once_per_batch():
+    model = _RecordingModel()
+    embedder = MicroBatchingEmbedder(model, max_batch_size=8, max_wait_ms=1)
+    try:
+        model.release.clear()
+        with ThreadPoolExecutor(4) as pool:
+            first = pool.submit(embedder.encode, ["q0"])
+            _wait_until(lambda: model.calls)
+            rest = [pool.submit(embedder.encode, ["q3"]) for _ in range(3)]
+            _wait_until(lambda: embedder._queue.qsize() == 3)
+            model.release.set()
+            first.result(5)
+            results = [future.result(5) for future in rest]
+    finally:
+        embedder.close()
+
+    assert all(vector.tolist() == [[3.0, 1.0]] for vector in results)
+    assert model.calls == [["q0"], ["q3"]]
+
+
+def test_multi_text_calls_bypass_the_queue():
+    model = _RecordingModel()
+    embedder = MicroBatchingEmbedder(model)
+    try:
+        assert embedder.encode(["q1", "q2"]).tolist() == [[1.0, 1.0], [2.0, 1.0]]
+        assert embedder._thread is None
+    finally:
+        embedder.close()
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    model = _RecordingModel(fail=True)
+    embedder = MicroBatchingEmbedder(model, max_batch_size=4, max_wait_ms=200)
+    try:
+        with ThreadPoolExecutor(2) as pool:
+            futures = [pool.submit(embedder.encode, [f"q{i}"]) for i in range(2)]
+            for future in futures:
+                with pytest.raises(RuntimeError, match="embedding server down"):
+                    future.result(5)
+    finally:
+        embedder.close()
+
+
+def test_close_answers_queued_queries_then_embeds_directly():
+    model = _RecordingModel()
+    embedder = MicroBatchingEmbedder(model, max_batch_size=4, max_wait_ms=1)
+    assert embedder.encode(["q1"]).tolist() == [[1.0, 1.0]]
+
+    embedder.close()
+    embedder.close()  # idempotent
+
+    assert not embedder._thread.is_alive()
+    assert embedder.encode(["q2"]).tolist() == [[2.0, 1.0]]
+    assert model.calls[-1] == ["q2"]
+    assert embedder.batches == 1
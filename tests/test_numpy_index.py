@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from rag.numpy_index import NumpyIndexWriter, NumpyVectorIndex
+
+
+def _add_file(writer: NumpyIndexWriter, source: str, chunks: list[str], vectors: list[list[float]]) -> None:
+    text = " ".join(chunks)
+    document = writer.add_document(text)
+    start = 0
+    for chunk_index, (chunk, vector) in enumerate(zip(chunks, vectors)):
+        writer.add(
+            {
+                "id": writer.count,
+                "source": source,
+                "chunk_index": chunk_index,
+                "document": document,
+                "start": start,
+                "end": start + len(chunk),
+                "mtime": 1.0,
+                "size": len(text),
+            },
+            np.asarray(vector, dtype=np.float32),
+        )
+        start += len(chunk) + 1
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    path = tmp_path / "numpy_index"
+    writer = NumpyIndexWriter(path, incremental=False, with_bm25=True)
+    _add_file(writer, "a.txt", ["apples grow on trees", "red apples"], [[1, 0, 0, 0], [0.9, 0.1, 0, 0]])
+    _add_file(writer, "b.txt", ["bananas are yellow"], [[0, 1, 0, 0]])
+    writer.commit()
+    return path
+
+
+def _search(path, vector, top_k=10) -> list[tuple[str, int]]:
+    index = NumpyVectorIndex(path)
+    try:
+        rows, _ = index.search(np.asarray(vector, dtype=np.float32), top_k)
+        records = [index.store.record(int(row)) for row in rows[0]]
+        return [(record["source"], record["chunk_index"]) for record in records]
+    finally:
+        index.close()
+
+
+def test_full_build(index_path):
+    assert not index_path.with_name("numpy_index.tmp").exists()
+    index = NumpyVectorIndex(index_path)
+    try:
+        assert index.count == 3
+        assert [index.store.content(index.store.record(row)) for row in range(3)] == [
+            "apples grow on trees", "red apples", "bananas are yellow",
+        ]
+    finally:
+        index.close()
+    assert _search(index_path, [0, 1, 0, 0], top_k=1) == [("b.txt", 0)]
+
+
+def test_incremental_add_and_delete(index_path):
+    writer = NumpyIndexWriter(index_path, incremental=True, with_bm25=True)
+    writer.delete_source("a.txt")
+    _add_file(writer, "a.txt", ["green apples"], [[1, 0, 0, 0]])
+    _add_file(writer, "c.txt", ["cherries are small"], [[0, 0, 1, 0]])
+    writer.commit()
+
+    index = NumpyVectorIndex(index_path)
+    try:
+        assert index.store.deleted.tolist() == [True, True, False, False, False]
+        assert index.store.live_count == 3
+        assert index.store.find_rows([("a.txt", 0), ("a.txt", 1), ("b.txt", 0)]).tolist() == [3, -1, 2]
+    finally:
+        index.close()
+    assert _search(index_path, [1, 0, 0, 0]) == [("a.txt", 0), ("b.txt", 0), ("c.txt", 0)]
+
+
+def test_rollback_leaves_index_unchanged(index_path):
+    before = {path.name: path.read_bytes() for path in index_path.iterdir() if path.is_file()}
+    writer = NumpyIndexWriter(index_path, incremental=True, with_bm25=True)
+    writer.delete_source("a.txt")
+    _add_file(writer, "c.txt", ["cherries are small"], [[0, 0, 1, 0]])
+    writer.rollback()
+
+    after = {path.name: path.read_bytes() for path in index_path.iterdir() if path.is_file()}
+    assert after == before
+    assert _search(index_path, [1, 0, 0, 0]) == [("a.txt", 0), ("a.txt", 1), ("b.txt", 0)]
+
+
+def test_failed_full_build_keeps_old_index(index_path):
+    writer = NumpyIndexWriter(index_path, incremental=False)
+    _add_file(writer, "c.txt", ["cherries are small"], [[0, 0, 1, 0]])
+    writer.rollback()
+
+    assert not index_path.with_name("numpy_index.tmp").exists()
+    assert _search(index_path, [0, 1, 0, 0], top_k=1) == [("b.txt", 0)]
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from rag.config import NUMPY_INDEX_DIRNAME
+from rag.numpy_index import NumpyIndexWriter
+from rag.rerank import MMRReranker, mmr_select, normalize_scores
+from rag.retriever import NumpyVectorRetriever
+from tests.test_numpy_index import _add_file
+
+
+class _StoredVectors:
+    """Vector retriever stand-in serving fixed vectors by source."""
+
+    def __init__(self, vectors: dict[str, list[float] | None]):
+        self.vectors = vectors
+
+    def stored_vectors(self, chunks):
+        return [
+            None if self.vectors[chunk["source"]] is None else np.asarray(self.vectors[chunk["source"]], dtype=np.float32)
+            for chunk in chunks
+        ]
+
+
+def _chunk(source: str, score: float) -> dict:
+    return {"id": 0, "source": source, "chunk_index": 0, "content": source, "score": score, "start": 0, "end": 0}
+
+
+def test_normalize_scores():
+    assert normalize_scores(np.array([2.0, 4.0, 3.0])).tolist() == [0.0, 1.0, 0.5]
+    assert normalize_scores(np.array([5.0, 5.0])).tolist() == [1.0, 1.0]
+
+
+def test_mmr_prefers_a_diverse_second_pick():
+    # 1 nearly duplicates 0, 2 is less relevant but points elsewhere
+    relevance = np.array([1.0, 0.95, 0.6])
+    vectors = np.array([[1, 0], [0.99, 0.1], [0, 1]], dtype=np.float32)
+
+    selected, values = mmr_select(relevance, vectors, top_k=3, mmr_lambda=0.5)
+
+    assert selected.tolist() == [0, 2, 1]
+    assert np.all(np.diff(values) <= 0)
+
+
+def test_mmr_with_lambda_one_keeps_relevance_order():
+    relevance = np.array([0.2, 1.0, 0.6])
+    vectors = np.array([[1, 0], [1, 0], [1, 0]], dtype=np.float32)
+
+    selected, values = mmr_select(relevance, vectors, top_k=2, mmr_lambda=1.0)
+
+    assert selected.tolist() == [1, 2]
+    assert values.tolist() == [1.0, 0.6]
+
+
+def test_rerank_reorders_by_stored_vectors():
+    chunks = [_chunk("a", 3.0), _chunk("a-copy", 2.9), _chunk("b", 2.0)]
+    retriever = _StoredVectors({"a": [1, 0], "a-copy": [0.99, 0.1], "b": [0, 1]})
+
+    reranked = MMRReranker(mmr_lambda=0.5).rerank(chunks, top_k=2, vector_retriever=retriever)
+
+    assert [chunk["source"] for chunk in reranked] == ["a", "b"]
+
+
+def test_rerank_keeps_relevance_order_without_vectors():
+    chunks = [_chunk("a", 3.0), _chunk("a-copy", 2.9), _chunk("b", 2.0)]
+    retriever = _StoredVectors({"a": [1, 0], "a-copy": None, "b": [0, 1]})
+
+    reranked = MMRReranker(mmr_lambda=0.5).rerank(chunks, top_k=2, vector_retriever=retriever)
+
+    assert reranked == chunks[:2]
+
+
+def test_numpy_retriever_reads_stored_vectors(tmp_path):
+    writer = NumpyIndexWriter(tmp_path / NUMPY_INDEX_DIRNAME, incremental=False)
+    _add_file(writer, "a.txt", ["apples", "pears"], [[2, 0], [0, 3]])
+    writer.commit()
+    retriever = NumpyVectorRetriever(tmp_path, embedding_model=None)
+    try:
+        vectors = retriever.stored_vectors(
+            [_chunk("a.txt", 1.0) | {"chunk_index": 1}, _chunk("b.txt", 1.0), _chunk("a.txt", 1.0)]
+        )
+    finally:
+        retriever.close()
+
+    assert vectors[0].tolist() == [0.0, 1.0]
+    assert vectors[1] is None
+    assert vectors[2].tolist() == [1.0, 0.0]
+
+
+def test_rejects_lambda_out_of_range():
+    with pytest.raises(ValueError):
+        MMRReranker(mmr_lambda=1.5)
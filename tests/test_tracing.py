@@ -0,0 +1,107 @@
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from rag import tracing
+from rag.tracing import (
+    Histogram,
+    MetricsRegistry,
+    bound_to_context,
+    current_trace,
+    record,
+    span,
+    start_metrics_server,
+    start_trace,
+)
+
+
+@pytest.fixture
+def metrics(monkeypatch) -> MetricsRegistry:
+    registry = MetricsRegistry()
+    monkeypatch.setattr(tracing, "METRICS", registry)
+    return registry
+
+
+def test_spans_land_in_the_current_trace_and_registry(metrics):
+    with start_trace() as trace:
+        with span("bm25"):
+            pass
+        with span("bm25"):
+            pass
+        record("llm", 0.5)
+    with span("outside"):
+        pass
+
+    assert current_trace() is None
+    assert [name for name, _ in trace.spans] == ["bm25", "bm25", "llm"]
+    timings = trace.timings()
+    assert set(timings) == {"bm25", "llm", "total"}
+    assert timings["llm"] == 0.5
+    assert metrics.histograms["bm25"].count == 2
+    assert metrics.histograms["outside"].count == 1
+
+
+def test_failed_span_counts_an_error_and_still_times_it(metrics):
+    with pytest.raises(ValueError):
+        with span("vector"):
+            raise ValueError("boom")
+
+    assert metrics.errors == {"vector": 1}
+    assert metrics.histograms["vector"].count == 1
+
+
+def test_bound_to_context_carries_the_trace_to_executor_threads(metrics):
+    def work():
+        with span("shard"):
+            return current_trace()
+
+    with start_trace() as trace, ThreadPoolExecutor(1) as pool:
+        assert pool.submit(work).result() is None
+        assert pool.submit(bound_to_context(work)).result() is trace
+
+    assert [name for name, _ in trace.spans] == ["shard"]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((1, 2, 4))
+    for value in (0.5, 2, 3, 10):
+        histogram.observe(value)
+
+    assert histogram.counts == [1, 2, 3]
+    assert (histogram.count, histogram.sum) == (4, 15.5)
+
+
+def test_render_prometheus():
+    metrics = MetricsRegistry(buckets=(0.1, 1.0))
+    metrics.observe('say "hi"', 0.5)
+    metrics.observe_size("query_embedding_batch_size", 3, buckets=(1, 4))
+    metrics.count_error("bm25")
+
+    lines = metrics.render_prometheus().splitlines()
+
+    assert 'rag_stage_duration_seconds_bucket{stage="say \\"hi\\"",le="0.1"} 0' in lines
+    assert 'rag_stage_duration_seconds_bucket{stage="say \\"hi\\"",le="+Inf"} 1' in lines
+    assert "# TYPE rag_query_embedding_batch_size histogram" in lines
+    assert 'rag_query_embedding_batch_size_bucket{le="4"} 1' in lines
+    assert "rag_query_embedding_batch_size_sum 3" in lines
+    assert 'rag_stage_errors_total{stage="bm25"} 1' in lines
+
+
+def test_metrics_server(monkeypatch, metrics):
+    monkeypatch.setattr(tracing, "_metrics_server", None)
+    metrics.count_error("llm")
+    server = start_metrics_server(0, host="127.0.0.1")
+    try:
+        assert start_metrics_server(0, host="127.0.0.1") is server
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert 'rag_stage_errors_total{stage="llm"} 1' in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+        assert excinfo.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()